@@ -0,0 +1,333 @@
+# Near-duplicate recipe detection using MinHash signatures and an LSH index.
+#
+# Syndicated and lightly edited copies of the same recipe show up both in the
+# scraper output and in RAW_recipes.csv. Each recipe is reduced to a set of
+# word shingles over its normalized title, ingredients and steps, summarized
+# by a MinHash signature, and bucketed by band so that likely duplicates can be
+# found without comparing every pair.
+
+import json
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from .text_utils import safe_literal_eval
+
+# 128 permutations split into 16 bands of 8 rows puts the LSH candidate
+# threshold at roughly (1/16)^(1/8) ~= 0.71 Jaccard similarity.
+NUM_PERM = 128
+NUM_BANDS = 16
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases text and collapses punctuation and whitespace to single spaces."""
+    return _NON_WORD_RE.sub(" ", str(text).lower()).strip()
+
+
+def recipe_shingle_text(title, ingredients, steps) -> str:
+    """
+    Builds the normalized text a recipe is shingled from.
+
+    Args:
+        title (str): Recipe title.
+        ingredients (list | str): Ingredient strings, or a single string.
+        steps (list | str): Instruction steps, or a single string.
+
+    Returns:
+        str: Normalized title, ingredients and steps joined by spaces.
+    """
+    if isinstance(ingredients, (list, tuple)):
+        ingredients = " ".join(str(i) for i in ingredients)
+    if isinstance(steps, (list, tuple)):
+        steps = " ".join(str(s) for s in steps)
+    return normalize_text(f"{title or ''} {ingredients or ''} {steps or ''}")
+
+
+def shingle_text_from_raw(row) -> str:
+    """Shingle text for a row of RAW_recipes.csv (name, ingredients, steps)."""
+    return recipe_shingle_text(
+        row['name'],
+        safe_literal_eval(row['ingredients']),
+        safe_literal_eval(row['steps']),
+    )
+
+
+def shingle_text_from_cleaned(recipe: dict) -> str:
+    """Shingle text for a Gemini-cleaned recipe as stored in scraper/data/recipes.json."""
+    ingredients = [
+        i.get("name") or i.get("original_text") or "" if isinstance(i, dict) else str(i)
+        for i in recipe.get("cleaned_ingredients") or []
+    ]
+    steps = [
+        s.get("step_text") or "" if isinstance(s, dict) else str(s)
+        for s in recipe.get("cleaned_instructions") or []
+    ]
+    return recipe_shingle_text(recipe.get("cleaned_title"), ingredients, steps)
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    Hashes the word k-shingles of an already normalized text to 32-bit integers.
+
+    Texts shorter than k words are treated as a single shingle so that very
+    short recipes still get a usable signature.
+    """
+    words = text.split()
+    if len(words) < k:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed, seeded family of permutations."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        self.num_perm = num_perm
+        rng = np.random.RandomState(seed)
+        # Universal hashing (a * x + b) mod p; a and b are kept below 2^32 so
+        # the products stay inside uint64.
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Returns the MinHash signature (uint32 array of length num_perm) of normalized text."""
+        hashes = shingle_hashes(text)
+        if hashes.size == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return (permuted & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+
+def estimate_jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimates Jaccard similarity as the fraction of matching signature slots."""
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+class LSHIndex:
+    """
+    Banded LSH index over MinHash signatures.
+
+    Candidates share at least one identical band; they are confirmed by
+    comparing full signatures against `threshold`. Lookups are a handful of
+    dict probes, so querying a new recipe stays well under a millisecond.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM, num_bands: int = NUM_BANDS):
+        if num_perm % num_bands:
+            raise ValueError("num_perm must be divisible by num_bands")
+        self.threshold = threshold
+        self.num_bands = num_bands
+        self.rows = num_perm // num_bands
+        self._buckets = [dict() for _ in range(num_bands)]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, key):
+        return key in self._signatures
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.num_bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def insert(self, key, signature: np.ndarray):
+        """Adds a signature under `key`. Re-inserting an existing key is a no-op."""
+        if key in self._signatures:
+            return
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def candidates(self, signature: np.ndarray) -> set:
+        """Returns keys that share at least one band with `signature`."""
+        found = set()
+        for band, band_key in self._band_keys(signature):
+            found.update(self._buckets[band].get(band_key, ()))
+        return found
+
+    def query(self, signature: np.ndarray) -> list:
+        """
+        Finds indexed near-duplicates of a signature.
+
+        Returns:
+            list: (key, estimated_jaccard) pairs at or above the threshold,
+                  most similar first.
+        """
+        matches = []
+        for key in self.candidates(signature):
+            similarity = estimate_jaccard(signature, self._signatures[key])
+            if similarity >= self.threshold:
+                matches.append((key, similarity))
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches
+
+
+def cluster_duplicates(keys, texts, threshold: float = DEFAULT_THRESHOLD, hasher: MinHasher = None, progress: bool = False) -> dict:
+    """
+    Groups texts into near-duplicate clusters.
+
+    Each text is queried against the index before being inserted, and matches
+    are merged with union-find, so clusters are transitive.
+
+    Args:
+        keys (iterable): Unique identifiers, one per text.
+        texts (iterable): Normalized shingle texts (see `recipe_shingle_text`).
+        threshold (float): Minimum estimated Jaccard similarity for a duplicate.
+        hasher (MinHasher): Optional hasher to share signatures with an index.
+        progress (bool): Show a tqdm progress bar.
+
+    Returns:
+        dict: Maps every key to the key of its cluster representative (the
+              first member seen).
+    """
+    hasher = hasher or MinHasher()
+    index = LSHIndex(threshold=threshold, num_perm=hasher.num_perm)
+    parent = {}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    pairs = zip(keys, texts)
+    if progress:
+        from tqdm import tqdm
+        pairs = tqdm(pairs, desc="MinHash")
+
+    for key, text in pairs:
+        signature = hasher.signature(text)
+        parent[key] = key
+        for match, _ in index.query(signature):
+            root_match, root_key = find(match), find(key)
+            if root_match != root_key:
+                # Keep the earliest-seen recipe as the representative.
+                parent[root_key] = root_match
+        index.insert(key, signature)
+
+    return {key: find(key) for key in parent}
+
+
+def deduplicate_dataframe(df, text_column: str = 'text', threshold: float = DEFAULT_THRESHOLD):
+    """
+    Drops near-duplicate rows from a DataFrame, keeping the first of each cluster.
+
+    Args:
+        df (pd.DataFrame): Data with a free-text column.
+        text_column (str): Column to shingle; it is normalized before hashing.
+        threshold (float): Minimum estimated Jaccard similarity for a duplicate.
+
+    Returns:
+        pd.DataFrame: The de-duplicated rows with a fresh index.
+    """
+    texts = (normalize_text(t) for t in df[text_column])
+    representatives = cluster_duplicates(list(df.index), texts, threshold=threshold, progress=True)
+    keep = [key for key, rep in representatives.items() if key == rep]
+    return df.loc[keep].reset_index(drop=True)
+
+
+class VerdictCache:
+    """
+    Reuses validation verdicts for recipes that are near-duplicates of ones
+    already scored. Safe to share between request handlers.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, max_entries: int = 100_000):
+        self.hasher = MinHasher()
+        self.index = LSHIndex(threshold=threshold, num_perm=self.hasher.num_perm)
+        self.max_entries = max_entries
+        self._verdicts = {}
+        self._lock = threading.Lock()
+
+    def signature_for(self, recipe_data: dict) -> np.ndarray:
+        """Signature for a recipe in the API's input format (title, ingredients, instructions)."""
+        text = recipe_shingle_text(
+            recipe_data.get("title", ""),
+            recipe_data.get("ingredients", []),
+            recipe_data.get("instructions", ""),
+        )
+        return self.hasher.signature(text)
+
+    def lookup(self, signature: np.ndarray, model=None):
+        """
+        Returns the verdict of the closest known duplicate scored by `model`, or None.
+
+        Args:
+            signature (np.ndarray): Signature of the recipe (see `signature_for`).
+            model: Tag of the model now serving (e.g. its loaded_at); verdicts
+                   stored under another tag are ignored.
+        """
+        with self._lock:
+            for key, _ in self.index.query(signature):
+                verdict_model, verdict = self._verdicts[key]
+                if verdict_model == model:
+                    return verdict
+            return None
+
+    def store(self, signature: np.ndarray, verdict: dict, model=None):
+        """Remembers a verdict of `model`. New entries are dropped once the cache is full."""
+        with self._lock:
+            if len(self._verdicts) >= self.max_entries:
+                return
+            key = len(self._verdicts)
+            self._verdicts[key] = (model, verdict)
+            self.index.insert(key, signature)
+
+    def clear(self):
+        """Forgets all verdicts (e.g. after the model is replaced)."""
+        with self._lock:
+            self.index = LSHIndex(threshold=self.index.threshold, num_perm=self.hasher.num_perm)
+            self._verdicts = {}
+
+
+def main():
+    """Reports near-duplicate clusters across RAW_recipes.csv and the scraped recipes."""
+    import os
+    import pandas as pd
+
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    raw_path = os.path.join(project_root, 'scraper', 'data', 'files', 'RAW_recipes.csv')
+    scraped_path = os.path.join(project_root, 'scraper', 'data', 'recipes.json')
+
+    keys, texts = [], []
+    print(f"Loading {raw_path}...")
+    raw_df = pd.read_csv(raw_path, usecols=['id', 'name', 'ingredients', 'steps'])
+    for row in raw_df.itertuples(index=False):
+        keys.append(f"foodcom:{row.id}")
+        texts.append(shingle_text_from_raw(row._asdict()))
+
+    if os.path.exists(scraped_path):
+        print(f"Loading {scraped_path}...")
+        with open(scraped_path, 'r', encoding='utf-8') as f:
+            for i, recipe in enumerate(json.load(f)):
+                keys.append(f"scraped:{recipe.get('original_url') or i}")
+                texts.append(shingle_text_from_cleaned(recipe))
+
+    representatives = cluster_duplicates(keys, texts, progress=True)
+    clusters = {}
+    for key, rep in representatives.items():
+        clusters.setdefault(rep, []).append(key)
+    duplicate_clusters = [members for members in clusters.values() if len(members) > 1]
+
+    print(f"Recipes: {len(keys)}")
+    print(f"Near-duplicate clusters: {len(duplicate_clusters)}")
+    print(f"Redundant copies: {sum(len(m) - 1 for m in duplicate_clusters)}")
+    cross_corpus = [m for m in duplicate_clusters if len({k.split(':', 1)[0] for k in m}) > 1]
+    print(f"Clusters spanning both corpora: {len(cross_corpus)}")
+    for members in sorted(duplicate_clusters, key=len, reverse=True)[:10]:
+        print(f"  {len(members)}: {members[:5]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# Early-exit inference for the fine-tuned encoder.
+#
+# A small classification head is attached to the output of every intermediate
+# encoder layer. At inference the batch runs one layer at a time; after each
+# layer the rows whose head is confident enough (max softmax probability at or
+# above a calibrated threshold) are finished and dropped from the batch, so
+# easy recipes skip the remaining layers. The last layer always uses the
+# model's own classifier, so a threshold above 1.0 reproduces the full model.
+
+import json
+import os
+
+import torch
+from torch import nn
+
+HEADS_FILENAME = "early_exit_heads.pt"
+CONFIG_FILENAME = "early_exit.json"
+DEFAULT_THRESHOLD = 0.9
+
+
+class ExitHead(nn.Module):
+    """Same shape as RobertaClassificationHead: dense + tanh + projection on the <s> token."""
+
+    def __init__(self, hidden_size, num_labels, dropout=0.1):
+        super().__init__()
+        self.dropout = nn.Dropout(dropout)
+        self.dense = nn.Linear(hidden_size, hidden_size)
+        self.out_proj = nn.Linear(hidden_size, num_labels)
+
+    def forward(self, hidden_states):
+        x = self.dropout(hidden_states[:, 0, :])
+        x = torch.tanh(self.dense(x))
+        return self.out_proj(self.dropout(x))
+
+
+class EarlyExitHeads(nn.Module):
+    """One ExitHead per intermediate encoder layer (all layers but the last)."""
+
+    def __init__(self, hidden_size, num_layers, num_labels):
+        super().__init__()
+        self.heads = nn.ModuleList([ExitHead(hidden_size, num_labels) for _ in range(num_layers - 1)])
+
+    @classmethod
+    def for_model(cls, model):
+        config = model.config
+        return cls(config.hidden_size, config.num_hidden_layers, config.num_labels)
+
+    def save(self, model_dir, threshold=DEFAULT_THRESHOLD, report=None):
+        """Writes the head weights and the calibrated threshold next to the model."""
+        torch.save(self.state_dict(), os.path.join(model_dir, HEADS_FILENAME))
+        with open(os.path.join(model_dir, CONFIG_FILENAME), 'w') as f:
+            json.dump({"threshold": threshold, "report": report}, f, indent=4)
+
+    @classmethod
+    def load(cls, model, model_dir, device="cpu"):
+        """
+        Loads heads saved by `save` for `model`.
+
+        Returns:
+            tuple: (EarlyExitHeads, threshold), or (None, None) if none were trained.
+        """
+        heads_path = os.path.join(model_dir, HEADS_FILENAME)
+        if not os.path.exists(heads_path):
+            return None, None
+        heads = cls.for_model(model)
+        heads.load_state_dict(torch.load(heads_path, map_location=device))
+        heads.to(device)
+        heads.eval()
+        threshold = DEFAULT_THRESHOLD
+        config_path = os.path.join(model_dir, CONFIG_FILENAME)
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                threshold = json.load(f).get("threshold", DEFAULT_THRESHOLD)
+        return heads, threshold
+
+
+def _encoder_parts(model):
+    """Embeddings module and list of encoder layers of a RoBERTa-style model."""
+    base = model.base_model
+    return base.embeddings, base.encoder.layer
+
+
+def _extended_mask(attention_mask, dtype):
+    """(batch, seq) 0/1 mask -> (batch, 1, 1, seq) additive mask accepted by eager and SDPA attention."""
+    inverted = 1.0 - attention_mask[:, None, None, :].to(dtype)
+    return inverted * torch.finfo(dtype).min
+
+
+def _run_layer(layer, hidden_states, extended_mask):
+    outputs = layer(hidden_states, attention_mask=extended_mask)
+    return outputs[0] if isinstance(outputs, tuple) else outputs
+
+
+def all_layer_logits(model, heads, input_ids, attention_mask):
+    """
+    Logits of every exit, without exiting early.
+
+    Returns:
+        list: One (batch, num_labels) tensor per encoder layer; the last entry
+              comes from the model's own classifier.
+    """
+    outputs = model.base_model(input_ids=input_ids, attention_mask=attention_mask, output_hidden_states=True)
+    # hidden_states[0] is the embedding output; hidden_states[i] is layer i's output.
+    hidden_states = outputs.hidden_states[1:]
+    logits = [head(h) for head, h in zip(heads.heads, hidden_states[:-1])]
+    logits.append(model.classifier(hidden_states[-1]))
+    return logits
+
+
+@torch.no_grad()
+def early_exit_predict(model, heads, input_ids, attention_mask, threshold):
+    """
+    Batch-aware early-exit inference.
+
+    Rows leave the batch at the first layer whose exit is at least `threshold`
+    confident; the remaining rows continue through the next layer.
+
+    Returns:
+        tuple: (predictions, probabilities, exit_layers) tensors of length
+               batch; exit_layers are 1-based layer numbers.
+    """
+    embeddings, layers = _encoder_parts(model)
+    batch_size = input_ids.size(0)
+    device = input_ids.device
+    predictions = torch.zeros(batch_size, dtype=torch.long, device=device)
+    probabilities = torch.zeros(batch_size, model.config.num_labels, device=device)
+    exit_layers = torch.zeros(batch_size, dtype=torch.long, device=device)
+
+    active = torch.arange(batch_size, device=device)
+    hidden = embeddings(input_ids=input_ids)
+    mask = attention_mask
+    last = len(layers) - 1
+
+    for i, layer in enumerate(layers):
+        extended_mask = _extended_mask(mask, hidden.dtype)
+        hidden = _run_layer(layer, hidden, extended_mask)
+        logits = model.classifier(hidden) if i == last else heads.heads[i](hidden)
+        probs = torch.softmax(logits, dim=-1)
+        confidence, predicted = probs.max(dim=-1)
+        done = confidence >= threshold if i < last else torch.ones_like(confidence, dtype=torch.bool)
+
+        if done.any():
+            finished = active[done]
+            predictions[finished] = predicted[done]
+            probabilities[finished] = probs[done]
+            exit_layers[finished] = i + 1
+            keep = ~done
+            if not keep.any():
+                break
+            active, hidden, mask = active[keep], hidden[keep], mask[keep]
+
+    return predictions, probabilities, exit_layers
+
+
+def simulate_thresholds(layer_probs, labels, thresholds):
+    """
+    Accuracy and exit-layer statistics for a range of thresholds, from
+    precomputed per-exit probabilities (no extra forward passes).
+
+    Args:
+        layer_probs (torch.Tensor): (num_layers, n, num_labels) exit probabilities.
+        labels (torch.Tensor): (n,) gold labels.
+        thresholds (list): Candidate thresholds.
+
+    Returns:
+        list: One dict per threshold with accuracy, mean_exit_layer and the
+              exit-layer distribution (fraction of rows per layer).
+    """
+    num_layers, n, _ = layer_probs.shape
+    confidence, predicted = layer_probs.max(dim=-1)  # (num_layers, n)
+    results = []
+    for threshold in thresholds:
+        confident = confidence >= threshold
+        confident[-1] = True  # everything exits at the last layer
+        exit_index = confident.float().argmax(dim=0)  # first confident layer per row
+        chosen = predicted[exit_index, torch.arange(n)]
+        distribution = torch.bincount(exit_index, minlength=num_layers).float() / n
+        results.append({
+            "threshold": threshold,
+            "accuracy": (chosen == labels).float().mean().item(),
+            "mean_exit_layer": (exit_index.float() + 1).mean().item(),
+            "exit_distribution": [round(x, 4) for x in distribution.tolist()],
+        })
+    return results
+
+
+def calibrate_threshold(curve, full_accuracy, tolerance=0.005):
+    """
+    Lowest threshold whose accuracy is within `tolerance` of the full model.
+
+    Falls back to the strictest threshold on the curve if none qualifies.
+    """
+    for point in sorted(curve, key=lambda p: p["threshold"]):
+        if point["accuracy"] >= full_accuracy - tolerance:
+            return point["threshold"]
+    return max(p["threshold"] for p in curve)
@@ -0,0 +1,256 @@
+# Zero-downtime model reloads for the API.
+#
+# A new checkpoint is loaded on a background thread, warmed up with a
+# representative batch, optionally shadow-scored against a sampled fraction of
+# live traffic, and then swapped in by replacing a single reference. Batches
+# already running keep the validator they started with, and no request ever
+# waits on a model load.
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .model import RecipeValidator, get_sample_valid_recipe_for_inference, get_sample_invalid_recipe_for_inference
+
+# Files whose size/mtime identify a saved model for the directory watcher.
+WATCHED_FILES = ("config.json", "model.safetensors", "pytorch_model.bin", "early_exit_heads.pt", "early_exit.json")
+
+
+def warmup_batch(size=8):
+    """Representative warm-up batch: the sample recipes at a spread of input lengths."""
+    base = [get_sample_valid_recipe_for_inference(), get_sample_invalid_recipe_for_inference()]
+    batch = []
+    for i in range(size):
+        recipe = dict(base[i % 2])
+        recipe["instructions"] = " ".join([recipe["instructions"]] * (1 + i))
+        batch.append(recipe)
+    return batch
+
+
+def model_fingerprint(model_dir):
+    """(name, size, mtime) of the model files in `model_dir`, or None if there is no model."""
+    entries = []
+    for name in WATCHED_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            entries.append((name, stat.st_size, stat.st_mtime))
+    return tuple(entries) if any(name == "config.json" for name, _, _ in entries) else None
+
+
+class ShadowStats:
+    """Agreement and latency of a candidate model against the live one on the same batches."""
+
+    def __init__(self):
+        self.batches = 0
+        self.recipes = 0
+        self.agreements = 0
+        self.live_seconds = 0.0
+        self.candidate_seconds = 0.0
+
+    def record(self, live_results, candidate_results, live_seconds, candidate_seconds):
+        self.batches += 1
+        self.recipes += len(live_results)
+        self.agreements += sum(a["is_valid"] == b["is_valid"] for a, b in zip(live_results, candidate_results))
+        self.live_seconds += live_seconds
+        self.candidate_seconds += candidate_seconds
+
+    def summary(self):
+        return {
+            "batches": self.batches,
+            "recipes": self.recipes,
+            "agreement": self.agreements / self.recipes if self.recipes else None,
+            "live_ms_per_batch": 1000 * self.live_seconds / self.batches if self.batches else None,
+            "candidate_ms_per_batch": 1000 * self.candidate_seconds / self.batches if self.batches else None,
+        }
+
+
+class ModelManager:
+    """
+    Owns the live RecipeValidator and replaces it without downtime.
+
+    Args:
+        validator (RecipeValidator): The validator to serve initially.
+        shadow_fraction (float): Fraction of live batches also scored by a
+                                 candidate before it is promoted (0 disables
+                                 shadow scoring).
+        shadow_min_recipes (int): Recipes to shadow-score before deciding.
+        shadow_timeout (float): Seconds to wait for that many; the decision is
+                                made on whatever was collected by then.
+        min_agreement (float): Candidates agreeing with the live model on a
+                               smaller fraction of shadowed recipes are rejected.
+    """
+
+    def __init__(self, validator, shadow_fraction=0.0, shadow_min_recipes=200, shadow_timeout=600.0, min_agreement=0.9):
+        # (validator, loaded_at) as one reference, so a swap replaces both at once.
+        self._live = (validator, time.time())
+        self.shadow_fraction = shadow_fraction
+        self.shadow_min_recipes = shadow_min_recipes
+        self.shadow_timeout = shadow_timeout
+        self.min_agreement = min_agreement
+        self.state = "serving"
+        self.last_error = None
+        self.history = []
+        self._candidate = None
+        self._candidate_fraction = 0.0
+        self._shadow = None
+        self._shadow_busy = False
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._reload_lock = threading.Lock()
+        self._swap_callbacks = []
+        self._watcher = None
+
+    @property
+    def current(self):
+        """The live RecipeValidator."""
+        return self._live[0]
+
+    @property
+    def loaded_at(self):
+        """When the live validator was swapped in (or created)."""
+        return self._live[1]
+
+    @staticmethod
+    def model_info(validator, loaded_at) -> dict:
+        return {"model_dir": validator.model_dir, "loaded": validator.model is not None, "loaded_at": loaded_at}
+
+    def on_swap(self, callback):
+        """Registers `callback(new_validator)` to run after each swap (e.g. to drop cached verdicts)."""
+        self._swap_callbacks.append(callback)
+
+    def validate_batch(self, recipes):
+        """
+        Scores a batch with the live validator and, for sampled batches, shadow-scores it with the candidate.
+
+        Returns:
+            list: A (result, model info) pair per recipe. The model info
+                  describes the validator that scored the batch, even if
+                  another one was swapped in meanwhile.
+        """
+        validator, loaded_at = self._live  # one read, so a concurrent swap never splits a batch
+        start = time.perf_counter()
+        results = validator.validate_recipes(recipes)
+        live_seconds = time.perf_counter() - start
+
+        candidate = self._candidate
+        if candidate is not None and not self._shadow_busy and random.random() < self._candidate_fraction:
+            # At most one shadow batch in flight; extra samples are skipped rather than queued.
+            self._shadow_busy = True
+            self._shadow_executor.submit(self._score_shadow, candidate, recipes, results, live_seconds)
+        info = self.model_info(validator, loaded_at)
+        return [(result, info) for result in results]
+
+    def _score_shadow(self, candidate, recipes, live_results, live_seconds):
+        try:
+            start = time.perf_counter()
+            candidate_results = candidate.validate_recipes(recipes)
+            if candidate is self._candidate:
+                self._shadow.record(live_results, candidate_results, live_seconds, time.perf_counter() - start)
+        except Exception as e:
+            print(f"Shadow scoring failed: {e}")
+        finally:
+            self._shadow_busy = False
+
+    def reload(self, model_dir=None, shadow_fraction=None):
+        """
+        Starts loading a model in the background.
+
+        Args:
+            model_dir (str): Directory of the new model. Defaults to the live model's directory.
+            shadow_fraction (float): Overrides `self.shadow_fraction` for this reload.
+
+        Returns:
+            bool: False if a reload is already in progress.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        model_dir = model_dir or self.current.model_dir
+        fraction = self.shadow_fraction if shadow_fraction is None else shadow_fraction
+        threading.Thread(target=self._reload, args=(model_dir, fraction), name="model-reload", daemon=True).start()
+        return True
+
+    def _reload(self, model_dir, shadow_fraction):
+        record = {"model_dir": model_dir, "started_at": time.time()}
+        try:
+            self.state = "loading"
+            print(f"Hot-swap: loading {model_dir} in the background...")
+            candidate = RecipeValidator(model_dir=model_dir)
+            if candidate.model is None:
+                raise RuntimeError(f"No model found in {model_dir}")
+
+            self.state = "warming"
+            batch = warmup_batch()
+            start = time.perf_counter()
+            for _ in range(2):
+                candidate.validate_recipes(batch)
+            record["warmup_ms"] = round(1000 * (time.perf_counter() - start) / 2, 2)
+
+            if shadow_fraction > 0:
+                self.state = "shadowing"
+                self._shadow = ShadowStats()
+                self._candidate_fraction = shadow_fraction
+                self._candidate = candidate
+                deadline = time.monotonic() + self.shadow_timeout
+                while self._shadow.recipes < self.shadow_min_recipes and time.monotonic() < deadline:
+                    time.sleep(0.5)
+                self._candidate = None
+                record["shadow"] = self._shadow.summary()
+                agreement = record["shadow"]["agreement"]
+                if agreement is not None and agreement < self.min_agreement:
+                    raise RuntimeError(f"Candidate agreed with the live model on only {agreement:.1%} of shadowed recipes")
+
+            self._live = (candidate, time.time())
+            record["outcome"] = "swapped"
+            print(f"Hot-swap: now serving {model_dir}")
+            for callback in self._swap_callbacks:
+                callback(candidate)
+        except Exception as e:
+            self._candidate = None
+            self.last_error = str(e)
+            record["outcome"] = f"rejected: {e}"
+            print(f"Hot-swap: keeping the current model ({e})")
+        finally:
+            record["finished_at"] = time.time()
+            self.history = (self.history + [record])[-10:]
+            self.state = "serving"
+            self._reload_lock.release()
+
+    def watch(self, model_dir=None, interval=30.0):
+        """
+        Reloads automatically when the model files in `model_dir` change.
+
+        A change is acted on once the files have stopped changing for one
+        interval, so a model that is still being written is never loaded.
+        """
+        model_dir = model_dir or self.current.model_dir
+
+        def loop():
+            seen = model_fingerprint(model_dir)
+            pending = None
+            while True:
+                time.sleep(interval)
+                fingerprint = model_fingerprint(model_dir)
+                if fingerprint is None or fingerprint == seen:
+                    pending = None
+                elif fingerprint == pending:
+                    if self.reload(model_dir):
+                        seen, pending = fingerprint, None
+                else:
+                    pending = fingerprint
+
+        self._watcher = threading.Thread(target=loop, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        """Live model, reload state, shadow comparison in progress and recent reloads."""
+        validator, loaded_at = self._live
+        return {
+            **self.model_info(validator, loaded_at),
+            "state": self.state,
+            "shadow": self._shadow.summary() if self.state == "shadowing" and self._shadow else None,
+            "watching": self._watcher is not None,
+            "last_error": self.last_error,
+            "history": self.history,
+        }
@@ -1,10 +1,17 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
+import hmac
+import os
 
 # Import your RecipeValidator
 # Ensure model.py is in the same directory or adjust Python path
-from .model import RecipeValidator 
+# (The validator is built by model_server.create_local_backend, which imports it lazily
+# so that workers forwarding to a shared model server never load torch or the model.)
+from .dedup import VerdictCache
+from .recipe_store import RecipeStore, BatchWriter, content_hash
+from .request_scheduler import DeadlineExceeded, SchedulerStopped, DEFAULT_PRIORITY
+from .model_server import ModelServerClient, create_local_backend
 
 app = FastAPI(
     title="Recipe Validation API",
@@ -13,8 +20,44 @@ app = FastAPI(
 )
 
 # Initialize your validator
-# This might involve loading a trained model, so it's good to do it at startup
-recipe_validator = RecipeValidator()
+# With RECIPE_MODEL_SERVER_SOCKET set, requests are forwarded to a shared model
+# server process (python -m model.model_server) and this worker loads no model.
+# Otherwise the model is loaded here, behind the same hot-swap (POST /admin/reload,
+# RECIPE_MODEL_WATCH=1) and priority/deadline scheduling the model server uses.
+model_server_socket = os.getenv("RECIPE_MODEL_SERVER_SOCKET")
+if model_server_socket:
+    model_backend = ModelServerClient(model_server_socket)
+else:
+    model_backend = create_local_backend()
+
+@app.on_event("startup")
+async def start_backend():
+    model_backend.start()
+
+# Optionally reuse verdicts for recipes that are near-duplicates of ones
+# already validated. Enable with RECIPE_VERDICT_REUSE=1.
+verdict_cache = VerdictCache() if os.getenv("RECIPE_VERDICT_REUSE") == "1" else None
+# Cached verdicts are tagged with the loaded_at of the model that produced
+# them, and a lookup only returns verdicts of the model serving now.
+# verdict_cache_model is the newest tag seen; the cache is emptied when a
+# newer one arrives, and verdicts of an older model (e.g. a batch that
+# finished just after a swap) are not cached.
+verdict_cache_model = None
+if verdict_cache is not None and not model_server_socket:
+    # With the model in this process, free the old model's verdicts as soon as it is swapped out.
+    model_backend.model_manager.on_swap(lambda validator: verdict_cache.clear())
+
+# Optionally record every model verdict in the local recipe store
+# (see recipe_store.py). Enable with RECIPE_STORE_PATH=data/recipes.db.
+verdict_writer = None
+if os.getenv("RECIPE_STORE_PATH"):
+    verdict_writer = BatchWriter(RecipeStore(os.getenv("RECIPE_STORE_PATH")), batch_size=100)
+
+@app.on_event("shutdown")
+async def flush_verdicts():
+    await model_backend.stop()
+    if verdict_writer is not None:
+        verdict_writer.close()
 
 # Define the request body model using Pydantic
 # This should match the structure of the recipe data your validator expects
@@ -36,22 +79,107 @@ class ValidationResponse(BaseModel):
     # original_recipe: Optional[RecipeInput]
 
 @app.post("/validate-recipe/", response_model=ValidationResponse)
-async def validate_recipe_endpoint(recipe: RecipeInput):
+async def validate_recipe_endpoint(
+    recipe: RecipeInput,
+    x_request_priority: str = Header(DEFAULT_PRIORITY, description="Priority class, e.g. 'interactive' or 'backfill'"),
+    x_deadline_ms: Optional[float] = Header(None, description="Time budget in milliseconds; shed with 503 once exceeded"),
+):
     """
     Receives recipe data, validates it using the `RecipeValidator`,
     and returns the validation result.
+
+    The request is queued under its priority class (X-Request-Priority) and
+    answered with 503 if its deadline (X-Deadline-Ms) passes before it
+    reaches the model.
     """
+    global verdict_cache_model
     # Convert Pydantic model to dict for the validator, if necessary
     # The validator might expect a plain dict
     recipe_data_dict = recipe.dict(exclude_none=True) # exclude_none to remove fields not provided
     
-    validation_result = recipe_validator.validate_recipe(recipe_data_dict)
+    signature = None
+    validation_result = None
+    if verdict_cache is not None:
+        signature = verdict_cache.signature_for(recipe_data_dict)
+        validation_result = verdict_cache.lookup(signature, model=await model_backend.loaded_at())
+
+    if validation_result is None:
+        try:
+            validation_result, model_info = await model_backend.validate(recipe_data_dict, x_request_priority, x_deadline_ms)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except DeadlineExceeded as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except SchedulerStopped as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except ConnectionError as e:
+            raise HTTPException(status_code=503, detail=f"Model server unavailable: {e}")
+        if verdict_cache is not None and model_info["loaded"]:
+            if verdict_cache_model is None or model_info["loaded_at"] > verdict_cache_model:
+                verdict_cache.clear()
+                verdict_cache_model = model_info["loaded_at"]
+            if model_info["loaded_at"] == verdict_cache_model:
+                verdict_cache.store(signature, validation_result, model=verdict_cache_model)
+        if verdict_writer is not None and model_info["loaded"]:
+            verdict_writer.add_verdict({
+                "content_hash": content_hash(
+                    recipe_data_dict.get("title", ""),
+                    recipe_data_dict.get("ingredients", []),
+                    recipe_data_dict.get("instructions", ""),
+                ),
+                "is_valid": validation_result["is_valid"],
+                "issues": validation_result["issues"],
+                "model_version": model_info["model_dir"],
+            })
     
     return ValidationResponse(
         is_valid=validation_result["is_valid"],
         issues=validation_result["issues"]
     )
 
+@app.get("/metrics")
+async def metrics():
+    """Per-priority-class queue depth, queue wait percentiles and shed counts."""
+    return await model_backend.metrics()
+
+@app.get("/early-exit-stats")
+async def early_exit_stats():
+    """Reports how many recipes left the model at each encoder layer since startup."""
+    return await model_backend.early_exit_stats()
+
+class ReloadRequest(BaseModel):
+    model_dir: Optional[str] = Field(None, description="Directory of the new model, inside the model root (model/saved_model); defaults to the live model's directory")
+    shadow_fraction: Optional[float] = Field(None, ge=0.0, le=1.0, description="Fraction of live batches to shadow-score before swapping")
+
+def check_admin_token(token):
+    # Fails closed: without a configured token the admin endpoints are disabled.
+    expected = os.getenv("RECIPE_ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set RECIPE_ADMIN_TOKEN to enable them.")
+    if not token or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+@app.post("/admin/reload", status_code=202)
+async def reload_model(request: ReloadRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Loads, warms up and (optionally) shadow-scores a model in the background,
+    then swaps it in. Requests keep being served by the current model meanwhile.
+    """
+    check_admin_token(x_admin_token)
+    try:
+        status = await model_backend.reload(request.model_dir, request.shadow_fraction)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if status is None:
+        raise HTTPException(status_code=409, detail="A reload is already in progress.")
+    return status
+
+@app.get("/admin/model")
+async def model_status(x_admin_token: Optional[str] = Header(None)):
+    """Live model, reload state, shadow agreement/latency and recent reloads."""
+    check_admin_token(x_admin_token)
+    return await model_backend.status()
+
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Recipe Validation API. Use the /docs endpoint for API documentation."}
@@ -7,12 +7,39 @@
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 import os
+from collections import Counter
 from .text_utils import format_text_for_inference
+from .early_exit import EarlyExitHeads, early_exit_predict
+
+# Tokenizer of the model train.py fine-tunes, for model directories without one.
+BASE_MODEL_NAME = "distilroberta-base"
+
+
+def tokenizer_source(model_dir):
+    """
+    Where to load the tokenizer for `model_dir` from.
+
+    Trainer checkpoints (e.g. saved_model/checkpoint-500) only hold weights,
+    so they use the tokenizer saved in the parent directory, or the base
+    model's tokenizer if there is none.
+    """
+    for directory in (model_dir, os.path.dirname(os.path.normpath(model_dir))):
+        if os.path.exists(os.path.join(directory, "tokenizer_config.json")):
+            return directory
+    return BASE_MODEL_NAME
+
 
 class RecipeValidator:
-    def __init__(self):
+    def __init__(self, model_dir=None, early_exit=None):
         """
         Initializes the RecipeValidator by loading the fine-tuned model and tokenizer.
+
+        Args:
+            model_dir (str): Directory of the saved model. Defaults to 'saved_model'
+                             next to this file.
+            early_exit (bool): Use early-exit heads if they were trained (see
+                               `train.py --early-exit`). Defaults to on unless
+                               RECIPE_EARLY_EXIT=0 is set.
         """
         # Determine the device
         self.device = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
@@ -20,7 +47,16 @@ class RecipeValidator:
 
         # Path to the saved model - assuming it's in a 'saved_model' directory
         # relative to this file's location.
-        model_dir = os.path.join(os.path.dirname(__file__), 'saved_model')
+        if model_dir is None:
+            model_dir = os.path.join(os.path.dirname(__file__), 'saved_model')
+        self.model_dir = model_dir
+        if early_exit is None:
+            early_exit = os.getenv("RECIPE_EARLY_EXIT", "1") != "0"
+
+        self.exit_heads = None
+        self.exit_threshold = None
+        # How many recipes left the model at each (1-based) encoder layer
+        self.exit_layer_counts = Counter()
 
         if not os.path.exists(model_dir) or not os.listdir(model_dir):
             print(f"Warning: Model directory '{model_dir}' not found or is empty.")
@@ -29,10 +65,14 @@ class RecipeValidator:
             self.tokenizer = None
         else:
             print(f"Loading model from {model_dir}...")
-            self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+            self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_source(model_dir))
             self.model = AutoModelForSequenceClassification.from_pretrained(model_dir)
             self.model.to(self.device)
             self.model.eval() # Set model to evaluation mode
+            if early_exit:
+                self.exit_heads, self.exit_threshold = EarlyExitHeads.load(self.model, model_dir, self.device)
+                if self.exit_heads is not None:
+                    print(f"Early exit enabled (threshold {self.exit_threshold}).")
             print("Model loaded successfully.")
 
 
@@ -47,46 +87,77 @@ class RecipeValidator:
         Returns:
             dict: A dictionary with 'is_valid' (bool) and 'issues' (list).
         """
+        return self.validate_recipes([recipe_data])[0]
+
+    def validate_recipes(self, recipes: list) -> list:
+        """
+        Validates a batch of recipes in one forward pass.
+
+        With early exit enabled, confident rows leave the batch at an
+        intermediate layer and only the rest run through the remaining layers.
+
+        Args:
+            recipes (list): Recipe dicts, as accepted by `validate_recipe`.
+
+        Returns:
+            list: One result dict per recipe, in the same order.
+        """
         if not self.model or not self.tokenizer:
-            return {
+            return [{
                 "is_valid": False,
                 "issues": ["Validator model is not loaded. Please train the model first."]
-            }
-
-        # Extract data and handle missing fields gracefully
-        title = recipe_data.get("title", "")
-        ingredients = recipe_data.get("ingredients", [])
-        instructions = recipe_data.get("instructions", "")
+            } for _ in recipes]
+
+        results = [None] * len(recipes)
+        texts, positions = [], []
+        for i, recipe_data in enumerate(recipes):
+            # Extract data and handle missing fields gracefully
+            title = recipe_data.get("title", "")
+            ingredients = recipe_data.get("ingredients", [])
+            instructions = recipe_data.get("instructions", "")
+
+            # A basic check for essential content
+            if not title or not ingredients or not instructions:
+                results[i] = {
+                    "is_valid": False,
+                    "issues": ["Recipe is missing title, ingredients, or instructions."]
+                }
+                continue
+
+            # Format the text exactly as it was for training
+            texts.append(format_text_for_inference(
+                title=title,
+                ingredients=ingredients,
+                instructions=instructions
+            ))
+            positions.append(i)
+
+        if not texts:
+            return results
 
-        # A basic check for essential content
-        if not title or not ingredients or not instructions:
-            return {
-                "is_valid": False,
-                "issues": ["Recipe is missing title, ingredients, or instructions."]
-            }
-
-        # Format the text exactly as it was for training
-        recipe_text = format_text_for_inference(
-            title=title,
-            ingredients=ingredients,
-            instructions=instructions
-        )
-        
         # Perform inference
-        inputs = self.tokenizer(recipe_text, return_tensors="pt", truncation=True, padding=True, max_length=512)
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True, max_length=512)
         inputs = {k: v.to(self.device) for k, v in inputs.items()} # Move inputs to the correct device
 
         with torch.no_grad():
-            logits = self.model(**inputs).logits
-        
-        prediction = torch.argmax(logits, dim=-1).item()
-
-        is_valid = bool(prediction == 1)
-        issues = []
-        if not is_valid:
-            issues.append("The model classified this recipe as potentially invalid or malformed.")
-
-        return {"is_valid": is_valid, "issues": issues}
+            if self.exit_heads is not None:
+                predictions, _, exit_layers = early_exit_predict(
+                    self.model, self.exit_heads, inputs["input_ids"], inputs["attention_mask"], self.exit_threshold
+                )
+                self.exit_layer_counts.update(exit_layers.tolist())
+            else:
+                logits = self.model(**inputs).logits
+                predictions = torch.argmax(logits, dim=-1)
+                self.exit_layer_counts[self.model.config.num_hidden_layers] += len(texts)
+
+        for i, prediction in zip(positions, predictions.tolist()):
+            is_valid = bool(prediction == 1)
+            issues = []
+            if not is_valid:
+                issues.append("The model classified this recipe as potentially invalid or malformed.")
+            results[i] = {"is_valid": is_valid, "issues": issues}
+
+        return results
 
 # The following is for local testing of the validator class, not used by the API.
 def get_sample_valid_recipe_for_inference():
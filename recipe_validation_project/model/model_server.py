@@ -0,0 +1,317 @@
+# Shared model-server process for multi-worker API deployments.
+#
+# One process owns the model (with hot-swap and the priority/deadline
+# scheduler) and listens on a Unix socket. API workers started with
+# RECIPE_MODEL_SERVER_SOCKET forward requests to it instead of loading their
+# own copy, so memory per node stays flat in the number of workers and batches
+# are formed from the traffic of all workers together.
+#
+# Protocol: each message is a 4-byte big-endian length followed by a compact
+# JSON object. A worker keeps one connection open and pipelines requests on
+# it; responses carry the request "id" and may arrive out of order.
+#
+#   python -m model.model_server --socket /tmp/recipe-model.sock
+#   RECIPE_MODEL_SERVER_SOCKET=/tmp/recipe-model.sock uvicorn model.main:app --workers 4
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+
+from .request_scheduler import RequestScheduler, DeadlineExceeded, SchedulerStopped, DEFAULT_PRIORITY, class_weights_from_env
+
+DEFAULT_SOCKET_PATH = "/tmp/recipe-model.sock"
+# Admin reloads may only load models from inside this directory (RECIPE_MODEL_ROOT overrides it).
+DEFAULT_MODEL_ROOT = os.path.join(os.path.dirname(__file__), 'saved_model')
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+_HEADER = struct.Struct(">I")
+
+
+def encode_frame(message: dict) -> bytes:
+    payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader) -> dict:
+    """Reads one message. Raises asyncio.IncompleteReadError when the peer closes the connection."""
+    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    return json.loads(await reader.readexactly(length))
+
+
+def resolve_model_dir(model_dir, model_root=DEFAULT_MODEL_ROOT):
+    """
+    Resolves a requested model directory, which must lie inside `model_root`.
+
+    Relative paths are taken relative to `model_root` (e.g. "checkpoint-500").
+
+    Raises:
+        ValueError: If the resolved path (after following symlinks) is outside `model_root`.
+    """
+    root = os.path.realpath(model_root)
+    path = os.path.realpath(os.path.join(root, model_dir))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Model directory must be inside {model_root}.")
+    return path
+
+
+class LocalBackend:
+    """
+    Serves requests from a model loaded in this process.
+
+    Used by the API when no model server is configured, and by the model
+    server itself. `ModelServerClient` offers the same async interface.
+    """
+
+    def __init__(self, model_manager, request_scheduler, model_root=None):
+        self.model_manager = model_manager
+        self.request_scheduler = request_scheduler
+        self.model_root = model_root
+
+    def start(self):
+        self.request_scheduler.start()
+
+    async def stop(self):
+        await self.request_scheduler.stop()
+
+    async def validate(self, recipe, priority=DEFAULT_PRIORITY, deadline_ms=None):
+        """
+        Returns:
+            tuple: (result dict, model info dict) for the recipe, where the
+                   model info describes the validator that scored it.
+        """
+        result, model_info = await self.request_scheduler.submit(recipe, priority, deadline_ms)
+        return result, model_info
+
+    async def loaded_at(self):
+        """When the live model was swapped in; identifies the model that will score the next request."""
+        return self.model_manager.loaded_at
+
+    async def metrics(self):
+        return {"classes": self.request_scheduler.metrics()}
+
+    async def early_exit_stats(self):
+        validator = self.model_manager.current
+        counts = validator.exit_layer_counts
+        total = sum(counts.values())
+        return {
+            "enabled": validator.exit_heads is not None,
+            "threshold": validator.exit_threshold,
+            "total": total,
+            "exit_layer_distribution": {layer: counts[layer] / total for layer in sorted(counts)} if total else {},
+        }
+
+    async def reload(self, model_dir=None, shadow_fraction=None):
+        """
+        Starts a background reload. Returns the model status, or None if a reload is already running.
+
+        Raises:
+            ValueError: If `model_dir` is outside the model root.
+        """
+        if model_dir is not None:
+            model_dir = resolve_model_dir(model_dir, self.model_root or DEFAULT_MODEL_ROOT)
+        if not self.model_manager.reload(model_dir, shadow_fraction):
+            return None
+        return self.model_manager.status()
+
+    async def status(self):
+        return self.model_manager.status()
+
+
+def create_local_backend(model_dir=None):
+    """Loads the model and builds hot-swap and scheduling around it, configured from the RECIPE_* environment."""
+    from .model import RecipeValidator
+    from .hot_swap import ModelManager
+
+    model_manager = ModelManager(RecipeValidator(model_dir=model_dir),
+                                 shadow_fraction=float(os.getenv("RECIPE_SHADOW_FRACTION", "0")))
+    if os.getenv("RECIPE_MODEL_WATCH") == "1":
+        model_manager.watch(interval=float(os.getenv("RECIPE_MODEL_WATCH_INTERVAL", "30")))
+    request_scheduler = RequestScheduler(
+        model_manager.validate_batch,
+        class_weights=class_weights_from_env(),
+        max_batch_size=int(os.getenv("RECIPE_MAX_BATCH_SIZE", "16")),
+    )
+    return LocalBackend(model_manager, request_scheduler, model_root=os.getenv("RECIPE_MODEL_ROOT", DEFAULT_MODEL_ROOT))
+
+
+class ModelServer:
+    """Unix-socket front end for a LocalBackend."""
+
+    def __init__(self, backend: LocalBackend, socket_path=DEFAULT_SOCKET_PATH):
+        self.backend = backend
+        self.socket_path = socket_path
+        self._tasks = set()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # stale socket from a previous run
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        self.backend.start()
+        print(f"Model server listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.backend.stop()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                message = await read_frame(reader)
+                # Each request is answered independently, so one slow request never blocks the connection.
+                task = asyncio.create_task(self._respond(message, writer))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, message, writer):
+        response = {"id": message.get("id")}
+        try:
+            op = message.get("op")
+            if op == "validate":
+                response["result"], response["model"] = await self.backend.validate(
+                    message["recipe"], message.get("priority", DEFAULT_PRIORITY), message.get("deadline_ms")
+                )
+            elif op == "reload":
+                response["result"] = await self.backend.reload(message.get("model_dir"), message.get("shadow_fraction"))
+            elif op in ("loaded_at", "metrics", "early_exit_stats", "status"):
+                response["result"] = await getattr(self.backend, op)()
+            else:
+                raise ValueError(f"Unknown op '{op}'")
+        except DeadlineExceeded as e:
+            response.update(error="deadline", detail=str(e))
+        except SchedulerStopped as e:
+            response.update(error="unavailable", detail=str(e))
+        except ValueError as e:
+            response.update(error="invalid", detail=str(e))
+        except Exception as e:
+            response.update(error="internal", detail=repr(e))
+        if not writer.is_closing():
+            writer.write(encode_frame(response))
+            try:
+                await writer.drain()  # wait while a slow worker is not reading responses
+            except ConnectionError:
+                pass  # the worker went away; _handle_connection closes the connection
+
+
+class ModelServerClient:
+    """
+    Forwards requests from an API worker to the model server.
+
+    Connects lazily on first use and reconnects after the server restarts.
+    Many requests share one connection; each waits on its own future.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        self.socket_path = socket_path
+        self._writer = None
+        self._pending = {}
+        self._next_id = 0
+        self._connect_lock = asyncio.Lock()
+        self._reader_task = None
+
+    def start(self):
+        pass  # connects on first request
+
+    async def stop(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _connection(self):
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                try:
+                    reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                except OSError as e:
+                    raise ConnectionError(f"Cannot reach the model server at {self.socket_path}: {e}") from e
+                self._reader_task = asyncio.create_task(self._read_responses(reader, self._writer))
+            return self._writer
+
+    async def _read_responses(self, reader, writer):
+        try:
+            while True:
+                message = await read_frame(reader)
+                future, _ = self._pending.pop(message.get("id"), (None, None))
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except Exception as e:  # closed connection or a malformed frame
+            error = e
+        if self._writer is writer:
+            self._writer = None
+        # Everything still in flight on this connection is lost
+        for request_id, (future, request_writer) in list(self._pending.items()):
+            if request_writer is writer:
+                del self._pending[request_id]
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Model server connection closed ({error!r})"))
+
+    async def request(self, op, **payload):
+        """
+        Sends one request and waits for its response.
+
+        Raises:
+            ConnectionError: If the model server is unreachable, shutting down, or the connection drops.
+            DeadlineExceeded, ValueError: Mirrors of the server-side errors.
+        """
+        writer = await self._connection()
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (future, writer)
+        try:
+            writer.write(encode_frame({"id": request_id, "op": op, **payload}))
+            await writer.drain()  # wait while the server is not reading requests
+            response = await future
+        finally:
+            self._pending.pop(request_id, None)
+        error = response.get("error")
+        if error == "deadline":
+            raise DeadlineExceeded(response.get("detail"))
+        if error == "invalid":
+            raise ValueError(response.get("detail"))
+        if error == "unavailable":
+            raise ConnectionError(response.get("detail"))
+        if error:
+            raise RuntimeError(f"Model server error: {response.get('detail')}")
+        return response
+
+    async def validate(self, recipe, priority=DEFAULT_PRIORITY, deadline_ms=None):
+        response = await self.request("validate", recipe=recipe, priority=priority, deadline_ms=deadline_ms)
+        return response["result"], response["model"]
+
+    async def loaded_at(self):
+        return (await self.request("loaded_at"))["result"]
+
+    async def metrics(self):
+        return (await self.request("metrics"))["result"]
+
+    async def early_exit_stats(self):
+        return (await self.request("early_exit_stats"))["result"]
+
+    async def reload(self, model_dir=None, shadow_fraction=None):
+        return (await self.request("reload", model_dir=model_dir, shadow_fraction=shadow_fraction))["result"]
+
+    async def status(self):
+        return (await self.request("status"))["result"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the recipe validation model to API workers over a Unix socket.")
+    parser.add_argument("--socket", default=os.getenv("RECIPE_MODEL_SERVER_SOCKET", DEFAULT_SOCKET_PATH))
+    parser.add_argument("--model-dir", default=None, help="Model directory (defaults to model/saved_model).")
+    args = parser.parse_args()
+    asyncio.run(ModelServer(create_local_backend(args.model_dir), args.socket).serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ import pandas as pd
 import os
 from tqdm import tqdm
 from .text_utils import format_recipe_text_from_raw
+from .dedup import deduplicate_dataframe
 
 # Register tqdm with pandas
 tqdm.pandas()
@@ -65,6 +66,14 @@ def main():
     # Now, drop duplicates by recipe_id, as each has a consistent label
     final_df = clean_df.drop_duplicates(subset=['recipe_id']).reset_index(drop=True)
     final_df = final_df[['text', 'label']]
+
+    # --- Step 4: Drop near-duplicate recipes ---
+    # Syndicated copies of the same recipe would otherwise land on both sides
+    # of the train/test split in train.py and inflate training time.
+    print("Removing near-duplicate recipes...")
+    before = len(final_df)
+    final_df = deduplicate_dataframe(final_df, text_column='text')
+    print(f"Removed {before - len(final_df)} near-duplicates.")
     
     print(f"Saving final dataset to {output_file}...")
     final_df.to_csv(output_file, index=False)
@@ -0,0 +1,510 @@
+# Indexed local recipe store (single SQLite file).
+#
+# Holds recipes from every source (Food.com CSVs, scraped allrecipes JSON,
+# processed per-recipe JSON), their ingredients and steps, validation
+# verdicts and crawl metadata. Lookups by canonical URL, source id and content
+# hash are index probes, and titles/ingredients are searchable with FTS5, so
+# none of the common questions need a full load of the JSON or CSV files.
+
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from .dedup import recipe_shingle_text
+from .text_utils import safe_literal_eval
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DB_PATH = os.path.join(PROJECT_ROOT, 'data', 'recipes.db')
+# Crawl statuses that mean a URL is done: cleaned by the scraper, or marked
+# crawled in the sitemap catalog. 'scraped' and 'failed' rows are retried.
+DONE_CRAWL_STATUSES = ("cleaned", "crawled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    recipe_id INTEGER,
+    canonical_url TEXT,
+    title TEXT,
+    content_hash TEXT NOT NULL,
+    data TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_recipes_url ON recipes(canonical_url) WHERE canonical_url IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_recipes_source_id ON recipes(source, recipe_id) WHERE recipe_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_recipes_hash ON recipes(content_hash);
+
+CREATE TABLE IF NOT EXISTS ingredients (
+    recipe_pk INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT,
+    text TEXT,
+    PRIMARY KEY (recipe_pk, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ingredients_name ON ingredients(name);
+
+CREATE TABLE IF NOT EXISTS steps (
+    recipe_pk INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT,
+    PRIMARY KEY (recipe_pk, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS verdicts (
+    id INTEGER PRIMARY KEY,
+    recipe_pk INTEGER REFERENCES recipes(id) ON DELETE SET NULL,
+    content_hash TEXT NOT NULL,
+    is_valid INTEGER NOT NULL,
+    issues TEXT,
+    model_version TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_verdicts_hash ON verdicts(content_hash, created_at);
+
+CREATE TABLE IF NOT EXISTS crawl (
+    url TEXT PRIMARY KEY,
+    lastmod TEXT,
+    etag TEXT,
+    status TEXT,
+    first_seen REAL,
+    last_crawled REAL
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(title, ingredients, tokenize='porter unicode61');
+"""
+
+
+def fts_phrase(text) -> str:
+    """Quotes `text` as a single FTS5 string, so operators and punctuation in it are not parsed as query syntax."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts_terms(text) -> str:
+    """FTS5 query matching every whitespace-separated term of plain user text (e.g. "mac & cheese")."""
+    return " ".join(fts_phrase(term) for term in text.split())
+
+
+def content_hash(title, ingredients, steps) -> str:
+    """Hash of the normalized title, ingredients and steps (same normalization as dedup)."""
+    text = recipe_shingle_text(title, ingredients, steps)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _ingredient_fields(ingredient):
+    """(name, text) for a plain ingredient string or a cleaned ingredient dict."""
+    if isinstance(ingredient, dict):
+        return ingredient.get("name"), ingredient.get("original_text") or ingredient.get("name")
+    return str(ingredient), str(ingredient)
+
+
+# --- Converters from the existing formats to store records ---
+
+def from_raw_row(row) -> dict:
+    """Store record for a row of RAW_recipes.csv (as a dict of strings)."""
+    return {
+        "source": "foodcom",
+        "recipe_id": int(row['id']),
+        "title": row['name'],
+        "ingredients": safe_literal_eval(row['ingredients']),
+        "steps": safe_literal_eval(row['steps']),
+        "data": {k: row[k] for k in ('minutes', 'tags', 'nutrition', 'description', 'submitted') if k in row},
+    }
+
+
+def from_cleaned(recipe: dict, source: str = "allrecipes") -> dict:
+    """Store record for a Gemini-cleaned recipe (scraper/data/recipes.json format)."""
+    steps = [s.get("step_text") if isinstance(s, dict) else str(s) for s in recipe.get("cleaned_instructions") or []]
+    return {
+        "source": source,
+        "canonical_url": recipe.get("original_url"),
+        "title": recipe.get("cleaned_title"),
+        "ingredients": recipe.get("cleaned_ingredients") or [],
+        "steps": steps,
+        "data": recipe,
+    }
+
+
+def from_scraped(recipe: dict, source: str = "allrecipes") -> dict:
+    """Store record for a raw scraped recipe (scrape_recipe / data_processing.py format)."""
+    instructions = recipe.get("instructions") or ""
+    steps = instructions if isinstance(instructions, list) else [s for s in instructions.split("\n") if s.strip()]
+    return {
+        "source": source,
+        "canonical_url": recipe.get("canonical_url"),
+        "title": recipe.get("title"),
+        "ingredients": recipe.get("ingredients") or [],
+        "steps": steps,
+        "data": recipe,
+    }
+
+
+class RecipeStore:
+    """
+    SQLite-backed recipe store.
+
+    One connection is shared behind a lock, so a store can be used from the
+    scraper's worker threads and from the API. Writes go through
+    `write_recipes`, `record_verdicts` and `record_crawls`, each of which
+    takes a batch and commits it in a single transaction.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Writes ---
+
+    def _find_existing(self, record):
+        if record.get("canonical_url"):
+            row = self._conn.execute("SELECT id FROM recipes WHERE canonical_url = ?", (record["canonical_url"],)).fetchone()
+            if row:
+                return row[0]
+        if record.get("recipe_id") is not None:
+            row = self._conn.execute(
+                "SELECT id FROM recipes WHERE source = ? AND recipe_id = ?", (record["source"], record["recipe_id"])
+            ).fetchone()
+            if row:
+                return row[0]
+        return None
+
+    def write_recipes(self, records) -> list:
+        """
+        Inserts or replaces a batch of recipes in one transaction.
+
+        A record replaces an existing recipe with the same canonical URL or the
+        same (source, recipe_id). When several records in one batch resolve to
+        the same recipe, the last one wins.
+
+        Args:
+            records (list): Dicts with 'source' and any of 'recipe_id',
+                            'canonical_url', 'title', 'ingredients' (strings or
+                            cleaned ingredient dicts), 'steps' and 'data'.
+
+        Returns:
+            list: Row ids of the written recipes, in order.
+        """
+        now = time.time()
+        ids = []
+        # Child rows are keyed by recipe so a later record in the batch
+        # replaces an earlier one for the same recipe instead of colliding.
+        children = {}
+        with self._lock, self._conn:
+            for record in records:
+                ingredients = record.get("ingredients") or []
+                steps = record.get("steps") or []
+                ingredient_fields = [_ingredient_fields(i) for i in ingredients]
+                digest = content_hash(record.get("title"), [text for _, text in ingredient_fields], steps)
+                values = (
+                    record["source"], record.get("recipe_id"), record.get("canonical_url"), record.get("title"),
+                    digest, json.dumps(record.get("data")) if record.get("data") is not None else None, now,
+                )
+                pk = self._find_existing(record)
+                if pk is None:
+                    pk = self._conn.execute(
+                        "INSERT INTO recipes (source, recipe_id, canonical_url, title, content_hash, data, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", values
+                    ).lastrowid
+                else:
+                    self._conn.execute(
+                        "UPDATE recipes SET source = ?, recipe_id = ?, canonical_url = ?, title = ?, content_hash = ?, "
+                        "data = ?, updated_at = ? WHERE id = ?", values + (pk,)
+                    )
+                    self._conn.execute("DELETE FROM ingredients WHERE recipe_pk = ?", (pk,))
+                    self._conn.execute("DELETE FROM steps WHERE recipe_pk = ?", (pk,))
+                    self._conn.execute("DELETE FROM recipes_fts WHERE rowid = ?", (pk,))
+                ids.append(pk)
+                children[pk] = (
+                    [(pk, i, name, text) for i, (name, text) in enumerate(ingredient_fields)],
+                    [(pk, i, text) for i, text in enumerate(steps)],
+                    (pk, record.get("title") or "", " ".join(text or "" for _, text in ingredient_fields)),
+                )
+
+            ingredient_rows = [row for rows, _, _ in children.values() for row in rows]
+            step_rows = [row for _, rows, _ in children.values() for row in rows]
+            fts_rows = [row for _, _, row in children.values()]
+            self._conn.executemany("INSERT INTO ingredients (recipe_pk, position, name, text) VALUES (?, ?, ?, ?)", ingredient_rows)
+            self._conn.executemany("INSERT INTO steps (recipe_pk, position, text) VALUES (?, ?, ?)", step_rows)
+            self._conn.executemany("INSERT INTO recipes_fts (rowid, title, ingredients) VALUES (?, ?, ?)", fts_rows)
+        return ids
+
+    def record_verdicts(self, verdicts):
+        """
+        Stores a batch of validation verdicts.
+
+        Args:
+            verdicts (list): Dicts with 'content_hash', 'is_valid', 'issues'
+                             and optionally 'recipe_pk' and 'model_version'.
+        """
+        now = time.time()
+        rows = [(
+            v.get("recipe_pk"), v["content_hash"], int(bool(v["is_valid"])), json.dumps(v.get("issues", [])),
+            v.get("model_version"), v.get("created_at", now),
+        ) for v in verdicts]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO verdicts (recipe_pk, content_hash, is_valid, issues, model_version, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def record_crawls(self, crawls):
+        """
+        Upserts crawl metadata for a batch of URLs.
+
+        Args:
+            crawls (list): Dicts with 'url' and optionally 'lastmod', 'etag',
+                           'status', 'first_seen' and 'last_crawled'.
+        """
+        now = time.time()
+        rows = [(
+            c["url"], c.get("lastmod"), c.get("etag"), c.get("status"), c.get("first_seen", now), c.get("last_crawled"),
+        ) for c in crawls]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO crawl (url, lastmod, etag, status, first_seen, last_crawled) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET lastmod = COALESCE(excluded.lastmod, lastmod), "
+                "etag = COALESCE(excluded.etag, etag), status = COALESCE(excluded.status, status), "
+                "last_crawled = COALESCE(excluded.last_crawled, last_crawled)", rows
+            )
+
+    # --- Reads ---
+
+    def _recipe_dict(self, row):
+        if row is None:
+            return None
+        recipe = dict(row)
+        recipe["data"] = json.loads(recipe["data"]) if recipe["data"] else None
+        recipe["ingredients"] = [r[0] for r in self._conn.execute(
+            "SELECT text FROM ingredients WHERE recipe_pk = ? ORDER BY position", (row["id"],))]
+        recipe["steps"] = [r[0] for r in self._conn.execute(
+            "SELECT text FROM steps WHERE recipe_pk = ? ORDER BY position", (row["id"],))]
+        return recipe
+
+    def get(self, pk):
+        """Recipe by row id, with ingredients and steps, or None."""
+        with self._lock:
+            return self._recipe_dict(self._conn.execute("SELECT * FROM recipes WHERE id = ?", (pk,)).fetchone())
+
+    def get_by_url(self, canonical_url):
+        with self._lock:
+            return self._recipe_dict(self._conn.execute("SELECT * FROM recipes WHERE canonical_url = ?", (canonical_url,)).fetchone())
+
+    def get_by_recipe_id(self, recipe_id, source="foodcom"):
+        with self._lock:
+            return self._recipe_dict(self._conn.execute(
+                "SELECT * FROM recipes WHERE source = ? AND recipe_id = ?", (source, recipe_id)).fetchone())
+
+    def find_by_hash(self, digest) -> list:
+        """Row ids of recipes with this content hash (exact normalized duplicates)."""
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT id FROM recipes WHERE content_hash = ?", (digest,))]
+
+    def has_url(self, url) -> bool:
+        """True if the URL is stored as a recipe or was crawled successfully (failed or uncleaned crawls don't count)."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM recipes WHERE canonical_url = ?", (url,)).fetchone():
+                return True
+            placeholders = ", ".join("?" * len(DONE_CRAWL_STATUSES))
+            return self._conn.execute(
+                f"SELECT 1 FROM crawl WHERE url = ? AND status IN ({placeholders})", (url, *DONE_CRAWL_STATUSES)
+            ).fetchone() is not None
+
+    def search(self, query, limit=20, raw=False) -> list:
+        """
+        Full-text search over titles and ingredients.
+
+        Args:
+            query (str): Plain text; every term must match. With `raw`, an
+                         FTS5 query (operators, column filters, prefixes).
+            limit (int): Maximum number of results.
+            raw (bool): Pass `query` to FTS5 MATCH unchanged.
+
+        Returns:
+            list: (id, title) pairs, best match first.
+        """
+        if not raw:
+            query = fts_terms(query)
+            if not query:
+                return []
+        with self._lock:
+            return [tuple(r) for r in self._conn.execute(
+                "SELECT r.id, r.title FROM recipes_fts JOIN recipes r ON r.id = recipes_fts.rowid "
+                "WHERE recipes_fts MATCH ? ORDER BY bm25(recipes_fts) LIMIT ?", (query, limit))]
+
+    def with_ingredient(self, ingredient, limit=100) -> list:
+        """(id, title) pairs of recipes whose ingredients mention `ingredient`."""
+        return self.search(f"ingredients : {fts_phrase(ingredient)}", limit=limit, raw=True)
+
+    def latest_verdict(self, digest):
+        """Most recent verdict for a content hash, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT is_valid, issues, model_version, created_at FROM verdicts WHERE content_hash = ? "
+                "ORDER BY created_at DESC LIMIT 1", (digest,)).fetchone()
+        if row is None:
+            return None
+        return {"is_valid": bool(row["is_valid"]), "issues": json.loads(row["issues"] or "[]"),
+                "model_version": row["model_version"], "created_at": row["created_at"]}
+
+    def counts(self) -> dict:
+        with self._lock:
+            return {table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("recipes", "ingredients", "steps", "verdicts", "crawl")}
+
+
+class BatchWriter:
+    """
+    Buffers recipe, verdict and crawl writes and commits them in batches.
+
+    Flushes every `batch_size` items and on close (or when used as a context
+    manager), so per-item callers such as the scraper loop or the API pay for
+    one transaction per batch rather than per item.
+    """
+
+    def __init__(self, store: RecipeStore, batch_size=500):
+        self.store = store
+        self.batch_size = batch_size
+        self._recipes, self._verdicts, self._crawls = [], [], []
+        self._lock = threading.Lock()
+
+    def add_recipe(self, record):
+        self._add(self._recipes, record)
+
+    def add_verdict(self, verdict):
+        self._add(self._verdicts, verdict)
+
+    def add_crawl(self, crawl):
+        self._add(self._crawls, crawl)
+
+    def _add(self, buffer, item):
+        with self._lock:
+            buffer.append(item)
+            full = len(buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            recipes, self._recipes = self._recipes, []
+            verdicts, self._verdicts = self._verdicts, []
+            crawls, self._crawls = self._crawls, []
+        if recipes:
+            self.store.write_recipes(recipes)
+        if verdicts:
+            self.store.record_verdicts(verdicts)
+        if crawls:
+            self.store.record_crawls(crawls)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Bulk import from the existing formats ---
+
+def import_raw_recipes_csv(store, path, batch_size=5000):
+    """Streams RAW_recipes.csv into the store. Returns the number of recipes imported."""
+    csv.field_size_limit(sys.maxsize)
+    count = 0
+    with open(path, newline='', encoding='utf-8') as f, BatchWriter(store, batch_size) as writer:
+        for row in csv.DictReader(f):
+            writer.add_recipe(from_raw_row(row))
+            count += 1
+            if count % 50000 == 0:
+                print(f"  {count} recipes imported...")
+    return count
+
+
+def import_cleaned_json(store, path, source="allrecipes"):
+    """Imports a JSON array of Gemini-cleaned recipes (e.g. scraper/data/recipes.json)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        recipes = json.load(f)
+    store.write_recipes([from_cleaned(r, source) for r in recipes])
+    return len(recipes)
+
+
+def import_processed_dir(store, directory, source="allrecipes"):
+    """Imports the per-recipe JSON files written by data_processing.py."""
+    records = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                recipe = json.load(f)
+            if isinstance(recipe, dict):
+                records.append(from_cleaned(recipe, source) if "cleaned_title" in recipe else from_scraped(recipe, source))
+    store.write_recipes(records)
+    return len(records)
+
+
+def import_url_catalog(store, path):
+    """Imports crawl metadata from the sitemap URL catalog (scraper/data/url_catalog.json)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f).get("urls", {})
+    store.record_crawls([{
+        "url": url, "lastmod": e.get("lastmod"), "first_seen": e.get("first_seen"),
+        "last_crawled": e.get("last_crawled"), "status": "crawled" if e.get("last_crawled") else "discovered",
+    } for url, e in entries.items()])
+    return len(entries)
+
+
+def main():
+    """Imports the existing data files into the store, or searches it."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local recipe store.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import", help="Import RAW_recipes.csv, scraped JSON, processed JSON and the URL catalog.")
+    search = sub.add_parser("search", help="Full-text search over titles and ingredients.")
+    search.add_argument("query")
+    search.add_argument("--ingredient", action="store_true", help="Match the query against ingredients only.")
+    search.add_argument("--raw", action="store_true", help="Treat the query as FTS5 syntax (e.g. 'title : pancake*').")
+    args = parser.parse_args()
+
+    store = RecipeStore(args.db)
+    if args.command == "import":
+        sources = [
+            (import_raw_recipes_csv, os.path.join(PROJECT_ROOT, 'scraper', 'data', 'files', 'RAW_recipes.csv')),
+            (import_cleaned_json, os.path.join(PROJECT_ROOT, 'scraper', 'data', 'recipes.json')),
+            (import_processed_dir, os.path.join(PROJECT_ROOT, 'data', 'processed')),
+            (import_url_catalog, os.path.join(PROJECT_ROOT, 'scraper', 'data', 'url_catalog.json')),
+        ]
+        for importer, path in sources:
+            if not os.path.exists(path):
+                print(f"Skipping {path} (not found)")
+                continue
+            start = time.perf_counter()
+            count = importer(store, path)
+            print(f"Imported {count} from {path} in {time.perf_counter() - start:.1f}s")
+        print(f"Store counts: {store.counts()}")
+    else:
+        results = store.with_ingredient(args.query) if args.ingredient else store.search(args.query, raw=args.raw)
+        for pk, title in results:
+            print(f"{pk}\t{title}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
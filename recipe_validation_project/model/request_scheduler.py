@@ -0,0 +1,253 @@
+# Priority- and deadline-aware batching in front of the validator.
+#
+# Requests are queued per priority class. Whenever the model is free, the
+# dispatcher picks the class with the lowest weighted share of model work
+# served so far (weighted fair queuing, so backfill cannot starve interactive
+# traffic but still gets its share). It then builds a batch from that class,
+# preferring short inputs so they are not padded out to the longest recipe.
+# Requests whose deadline has already passed are shed before they reach the
+# model.
+
+import asyncio
+import collections
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .text_utils import format_text_for_inference
+
+# Relative share of model time per class when both have work queued.
+DEFAULT_CLASS_WEIGHTS = {"interactive": 8.0, "backfill": 1.0}
+DEFAULT_PRIORITY = "interactive"
+# Recent queue waits kept per class for the percentiles in metrics().
+WAIT_SAMPLES = 1000
+
+
+class DeadlineExceeded(Exception):
+    """Raised for a request that was shed because its deadline passed while queued."""
+
+
+class SchedulerStopped(RuntimeError):
+    """Raised for requests submitted after stop(), or still queued when it was called."""
+
+
+def estimate_length(recipe: dict) -> int:
+    """Cheap token-count proxy (whitespace words of the model input), capped at the model's 512."""
+    text = format_text_for_inference(
+        title=recipe.get("title", "") or "",
+        ingredients=recipe.get("ingredients", []) or [],
+        instructions=recipe.get("instructions", "") or "",
+    )
+    return min(512, len(text.split()))
+
+
+class _Job:
+    __slots__ = ("recipe", "length", "deadline", "enqueued_at", "future")
+
+    def __init__(self, recipe, deadline, future):
+        self.recipe = recipe
+        self.length = estimate_length(recipe)
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future = future
+
+
+class _ClassQueue:
+    def __init__(self, weight):
+        self.weight = weight
+        self.jobs = []
+        # Model work (estimated tokens) served, divided by weight.
+        self.virtual_time = 0.0
+        self.waits_ms = collections.deque(maxlen=WAIT_SAMPLES)
+        self.stats = {"submitted": 0, "completed": 0, "shed": 0, "batches": 0}
+
+
+class RequestScheduler:
+    """
+    Batches validation requests by priority class and deadline.
+
+    Args:
+        validate_batch (callable): list of recipe dicts -> list of results,
+                                   e.g. `RecipeValidator.validate_recipes` or
+                                   `ModelManager.validate_batch`.
+                                   Runs on a single worker thread, one batch
+                                   at a time.
+        class_weights (dict): {class name: weight} for weighted fair sharing.
+        max_batch_size (int): Upper bound on recipes per model call.
+        batch_window_ms (float): How long an idle model waits for a batch to
+                                 fill before running what is queued.
+        max_defer_ms (float): A request that has waited this long goes into
+                              the next batch of its class regardless of its
+                              length, so long inputs are never starved.
+    """
+
+    def __init__(self, validate_batch, class_weights=None, max_batch_size=16, batch_window_ms=2.0, max_defer_ms=200.0):
+        self.validate_batch = validate_batch
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_defer = max_defer_ms / 1000.0
+        self.queues = {name: _ClassQueue(weight) for name, weight in (class_weights or DEFAULT_CLASS_WEIGHTS).items()}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="validator")
+        self._wakeup = None
+        self._task = None
+        self._stopped = False
+
+    def start(self):
+        """Starts the dispatcher on the running event loop. Does nothing once stopped."""
+        if self._task is None and not self._stopped:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def stop(self):
+        """Stops the dispatcher for good; queued and later requests fail with SchedulerStopped."""
+        self._stopped = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+        for queue in self.queues.values():
+            for job in queue.jobs:
+                if not job.future.done():
+                    job.future.set_exception(SchedulerStopped("Scheduler stopped before the request reached the model."))
+            queue.jobs = []
+
+    async def submit(self, recipe: dict, priority: str = DEFAULT_PRIORITY, deadline_ms: float = None) -> dict:
+        """
+        Queues one recipe and waits for its result.
+
+        Args:
+            recipe (dict): Recipe in the API's input format.
+            priority (str): Priority class, one of `self.queues`.
+            deadline_ms (float): Optional budget in milliseconds from now.
+
+        Raises:
+            ValueError: For an unknown priority class.
+            DeadlineExceeded: If the deadline passes before the recipe reaches the model.
+            SchedulerStopped: If the scheduler has been stopped.
+        """
+        if self._stopped:
+            raise SchedulerStopped("Scheduler is stopped.")
+        if priority not in self.queues:
+            raise ValueError(f"Unknown priority class '{priority}'. Expected one of {sorted(self.queues)}.")
+        self.start()
+        queue = self.queues[priority]
+        queue.stats["submitted"] += 1
+        deadline = time.monotonic() + deadline_ms / 1000.0 if deadline_ms is not None else None
+        if deadline is not None and deadline <= time.monotonic():
+            queue.stats["shed"] += 1
+            raise DeadlineExceeded("Deadline already passed on arrival.")
+
+        if not queue.jobs:
+            # A class that was idle re-enters at the current virtual time instead of
+            # cashing in credit accumulated while it had nothing queued.
+            active = [q.virtual_time for q in self.queues.values() if q.jobs]
+            if active:
+                queue.virtual_time = max(queue.virtual_time, min(active))
+        job = _Job(recipe, deadline, asyncio.get_running_loop().create_future())
+        queue.jobs.append(job)
+        self._wakeup.set()
+        return await job.future
+
+    def _pending(self):
+        return sum(len(q.jobs) for q in self.queues.values())
+
+    def _shed_expired(self):
+        now = time.monotonic()
+        for queue in self.queues.values():
+            kept = []
+            for job in queue.jobs:
+                if job.future.done():  # client went away
+                    continue
+                if job.deadline is not None and job.deadline <= now:
+                    queue.stats["shed"] += 1
+                    job.future.set_exception(DeadlineExceeded("Deadline passed while queued."))
+                    continue
+                kept.append(job)
+            queue.jobs = kept
+
+    def _pick_class(self):
+        # Smallest virtual finish time: work already served plus the next batch, both per unit weight.
+        candidates = []
+        for name, q in self.queues.items():
+            if q.jobs:
+                next_cost = sum(sorted(j.length for j in q.jobs)[:self.max_batch_size])
+                candidates.append((q.virtual_time + next_cost / q.weight, name))
+        return min(candidates)[1] if candidates else None
+
+    def _take_batch(self, queue):
+        now = time.monotonic()
+        overdue = [j for j in queue.jobs if now - j.enqueued_at >= self.max_defer]
+        rest = sorted((j for j in queue.jobs if now - j.enqueued_at < self.max_defer), key=lambda j: j.length)
+        batch = (overdue + rest)[:self.max_batch_size]
+        taken = set(map(id, batch))
+        queue.jobs = [j for j in queue.jobs if id(j) not in taken]
+        return batch
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                if self.batch_window > 0:
+                    await asyncio.sleep(self.batch_window)
+            self._shed_expired()
+            name = self._pick_class()
+            if name is None:
+                continue
+            queue = self.queues[name]
+            batch = self._take_batch(queue)
+
+            started = time.monotonic()
+            for job in batch:
+                queue.waits_ms.append((started - job.enqueued_at) * 1000.0)
+            queue.virtual_time += sum(j.length for j in batch) / queue.weight
+            queue.stats["batches"] += 1
+            try:
+                results = await loop.run_in_executor(self._executor, self.validate_batch, [j.recipe for j in batch])
+            except asyncio.CancelledError:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(SchedulerStopped("Scheduler stopped while the request was running."))
+                raise
+            except Exception as e:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                continue
+            for job, result in zip(batch, results):
+                if not job.future.done():
+                    job.future.set_result(result)
+            queue.stats["completed"] += len(batch)
+
+    def metrics(self) -> dict:
+        """Per-class queue depth, counters and queue-wait percentiles (ms) over recent requests."""
+        report = {}
+        for name, queue in self.queues.items():
+            waits = sorted(queue.waits_ms)
+            wait = {"samples": len(waits)}
+            if waits:
+                wait.update({
+                    "mean": round(sum(waits) / len(waits), 2),
+                    "p50": round(waits[len(waits) // 2], 2),
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2),
+                    "max": round(waits[-1], 2),
+                })
+            report[name] = {"weight": queue.weight, "queue_depth": len(queue.jobs), "queue_wait_ms": wait, **queue.stats}
+        return report
+
+
+def class_weights_from_env():
+    """Class weights from RECIPE_PRIORITY_WEIGHTS (e.g. 'interactive=8,backfill=1'), else the defaults."""
+    value = os.getenv("RECIPE_PRIORITY_WEIGHTS")
+    if not value:
+        return dict(DEFAULT_CLASS_WEIGHTS)
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
@@ -0,0 +1,349 @@
+# Parallel hyperparameter sweep for the recipe validation model.
+#
+# The dataset is tokenized once, at the largest max_length in the search space,
+# and saved to disk. Every trial loads that copy and truncates per batch to its
+# own max_length. Trials run in worker processes with a fixed thread budget
+# each. Successive halving trains every trial for a small share of its steps,
+# keeps the best 1/eta by accuracy on a stratified eval subsample, and resumes
+# the survivors from their checkpoints for the next, larger share.
+#
+#   python model/sweep.py --space sweep_space.json --threads-per-trial 4
+#
+# The result is a leaderboard of accuracy vs training time and inference latency.
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DEFAULT_SEARCH_SPACE = {
+    "learning_rate": [2e-5, 5e-5],
+    "per_device_train_batch_size": [16, 32],
+    "warmup_steps": [0, 500],
+    "max_length": [256, 512],
+    "num_train_epochs": [1],
+}
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_SWEEP_DIR = os.path.join(PROJECT_ROOT, 'model', 'sweeps')
+
+
+def expand_search_space(space, num_trials=None, seed=42):
+    """
+    Trial configs for a search space of {param: [values]}.
+
+    Returns the full grid, or `num_trials` configs sampled from it without replacement.
+    """
+    names = sorted(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    if num_trials is not None and num_trials < len(grid):
+        grid = random.Random(seed).sample(grid, num_trials)
+    return grid
+
+
+def prepare_shared_dataset(data_dir, data_file_path, model_name, max_length, max_train_examples=None):
+    """
+    Tokenizes the train/test splits once at `max_length` and saves them (and the tokenizer) to `data_dir`.
+
+    An existing copy is reused if it was made for the same data file, model and max_length.
+    """
+    from datasets import load_from_disk
+    from transformers import AutoTokenizer
+    from train import load_splits
+
+    meta = {"data_file": data_file_path, "model_name": model_name, "max_length": max_length,
+            "max_train_examples": max_train_examples}
+    meta_path = os.path.join(data_dir, "sweep_data.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == meta:
+                print(f"Reusing pre-tokenized dataset in {data_dir}")
+                return load_from_disk(data_dir)
+
+    dataset_dict = load_splits(data_file_path)
+    if max_train_examples is not None and max_train_examples < len(dataset_dict["train"]):
+        dataset_dict["train"] = dataset_dict["train"].shuffle(seed=42).select(range(max_train_examples))
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    print(f"Tokenizing {len(dataset_dict['train'])} train / {len(dataset_dict['test'])} test examples at max_length {max_length}...")
+    tokenized = dataset_dict.map(lambda examples: tokenizer(examples["text"], truncation=True, max_length=max_length), batched=True)
+    tokenized = tokenized.remove_columns(["text"]).rename_column("label", "labels")
+    tokenized.save_to_disk(data_dir)
+    tokenizer.save_pretrained(os.path.join(data_dir, "tokenizer"))
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=4)
+    return tokenized
+
+
+class TruncatingCollator:
+    """Truncates pre-tokenized examples to `max_length` (keeping the closing special token), then pads the batch."""
+
+    def __init__(self, tokenizer, max_length):
+        from transformers import DataCollatorWithPadding
+        self.pad = DataCollatorWithPadding(tokenizer)
+        self.max_length = max_length
+        self.eos_token_id = tokenizer.sep_token_id if tokenizer.sep_token_id is not None else tokenizer.eos_token_id
+
+    def __call__(self, features):
+        truncated = []
+        for feature in features:
+            feature = dict(feature)
+            if len(feature["input_ids"]) > self.max_length:
+                feature["input_ids"] = list(feature["input_ids"][:self.max_length - 1]) + [self.eos_token_id]
+                feature["attention_mask"] = list(feature["attention_mask"][:self.max_length])
+            truncated.append(feature)
+        return self.pad(truncated)
+
+
+def _init_worker(num_threads):
+    """Pins each worker process to its per-trial thread budget."""
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    os.environ["MKL_NUM_THREADS"] = str(num_threads)
+    import torch
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already set in this process
+
+
+def measure_latency(model, dataset, collator, num_examples=128, batch_size=16):
+    """Wall-clock milliseconds per example for inference with the trial's truncation."""
+    import torch
+    from torch.utils.data import DataLoader
+
+    subset = dataset.select(range(min(num_examples, len(dataset))))
+    model.eval()
+    start = time.perf_counter()
+    with torch.no_grad():
+        for batch in DataLoader(subset, batch_size=batch_size, collate_fn=collator):
+            batch.pop("labels", None)
+            model(**batch)
+    return (time.perf_counter() - start) * 1000 / len(subset)
+
+
+def run_trial_rung(trial_id, config, data_dir, trial_dir, stop_fraction, eval_examples, model_name, final=False):
+    """
+    Trains one trial up to `stop_fraction` of its total steps, resuming from its last rung.
+
+    The learning-rate schedule always spans the trial's full step count, so a
+    trial resumed across rungs follows the same schedule as an uninterrupted run.
+
+    Returns:
+        dict: Trial state with step, accuracy on the eval subsample (and, for
+              `final`, test_accuracy on the test rows outside it), cumulative
+              train_seconds and latency_ms per example.
+    """
+    from datasets import load_from_disk
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer, TrainerCallback
+    from transformers.trainer_utils import get_last_checkpoint
+    from train import compute_metrics, preprocess_logits_for_metrics, stratified_subsample_indices
+
+    class StopAtStep(TrainerCallback):
+        def __init__(self, stop_step):
+            self.stop_step = stop_step
+
+        def on_step_end(self, args, state, control, **kwargs):
+            if state.global_step >= self.stop_step:
+                control.should_save = True
+                control.should_training_stop = True
+
+    os.makedirs(trial_dir, exist_ok=True)
+    state_path = os.path.join(trial_dir, "trial.json")
+    trial_state = {"trial": trial_id, "config": config, "train_seconds": 0.0}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            trial_state = json.load(f)
+
+    datasets = load_from_disk(data_dir)
+    tokenizer = AutoTokenizer.from_pretrained(os.path.join(data_dir, "tokenizer"))
+    collator = TruncatingCollator(tokenizer, config["max_length"])
+    # Trials are pruned on the eval subsample, so the final test metric is
+    # taken on the rest of the test split.
+    eval_indices = stratified_subsample_indices(datasets["test"], eval_examples)
+    eval_dataset = datasets["test"].select(eval_indices)
+    held_out = sorted(set(range(len(datasets["test"]))) - set(eval_indices))
+
+    batch_size = config["per_device_train_batch_size"]
+    total_steps = math.ceil(len(datasets["train"]) / batch_size) * config.get("num_train_epochs", 1)
+    stop_step = max(1, math.ceil(total_steps * stop_fraction))
+
+    last_checkpoint = get_last_checkpoint(trial_dir) if os.path.isdir(trial_dir) else None
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=2)
+    training_args = TrainingArguments(
+        output_dir=trial_dir,
+        max_steps=total_steps,
+        per_device_train_batch_size=batch_size,
+        per_device_eval_batch_size=32,
+        learning_rate=config.get("learning_rate", 5e-5),
+        warmup_steps=config.get("warmup_steps", 0),
+        weight_decay=config.get("weight_decay", 0.01),
+        logging_steps=100,
+        save_strategy="no",  # the rung boundary saves via StopAtStep
+        save_total_limit=1,
+        report_to="none",
+        seed=42,
+    )
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=datasets["train"],
+        eval_dataset=eval_dataset,
+        data_collator=collator,
+        compute_metrics=compute_metrics,
+        preprocess_logits_for_metrics=preprocess_logits_for_metrics,
+        callbacks=[StopAtStep(stop_step)],
+    )
+
+    start = time.perf_counter()
+    trainer.train(resume_from_checkpoint=last_checkpoint)
+    trial_state["train_seconds"] += time.perf_counter() - start
+    trial_state["step"] = trainer.state.global_step
+    trial_state["total_steps"] = total_steps
+    trial_state["accuracy"] = trainer.evaluate()["eval_accuracy"]
+    if final and held_out:
+        trial_state["test_accuracy"] = trainer.evaluate(eval_dataset=datasets["test"].select(held_out))["eval_accuracy"]
+    trial_state["latency_ms"] = measure_latency(trainer.model, datasets["test"], collator)
+
+    with open(state_path, 'w') as f:
+        json.dump(trial_state, f, indent=4)
+    return trial_state
+
+
+def rung_fractions(num_rungs, eta):
+    """Share of each trial's total steps trained by the end of each rung, e.g. [1/9, 1/3, 1] for 3 rungs, eta 3."""
+    return [eta ** -(num_rungs - 1 - r) for r in range(num_rungs)]
+
+
+def successive_halving(configs, data_dir, sweep_dir, workers, threads_per_trial, eval_examples, model_name, num_rungs=3, eta=3):
+    """
+    Runs the trials with successive halving across a pool of worker processes.
+
+    Returns:
+        list: Final state of every trial, with 'rung' (last rung reached) and 'status'.
+    """
+    results = {}
+    active = list(range(len(configs)))
+    fractions = rung_fractions(num_rungs, eta)
+    # Spawned (not forked) workers, so each starts its own thread pools under the per-trial limit
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(threads_per_trial,)) as executor:
+        for rung, fraction in enumerate(fractions):
+            final = rung == len(fractions) - 1
+            print(f"\n--- Rung {rung + 1}/{len(fractions)}: {len(active)} trials to {fraction:.0%} of their steps ---")
+            futures = {
+                executor.submit(
+                    run_trial_rung, trial_id, configs[trial_id], data_dir,
+                    os.path.join(sweep_dir, f"trial-{trial_id:03d}"), fraction, eval_examples, model_name, final,
+                ): trial_id
+                for trial_id in active
+            }
+            for future in as_completed(futures):
+                trial_id = futures[future]
+                try:
+                    state = future.result()
+                except Exception as e:
+                    print(f"Trial {trial_id} failed: {e}")
+                    results[trial_id] = {"trial": trial_id, "config": configs[trial_id], "rung": rung + 1,
+                                         "status": f"failed: {e}"}
+                    continue
+                state["rung"] = rung + 1
+                state["status"] = "completed" if final else "running"
+                results[trial_id] = state
+                print(f"Trial {trial_id} rung {rung + 1}: accuracy {state['accuracy']:.4f}, "
+                      f"{state['train_seconds']:.0f}s trained, {state['latency_ms']:.2f} ms/example  {configs[trial_id]}")
+
+            ranked = sorted((t for t in active if "accuracy" in results[t]),
+                            key=lambda t: results[t]["accuracy"], reverse=True)
+            if not final:
+                keep = ranked[:max(1, len(ranked) // eta)]
+                for trial_id in ranked[len(keep):]:
+                    results[trial_id]["status"] = f"pruned at rung {rung + 1}"
+                active = keep
+    return [results[t] for t in sorted(results)]
+
+
+def mark_pareto(results):
+    """Flags completed trials that no other completed trial beats on accuracy, training time and latency at once."""
+    completed = [r for r in results if r.get("status") == "completed"]
+    for r in results:
+        r["pareto"] = r in completed and not any(
+            o is not r
+            and o["accuracy"] >= r["accuracy"] and o["train_seconds"] <= r["train_seconds"] and o["latency_ms"] <= r["latency_ms"]
+            and (o["accuracy"], -o["train_seconds"], -o["latency_ms"]) != (r["accuracy"], -r["train_seconds"], -r["latency_ms"])
+            for o in completed
+        )
+
+
+def write_leaderboard(results, path):
+    """Writes the leaderboard CSV (best first) and prints it."""
+    mark_pareto(results)
+    params = sorted({k for r in results for k in r["config"]})
+    ranked = sorted(results, key=lambda r: (r.get("rung", 0), r.get("accuracy", -1)), reverse=True)
+    columns = ["trial", *params, "status", "rung", "step", "accuracy", "test_accuracy", "train_seconds", "latency_ms", "pareto"]
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for r in ranked:
+            writer.writerow({**r["config"], **{c: r.get(c) for c in columns if c not in params}})
+
+    print(f"\n{'trial':>5} {'accuracy':>9} {'test acc':>9} {'train s':>8} {'ms/ex':>7} {'pareto':>6}  status / config")
+    for r in ranked:
+        test_accuracy = f"{r['test_accuracy']:.4f}" if r.get("test_accuracy") is not None else "-"
+        accuracy = f"{r['accuracy']:.4f}" if r.get("accuracy") is not None else "-"
+        train_seconds = f"{r['train_seconds']:.0f}" if r.get("train_seconds") is not None else "-"
+        latency = f"{r['latency_ms']:.2f}" if r.get("latency_ms") is not None else "-"
+        print(f"{r['trial']:>5} {accuracy:>9} {test_accuracy:>9} {train_seconds:>8} {latency:>7} "
+              f"{'*' if r.get('pareto') else '':>6}  {r['status']} {r['config']}")
+    print(f"\nLeaderboard saved to {path}")
+
+
+def main():
+    from train import DEFAULT_EVAL_EXAMPLES, MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep with successive halving.")
+    parser.add_argument("--space", help="JSON file with a {param: [values]} search space (defaults to a small built-in grid).")
+    parser.add_argument("--trials", type=int, help="Sample this many configs from the grid instead of running all of it.")
+    parser.add_argument("--threads-per-trial", type=int, default=2, help="CPU threads for each trial.")
+    parser.add_argument("--workers", type=int, help="Trials run in parallel (default: CPU cores / threads per trial).")
+    parser.add_argument("--rungs", type=int, default=3, help="Successive-halving rungs.")
+    parser.add_argument("--eta", type=int, default=3, help="Keep the best 1/eta trials after each rung.")
+    parser.add_argument("--eval-examples", type=int, default=DEFAULT_EVAL_EXAMPLES,
+                        help="Size of the stratified eval subsample used to rank trials.")
+    parser.add_argument("--max-train-examples", type=int, help="Train on a fixed subsample for faster sweeps.")
+    parser.add_argument("--model-name", default=MODEL_NAME)
+    parser.add_argument("--data-file", default=os.path.join(PROJECT_ROOT, 'data', 'processed', 'recipe_validation_dataset_raw.csv'))
+    parser.add_argument("--sweep-dir", default=os.path.join(DEFAULT_SWEEP_DIR, time.strftime("%Y%m%d-%H%M%S")))
+    args = parser.parse_args()
+
+    space = dict(DEFAULT_SEARCH_SPACE)
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    space.setdefault("max_length", [512])
+    space.setdefault("per_device_train_batch_size", [16])
+    configs = expand_search_space(space, args.trials)
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads_per_trial)
+    print(f"Sweeping {len(configs)} configs with {workers} workers x {args.threads_per_trial} threads")
+
+    os.makedirs(args.sweep_dir, exist_ok=True)
+    with open(os.path.join(args.sweep_dir, "space.json"), 'w') as f:
+        json.dump(space, f, indent=4)
+
+    # One tokenization for all trials, at the longest max_length in the space
+    data_dir = os.path.join(DEFAULT_SWEEP_DIR, "tokenized")
+    prepare_shared_dataset(data_dir, args.data_file, args.model_name, max(space["max_length"]), args.max_train_examples)
+
+    results = successive_halving(configs, data_dir, args.sweep_dir, workers, args.threads_per_trial,
+                                 args.eval_examples, args.model_name, num_rungs=args.rungs, eta=args.eta)
+    write_leaderboard(results, os.path.join(args.sweep_dir, "leaderboard.csv"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the model package the way the API does (`model.<module>`), from the project root.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
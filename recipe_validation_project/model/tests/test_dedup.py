@@ -0,0 +1,93 @@
+from model.dedup import (
+    LSHIndex, MinHasher, VerdictCache, cluster_duplicates, estimate_jaccard, normalize_text, recipe_shingle_text,
+)
+
+PANCAKES = {
+    "title": "Good Old-Fashioned Pancakes",
+    "ingredients": ["1 1/2 cups all-purpose flour", "3 1/2 teaspoons baking powder", "1 tablespoon white sugar",
+                    "1/4 teaspoon salt", "1 1/4 cups milk", "3 tablespoons butter, melted", "1 egg"],
+    "instructions": "Sift the flour, baking powder, sugar and salt together in a large bowl. Make a well in the "
+                    "center and add milk, melted butter and egg; mix until smooth. Heat a lightly oiled griddle "
+                    "over medium-high heat. Pour or scoop the batter onto the griddle, using approximately 1/4 cup "
+                    "for each pancake. Cook until bubbles form and the edges are dry, then flip and brown the other side.",
+}
+# Syndicated copy: different punctuation/case and one changed word.
+PANCAKES_COPY = dict(PANCAKES, title="GOOD OLD FASHIONED PANCAKES!",
+                     instructions=PANCAKES["instructions"].replace("large bowl", "big bowl"))
+MEATLOAF = {
+    "title": "Easy Meatloaf",
+    "ingredients": ["1 1/2 pounds ground beef", "1 egg", "1 onion, chopped", "1 cup milk", "1 cup dried bread crumbs",
+                    "salt and pepper to taste", "2 tablespoons brown sugar", "2 tablespoons prepared mustard",
+                    "1/3 cup ketchup"],
+    "instructions": "Preheat the oven to 350 degrees F. In a large bowl, combine the beef, egg, onion, milk and "
+                    "bread crumbs. Season with salt and pepper and place in a lightly greased loaf pan. In a separate "
+                    "small bowl, combine the brown sugar, mustard and ketchup. Mix well and pour over the meatloaf. "
+                    "Bake at 350 degrees F for 1 hour.",
+}
+
+
+def _text(recipe):
+    return recipe_shingle_text(recipe["title"], recipe["ingredients"], recipe["instructions"])
+
+
+def test_normalize_text():
+    assert normalize_text("  Old-Fashioned   PANCAKES!! ") == "old fashioned pancakes"
+
+
+def test_signatures_are_deterministic():
+    assert (MinHasher().signature(_text(PANCAKES)) == MinHasher().signature(_text(PANCAKES))).all()
+
+
+def test_near_duplicates_are_similar_and_distinct_recipes_are_not():
+    hasher = MinHasher()
+    pancakes, copy, meatloaf = (hasher.signature(_text(r)) for r in (PANCAKES, PANCAKES_COPY, MEATLOAF))
+    assert estimate_jaccard(pancakes, copy) >= 0.8
+    assert estimate_jaccard(pancakes, meatloaf) < 0.3
+
+
+def test_lsh_index_finds_only_near_duplicates():
+    hasher = MinHasher()
+    index = LSHIndex()
+    index.insert("pancakes", hasher.signature(_text(PANCAKES)))
+    index.insert("meatloaf", hasher.signature(_text(MEATLOAF)))
+    index.insert("pancakes", hasher.signature(_text(MEATLOAF)))  # re-insert is a no-op
+    assert len(index) == 2
+    assert [key for key, _ in index.query(hasher.signature(_text(PANCAKES_COPY)))] == ["pancakes"]
+
+
+def test_cluster_duplicates_keeps_first_seen_representative():
+    keys = ["a", "b", "c"]
+    texts = [_text(PANCAKES), _text(MEATLOAF), _text(PANCAKES_COPY)]
+    assert cluster_duplicates(keys, texts) == {"a": "a", "b": "b", "c": "a"}
+
+
+def test_verdict_cache_reuses_verdicts_of_near_duplicates():
+    cache = VerdictCache()
+    cache.store(cache.signature_for(PANCAKES), {"is_valid": True, "issues": []})
+    assert cache.lookup(cache.signature_for(PANCAKES_COPY)) == {"is_valid": True, "issues": []}
+    assert cache.lookup(cache.signature_for(MEATLOAF)) is None
+
+
+def test_verdict_cache_drops_new_entries_when_full_and_clear_forgets():
+    cache = VerdictCache(max_entries=1)
+    cache.store(cache.signature_for(PANCAKES), {"is_valid": True, "issues": []})
+    cache.store(cache.signature_for(MEATLOAF), {"is_valid": False, "issues": ["x"]})
+    assert cache.lookup(cache.signature_for(MEATLOAF)) is None
+    assert cache.lookup(cache.signature_for(PANCAKES)) is not None
+
+    cache.clear()
+    assert cache.lookup(cache.signature_for(PANCAKES)) is None
+    cache.store(cache.signature_for(MEATLOAF), {"is_valid": False, "issues": ["x"]})
+    assert cache.lookup(cache.signature_for(MEATLOAF)) == {"is_valid": False, "issues": ["x"]}
+
+
+def test_verdict_cache_only_returns_verdicts_of_the_current_model():
+    cache = VerdictCache()
+    signature = cache.signature_for(PANCAKES)
+    cache.store(signature, {"is_valid": True, "issues": []}, model=1.0)
+
+    assert cache.lookup(signature, model=1.0) == {"is_valid": True, "issues": []}
+    assert cache.lookup(signature, model=2.0) is None
+
+    cache.store(signature, {"is_valid": False, "issues": ["x"]}, model=2.0)
+    assert cache.lookup(signature, model=2.0) == {"is_valid": False, "issues": ["x"]}
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from model import hot_swap
+from model.hot_swap import ModelManager
+
+RECIPES = [{"title": "Pancakes", "ingredients": ["flour", "milk"], "instructions": "Mix and cook."}] * 4
+
+
+class FakeValidator:
+    """RecipeValidator stand-in whose verdict is fixed per model directory."""
+
+    def __init__(self, model_dir, is_valid=True):
+        self.model_dir = model_dir
+        self.model = object()
+        self.is_valid = is_valid
+        self.calls = 0
+
+    def validate_recipes(self, recipes):
+        self.calls += 1
+        return [{"is_valid": self.is_valid, "issues": []} for _ in recipes]
+
+
+@pytest.fixture
+def loaded(monkeypatch):
+    """Makes reloads build FakeValidators; maps model_dir -> validator (or an exception to raise)."""
+    models = {}
+
+    def load(model_dir):
+        model = models[model_dir]
+        if isinstance(model, Exception):
+            raise model
+        return model
+
+    monkeypatch.setattr(hot_swap, "RecipeValidator", load)
+    return models
+
+
+def _wait_for_reload(manager, reloads=1, serve=None):
+    """Waits until `reloads` reloads have finished, calling `serve()` meanwhile to produce live traffic."""
+    deadline = time.monotonic() + 10
+    while len(manager.history) < reloads:
+        assert time.monotonic() < deadline, "reload did not finish"
+        if serve:
+            serve()
+        time.sleep(0.01)
+    return manager.history[-1]
+
+
+def test_reload_swaps_in_new_model(loaded):
+    old = FakeValidator("old")
+    loaded["new"] = new = FakeValidator("new", is_valid=False)
+    manager = ModelManager(old)
+    loaded_at = manager.loaded_at
+    swaps = []
+    manager.on_swap(swaps.append)
+
+    assert manager.reload("new")
+    record = _wait_for_reload(manager)
+
+    assert record["outcome"] == "swapped"
+    assert new.calls == 2  # warm-up
+    assert manager.current is new
+    assert manager.loaded_at > loaded_at
+    assert swaps == [new]
+    result, info = manager.validate_batch(RECIPES[:1])[0]
+    assert result["is_valid"] is False
+    assert info["model_dir"] == "new"
+    assert manager.status()["state"] == "serving"
+
+
+def test_only_one_reload_at_a_time(loaded):
+    release = threading.Event()
+
+    class SlowValidator(FakeValidator):
+        def validate_recipes(self, recipes):
+            release.wait(timeout=5)
+            return super().validate_recipes(recipes)
+
+    loaded["new"] = SlowValidator("new")
+    manager = ModelManager(FakeValidator("old"))
+
+    assert manager.reload("new")
+    assert not manager.reload("new")
+    release.set()
+    assert _wait_for_reload(manager)["outcome"] == "swapped"
+
+
+@pytest.mark.parametrize("failure", [RuntimeError("bad weights"), FakeValidator("empty")])
+def test_failed_load_keeps_current_model(loaded, failure):
+    if isinstance(failure, FakeValidator):
+        failure.model = None  # directory without a model
+    loaded["broken"] = failure
+    old = FakeValidator("old")
+    manager = ModelManager(old)
+    loaded_at = manager.loaded_at
+
+    manager.reload("broken")
+    record = _wait_for_reload(manager)
+
+    assert record["outcome"].startswith("rejected")
+    assert manager.current is old
+    assert manager.loaded_at == loaded_at
+    assert manager.last_error
+
+
+def test_shadow_scoring_promotes_agreeing_candidate(loaded):
+    old = FakeValidator("old")
+    loaded["new"] = new = FakeValidator("new")
+    manager = ModelManager(old, shadow_min_recipes=8, shadow_timeout=5)
+
+    manager.reload("new", shadow_fraction=1.0)
+    record = _wait_for_reload(manager, serve=lambda: manager.validate_batch(RECIPES))
+
+    assert record["outcome"] == "swapped"
+    assert record["shadow"]["agreement"] == 1.0
+    assert record["shadow"]["recipes"] >= 8
+    assert new.calls > 2  # scored live batches in shadow, beyond the warm-up
+    assert manager.current is new
+
+
+def test_shadow_scoring_rejects_disagreeing_candidate(loaded):
+    old = FakeValidator("old")
+    loaded["new"] = FakeValidator("new", is_valid=False)
+    manager = ModelManager(old, shadow_min_recipes=8, shadow_timeout=5)
+
+    manager.reload("new", shadow_fraction=1.0)
+    record = _wait_for_reload(manager, serve=lambda: manager.validate_batch(RECIPES))
+
+    assert record["outcome"].startswith("rejected")
+    assert record["shadow"]["agreement"] == 0.0
+    assert manager.current is old
+    # Live results never come from the shadowed candidate.
+    assert all(result["is_valid"] for result, _ in manager.validate_batch(RECIPES))
@@ -0,0 +1,22 @@
+import os
+
+from model.model import BASE_MODEL_NAME, tokenizer_source
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+
+
+def test_tokenizer_source(tmp_path):
+    root = tmp_path / "saved_model"
+    _touch(str(root / "checkpoint-500" / "config.json"))
+
+    assert tokenizer_source(str(root / "checkpoint-500")) == BASE_MODEL_NAME
+
+    _touch(str(root / "tokenizer_config.json"))
+    assert tokenizer_source(str(root / "checkpoint-500")) == str(root)
+    assert tokenizer_source(str(root / "checkpoint-500") + os.sep) == str(root)
+
+    _touch(str(root / "checkpoint-500" / "tokenizer_config.json"))
+    assert tokenizer_source(str(root / "checkpoint-500")) == str(root / "checkpoint-500")
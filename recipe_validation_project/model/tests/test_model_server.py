@@ -0,0 +1,96 @@
+import asyncio
+import os
+
+import pytest
+
+from model.model_server import LocalBackend, ModelServer, ModelServerClient
+from model.request_scheduler import DeadlineExceeded, RequestScheduler
+
+RECIPE = {"title": "Pancakes", "ingredients": ["flour", "milk"], "instructions": "Mix and cook."}
+
+
+class FakeManager:
+    """Stands in for ModelManager: every recipe is valid, scored by a fixed model."""
+
+    loaded_at = 1000.0
+
+    def validate_batch(self, recipes):
+        info = {"model_dir": "fake", "loaded": True, "loaded_at": self.loaded_at}
+        return [({"is_valid": True, "issues": []}, info) for _ in recipes]
+
+    def status(self):
+        return {"model_dir": "fake", "state": "serving"}
+
+
+def _serve(tmp_path, test):
+    """Runs `test(client, backend)` against a model server on a temporary socket."""
+    socket_path = str(tmp_path / "model.sock")
+
+    async def run():
+        manager = FakeManager()
+        backend = LocalBackend(manager, RequestScheduler(manager.validate_batch, batch_window_ms=0))
+        server = asyncio.create_task(ModelServer(backend, socket_path).serve())
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.001)
+        client = ModelServerClient(socket_path)
+        try:
+            await test(client, backend)
+        finally:
+            await client.stop()
+            server.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await server
+
+    asyncio.run(run())
+
+
+def test_round_trip(tmp_path):
+    async def test(client, backend):
+        results = await asyncio.gather(*(client.validate(dict(RECIPE, title=f"Pancakes {i}")) for i in range(20)))
+        assert all(result == {"is_valid": True, "issues": []} for result, _ in results)
+        assert results[0][1] == {"model_dir": "fake", "loaded": True, "loaded_at": 1000.0}
+        assert await client.loaded_at() == 1000.0
+        assert await client.status() == {"model_dir": "fake", "state": "serving"}
+        assert (await client.metrics())["classes"]["interactive"]["completed"] == 20
+
+    _serve(tmp_path, test)
+
+
+def test_deadline_error(tmp_path):
+    async def test(client, backend):
+        with pytest.raises(DeadlineExceeded):
+            await client.validate(RECIPE, deadline_ms=0)
+        # The connection stays usable after an error response.
+        result, _ = await client.validate(RECIPE)
+        assert result["is_valid"]
+
+    _serve(tmp_path, test)
+
+
+def test_invalid_priority(tmp_path):
+    async def test(client, backend):
+        with pytest.raises(ValueError, match="Unknown priority class"):
+            await client.validate(RECIPE, priority="urgent")
+        with pytest.raises(ValueError, match="Unknown op"):
+            await client.request("retrain")
+
+    _serve(tmp_path, test)
+
+
+def test_unavailable_after_stop(tmp_path):
+    async def test(client, backend):
+        await client.validate(RECIPE)
+        await backend.stop()
+        # Surfaces as ConnectionError, which the API answers with 503.
+        with pytest.raises(ConnectionError):
+            await client.validate(RECIPE)
+
+    _serve(tmp_path, test)
+
+
+def test_unreachable_server(tmp_path):
+    async def run():
+        with pytest.raises(ConnectionError):
+            await ModelServerClient(str(tmp_path / "missing.sock")).validate(RECIPE)
+
+    asyncio.run(run())
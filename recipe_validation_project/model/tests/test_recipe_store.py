@@ -0,0 +1,111 @@
+import pytest
+
+from model.recipe_store import BatchWriter, RecipeStore
+
+
+@pytest.fixture
+def store():
+    store = RecipeStore(':memory:')
+    yield store
+    store.close()
+
+
+def _recipe(title, ingredients, url="https://www.allrecipes.com/recipe/1/pancakes/", recipe_id=None):
+    return {"source": "allrecipes", "recipe_id": recipe_id, "canonical_url": url, "title": title,
+            "ingredients": ingredients, "steps": ["Mix.", "Cook."]}
+
+
+def test_duplicate_url_in_one_batch_keeps_last(store):
+    first = _recipe("Pancakes", ["flour", "milk", "egg"])
+    second = _recipe("Fluffy Pancakes", ["flour", "buttermilk"])
+
+    ids = store.write_recipes([first, second])
+
+    assert ids[0] == ids[1]
+    recipe = store.get(ids[0])
+    assert recipe["title"] == "Fluffy Pancakes"
+    assert recipe["ingredients"] == ["flour", "buttermilk"]
+    assert store.counts()["recipes"] == 1
+    assert store.search("buttermilk") == [(ids[0], "Fluffy Pancakes")]
+    assert store.search("egg") == []
+
+
+def test_duplicate_source_id_in_one_batch_keeps_last(store):
+    first = _recipe("Pancakes", ["flour"], url=None, recipe_id=7)
+    second = _recipe("Waffles", ["flour", "oil"], url=None, recipe_id=7)
+
+    ids = store.write_recipes([first, second])
+
+    assert ids[0] == ids[1]
+    assert store.get_by_recipe_id(7, source="allrecipes")["title"] == "Waffles"
+    assert store.counts()["ingredients"] == 2
+
+
+@pytest.mark.parametrize("query", ["mac & cheese", "chef's special", 'the "best" mac', "banana-bread", "cheese AND", "("])
+def test_search_treats_punctuation_as_plain_text(store, query):
+    store.write_recipes([
+        _recipe("Chef's Special Mac & Cheese", ["macaroni", "cheddar cheese"], url="https://example.com/mac"),
+        _recipe("Banana-Bread", ["bananas", "flour"], url="https://example.com/banana"),
+    ])
+
+    # Must not raise an FTS5 syntax error; results depend on the terms.
+    store.search(query)
+
+
+def test_search_plain_and_raw(store):
+    mac, banana = store.write_recipes([
+        _recipe("Chef's Special Mac & Cheese", ["macaroni", "cheddar cheese"], url="https://example.com/mac"),
+        _recipe("Banana-Bread", ["bananas", "flour"], url="https://example.com/banana"),
+    ])
+
+    assert store.search("mac & cheese") == [(mac, "Chef's Special Mac & Cheese")]
+    assert store.search("chef's special") == [(mac, "Chef's Special Mac & Cheese")]
+    assert store.search("banana-bread") == [(banana, "Banana-Bread")]
+    assert store.search('"banana bread"') == [(banana, "Banana-Bread")]
+    assert store.search("   ") == []
+    assert store.search("title : mac OR title : banana", raw=True, limit=5) != []
+    assert store.with_ingredient("cheddar cheese") == [(mac, "Chef's Special Mac & Cheese")]
+
+
+def test_has_url_only_after_successful_crawl(store):
+    url = "https://www.allrecipes.com/recipe/2/waffles/"
+    assert not store.has_url(url)
+
+    store.record_crawls([{"url": url, "status": "failed"}])
+    assert not store.has_url(url)
+    store.record_crawls([{"url": url, "status": "scraped"}])
+    assert not store.has_url(url)
+
+    store.record_crawls([{"url": url, "status": "cleaned"}])
+    assert store.has_url(url)
+
+
+def test_has_url_for_stored_recipe(store):
+    store.write_recipes([_recipe("Pancakes", ["flour"])])
+
+    assert store.has_url("https://www.allrecipes.com/recipe/1/pancakes/")
+
+
+def test_repeated_upserts_replace_recipe(store):
+    pk = store.write_recipes([_recipe("Pancakes", ["flour", "milk", "egg"])])[0]
+    for title in ("Pancakes II", "Pancakes III"):
+        assert store.write_recipes([_recipe(title, ["flour", "water"])]) == [pk]
+
+    recipe = store.get(pk)
+    assert recipe["title"] == "Pancakes III"
+    assert recipe["ingredients"] == ["flour", "water"]
+    assert store.counts() == {"recipes": 1, "ingredients": 2, "steps": 2, "verdicts": 0, "crawl": 0}
+    assert store.search("pancakes") == [(pk, "Pancakes III")]
+    assert store.search("milk") == []
+
+
+def test_batch_writer_repeated_upserts(store):
+    with BatchWriter(store, batch_size=2) as writer:
+        for i in range(5):
+            writer.add_recipe(_recipe(f"Pancakes {i}", ["flour"] * (i + 1)))
+
+    recipe = store.get_by_url("https://www.allrecipes.com/recipe/1/pancakes/")
+    assert recipe["title"] == "Pancakes 4"
+    assert len(recipe["ingredients"]) == 5
+    assert store.counts()["recipes"] == 1
+    assert len(store.search("pancakes")) == 1
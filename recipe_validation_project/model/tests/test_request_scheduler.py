@@ -0,0 +1,142 @@
+import asyncio
+import threading
+
+import pytest
+
+from model.request_scheduler import DeadlineExceeded, RequestScheduler, SchedulerStopped
+
+
+def _recipe(name, words=1):
+    return {"title": name, "ingredients": ["flour"], "instructions": " ".join(["stir"] * words)}
+
+
+class GatedValidator:
+    """validate_batch stand-in that records batches and holds the first one until released."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, recipes):
+        self.batches.append([r["title"] for r in recipes])
+        self.started.set()
+        self.gate.wait(timeout=5)
+        return [{"title": r["title"]} for r in recipes]
+
+    async def wait_started(self):
+        while not self.started.is_set():
+            await asyncio.sleep(0.001)
+
+
+async def _hold_model(scheduler, validator, priority):
+    """Submits a blocker and waits until it occupies the model, so later submits queue up."""
+    blocker = asyncio.ensure_future(scheduler.submit(_recipe("blocker"), priority=priority))
+    await validator.wait_started()
+    return blocker
+
+
+def test_round_trip_and_invalid_priority():
+    async def run():
+        scheduler = RequestScheduler(lambda recipes: [{"title": r["title"]} for r in recipes], batch_window_ms=0)
+        try:
+            assert await scheduler.submit(_recipe("pancakes")) == {"title": "pancakes"}
+            with pytest.raises(ValueError):
+                await scheduler.submit(_recipe("pancakes"), priority="urgent")
+        finally:
+            await scheduler.stop()
+        with pytest.raises(SchedulerStopped):
+            await scheduler.submit(_recipe("pancakes"))
+
+    asyncio.run(run())
+
+
+def test_sheds_requests_whose_deadline_passes_in_queue():
+    async def run():
+        validator = GatedValidator()
+        scheduler = RequestScheduler(validator, batch_window_ms=0)
+        try:
+            with pytest.raises(DeadlineExceeded):
+                await scheduler.submit(_recipe("late"), deadline_ms=0)
+
+            blocker = await _hold_model(scheduler, validator, "interactive")
+            expiring = asyncio.ensure_future(scheduler.submit(_recipe("expiring"), deadline_ms=20))
+            patient = asyncio.ensure_future(scheduler.submit(_recipe("patient")))
+            await asyncio.sleep(0.05)
+            validator.gate.set()
+
+            await blocker
+            with pytest.raises(DeadlineExceeded):
+                await expiring
+            assert await patient == {"title": "patient"}
+            assert ["expiring"] not in validator.batches
+            stats = scheduler.metrics()["interactive"]
+            assert stats["shed"] == 2
+            assert stats["completed"] == 2
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+
+
+def test_weighted_fairness_between_classes():
+    async def run():
+        validator = GatedValidator()
+        scheduler = RequestScheduler(validator, class_weights={"interactive": 3.0, "backfill": 1.0},
+                                     max_batch_size=1, batch_window_ms=0)
+        try:
+            blocker = await _hold_model(scheduler, validator, "backfill")
+            jobs = [asyncio.ensure_future(scheduler.submit(_recipe(f"{priority}-{i}"), priority=priority))
+                    for i in range(8) for priority in ("backfill", "interactive")]
+            await asyncio.sleep(0.01)
+            validator.gate.set()
+            await asyncio.gather(blocker, *jobs)
+        finally:
+            await scheduler.stop()
+
+        served = [batch[0].split("-")[0] for batch in validator.batches[1:]]
+        # Interactive gets about three batches per backfill batch while both are queued...
+        assert served[:8].count("interactive") == 6
+        # ...but backfill is not starved until interactive runs dry.
+        assert "backfill" in served[:4]
+
+    asyncio.run(run())
+
+
+def test_batches_prefer_short_inputs():
+    async def run():
+        validator = GatedValidator()
+        scheduler = RequestScheduler(validator, max_batch_size=2, batch_window_ms=0, max_defer_ms=10_000)
+        try:
+            blocker = await _hold_model(scheduler, validator, "interactive")
+            jobs = [asyncio.ensure_future(scheduler.submit(_recipe(name, words)))
+                    for name, words in (("long", 200), ("short", 1), ("medium", 20))]
+            await asyncio.sleep(0.01)
+            validator.gate.set()
+            await asyncio.gather(blocker, *jobs)
+        finally:
+            await scheduler.stop()
+
+        assert validator.batches[1:] == [["short", "medium"], ["long"]]
+
+    asyncio.run(run())
+
+
+def test_overdue_long_input_is_not_starved():
+    async def run():
+        validator = GatedValidator()
+        scheduler = RequestScheduler(validator, max_batch_size=1, batch_window_ms=0, max_defer_ms=10)
+        try:
+            blocker = await _hold_model(scheduler, validator, "interactive")
+            long_job = asyncio.ensure_future(scheduler.submit(_recipe("long", 200)))
+            await asyncio.sleep(0.03)
+            short_job = asyncio.ensure_future(scheduler.submit(_recipe("short", 1)))
+            await asyncio.sleep(0.01)
+            validator.gate.set()
+            await asyncio.gather(blocker, long_job, short_job)
+        finally:
+            await scheduler.stop()
+
+        assert validator.batches[1:] == [["long"], ["short"]]
+
+    asyncio.run(run())
@@ -1,29 +1,29 @@
 import pandas as pd
-from datasets import Dataset, DatasetDict
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer
+from datasets import Dataset, DatasetDict, load_from_disk
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer, TrainerCallback, DataCollatorWithPadding
 import torch
 import os
+import sys
+import json
+import time
+import argparse
+import subprocess
 import numpy as np
 from sklearn.metrics import accuracy_score
+from torch.utils.data import DataLoader
+from early_exit import EarlyExitHeads, all_layer_logits, early_exit_predict, simulate_thresholds, calibrate_threshold
 
-def compute_metrics(eval_pred):
-    """Computes accuracy score for evaluation."""
-    logits, labels = eval_pred
-    predictions = np.argmax(logits, axis=-1)
-    return {"accuracy": accuracy_score(labels, predictions)}
+# Confidence thresholds scanned when calibrating early exit
+EARLY_EXIT_THRESHOLDS = [0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.975, 0.99]
 
-def main():
-    """Main function to train the model."""
-    print("Starting model training...")
+# Size of the fixed, stratified eval subsample used for intermediate checkpoints
+DEFAULT_EVAL_EXAMPLES = 2000
 
-    # --- 1. Load and Prepare Dataset ---
-    print("Loading prepared dataset...")
-    
-    # Construct the path to the data file relative to this script's location
-    script_dir = os.path.dirname(__file__)
-    project_root = os.path.abspath(os.path.join(script_dir, '..'))
-    data_file_path = os.path.join(project_root, 'data', 'processed', 'recipe_validation_dataset_raw.csv')
+# Pretrained encoder that is fine-tuned
+MODEL_NAME = "distilroberta-base"
 
+def load_splits(data_file_path):
+    """Loads the prepared dataset CSV and splits it 90/10 into 'train' and 'test'."""
     # Load the full dataset from the CSV file
     full_df = pd.read_csv(data_file_path)
     
@@ -39,22 +39,278 @@ def main():
 
     # Split the dataset into training and testing sets (90/10 split)
     print("Splitting dataset into train and test sets...")
-    train_test_split = dataset.train_test_split(test_size=0.1)
-    dataset_dict = DatasetDict({
+    # Fixed seed so --early-exit-only and sweep.py see the same held-out split as the fine-tuning run
+    train_test_split = dataset.train_test_split(test_size=0.1, seed=42)
+    return DatasetDict({
         'train': train_test_split['train'],
         'test': train_test_split['test']
     })
+
+def compute_metrics(eval_pred):
+    """Computes accuracy score for evaluation."""
+    predictions, labels = eval_pred
+    # Logits are reduced to class ids batch by batch (preprocess_logits_for_metrics),
+    # but accept raw logits too.
+    if predictions.ndim > 1:
+        predictions = np.argmax(predictions, axis=-1)
+    return {"accuracy": accuracy_score(labels, predictions)}
+
+def preprocess_logits_for_metrics(logits, labels):
+    """Keeps only the predicted class per example, so evaluation never holds the full logits matrix."""
+    if isinstance(logits, tuple):
+        logits = logits[0]
+    return logits.argmax(dim=-1)
+
+def stratified_subsample_indices(dataset, size, seed=42, label_column="labels"):
+    """
+    Sorted row indices of a fixed subsample of `size` rows with the same label proportions as `dataset`.
+    """
+    if size >= len(dataset):
+        return list(range(len(dataset)))
+    labels = np.asarray(dataset[label_column])
+    rng = np.random.RandomState(seed)
+    indices = []
+    for label in np.unique(labels):
+        label_indices = np.flatnonzero(labels == label)
+        take = max(1, int(round(size * len(label_indices) / len(labels))))
+        indices.extend(rng.choice(label_indices, size=min(take, len(label_indices)), replace=False).tolist())
+    return sorted(indices)
+
+def stratified_subsample(dataset, size, seed=42, label_column="labels"):
+    """
+    Returns a fixed subsample of `size` rows with the same label proportions as `dataset`.
+    """
+    if size >= len(dataset):
+        return dataset
+    return dataset.select(stratified_subsample_indices(dataset, size, seed, label_column))
+
+def score_checkpoint(checkpoint_dir, eval_data_dir, scores_file, batch_size=16, num_threads=1):
+    """
+    Scores a saved checkpoint on a tokenized eval set saved with `save_to_disk`
+    (with the tokenizer saved in its 'tokenizer' subdirectory).
+
+    Runs in a separate process launched by BackgroundCheckpointEvaluator and
+    appends {"checkpoint", "step", "accuracy"} to `scores_file`.
+    """
+    torch.set_num_threads(num_threads)
+    eval_dataset = load_from_disk(eval_data_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(checkpoint_dir)
+    model.eval()
+    # Checkpoints do not include the tokenizer; it is saved next to the eval data for padding
+    collator = DataCollatorWithPadding(AutoTokenizer.from_pretrained(os.path.join(eval_data_dir, "tokenizer")))
+
+    correct = total = 0
+    with torch.no_grad():
+        for batch in DataLoader(eval_dataset, batch_size=batch_size, collate_fn=collator):
+            labels = batch.pop("labels")
+            predictions = model(**batch).logits.argmax(dim=-1)
+            correct += (predictions == labels).sum().item()
+            total += len(labels)
+
+    step = int(checkpoint_dir.rstrip(os.sep).rsplit("-", 1)[-1]) if "checkpoint-" in checkpoint_dir else None
+    result = {"checkpoint": checkpoint_dir, "step": step, "accuracy": correct / total}
+    with open(scores_file, "a") as f:
+        f.write(json.dumps(result) + "\n")
+    print(f"Scored {checkpoint_dir}: accuracy {result['accuracy']:.4f}")
+
+class BackgroundCheckpointEvaluator(TrainerCallback):
+    """
+    Scores each saved checkpoint in a separate process while training continues.
+
+    One scorer runs at a time with a small thread budget so it does not starve
+    training; checkpoints saved meanwhile are queued. Scores left in
+    `scores_file` by an earlier run are moved to `<scores_file>.prev`, and only
+    checkpoints saved by this run are candidates for the best checkpoint.
+    """
+
+    def __init__(self, eval_data_dir, scores_file, num_threads=1):
+        self.eval_data_dir = eval_data_dir
+        self.scores_file = scores_file
+        self.num_threads = num_threads
+        self.pending = []
+        self.saved = set()
+        self.process = None
+        if os.path.exists(scores_file):
+            os.replace(scores_file, scores_file + ".prev")
+
+    def _launch_next(self):
+        if self.process is not None and self.process.poll() is None:
+            return
+        if not self.pending:
+            self.process = None
+            return
+        checkpoint_dir = self.pending.pop(0)
+        env = dict(os.environ, OMP_NUM_THREADS=str(self.num_threads), MKL_NUM_THREADS=str(self.num_threads))
+        self.process = subprocess.Popen([
+            sys.executable, os.path.abspath(__file__),
+            "--score-checkpoint", checkpoint_dir,
+            "--eval-data", self.eval_data_dir,
+            "--scores-file", self.scores_file,
+            "--eval-threads", str(self.num_threads),
+        ], env=env)
+
+    def on_save(self, args, state, control, **kwargs):
+        checkpoint_dir = os.path.join(args.output_dir, f"checkpoint-{state.global_step}")
+        self.saved.add(checkpoint_dir)
+        self.pending.append(checkpoint_dir)
+        self._launch_next()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if self.pending:
+            self._launch_next()
+
+    def wait(self):
+        """Blocks until every queued checkpoint has been scored."""
+        while self.process is not None or self.pending:
+            if self.process is not None:
+                self.process.wait()
+            self.process = None
+            self._launch_next()
+
+    def best_checkpoint(self):
+        """Checkpoint of this run with the highest background accuracy, or None."""
+        if not os.path.exists(self.scores_file):
+            return None
+        with open(self.scores_file) as f:
+            scores = [json.loads(line) for line in f if line.strip()]
+        scores = [s for s in scores if s["checkpoint"] in self.saved]
+        return max(scores, key=lambda s: s["accuracy"])["checkpoint"] if scores else None
+
+def train_early_exit_heads(model, train_dataset, device, epochs=1, batch_size=16, learning_rate=1e-3, collate_fn=None):
+    """
+    Trains one classification head per intermediate layer on top of the frozen fine-tuned model.
+
+    Returns:
+        EarlyExitHeads: The trained heads, in eval mode.
+    """
+    model.eval()
+    heads = EarlyExitHeads.for_model(model).to(device)
+    optimizer = torch.optim.AdamW(heads.parameters(), lr=learning_rate)
+    loss_fn = torch.nn.CrossEntropyLoss()
+    loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, collate_fn=collate_fn)
+
+    for epoch in range(epochs):
+        heads.train()
+        total_loss = 0.0
+        for step, batch in enumerate(loader):
+            input_ids = batch["input_ids"].to(device)
+            attention_mask = batch["attention_mask"].to(device)
+            labels = batch["labels"].to(device)
+            # The backbone is frozen; only the exit heads receive gradients.
+            with torch.no_grad():
+                hidden_states = model.base_model(input_ids=input_ids, attention_mask=attention_mask, output_hidden_states=True).hidden_states
+            loss = sum(loss_fn(head(h), labels) for head, h in zip(heads.heads, hidden_states[1:-1]))
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+            if step % 100 == 0:
+                print(f"Early-exit epoch {epoch + 1} step {step}: loss {total_loss / (step + 1):.4f}")
+
+    heads.eval()
+    return heads
+
+
+@torch.no_grad()
+def collect_exit_probabilities(model, heads, dataset, device, batch_size=16, collate_fn=None):
+    """Returns ((num_layers, n, num_labels) exit probabilities, (n,) labels) for a dataset."""
+    probs, labels = [], []
+    for batch in DataLoader(dataset, batch_size=batch_size, collate_fn=collate_fn):
+        logits = all_layer_logits(model, heads, batch["input_ids"].to(device), batch["attention_mask"].to(device))
+        probs.append(torch.stack([torch.softmax(l, dim=-1) for l in logits]).cpu())
+        labels.append(batch["labels"])
+    return torch.cat(probs, dim=1), torch.cat(labels)
+
+
+@torch.no_grad()
+def measure_early_exit_latency(model, heads, dataset, device, threshold, batch_size=16, collate_fn=None):
+    """Wall-clock milliseconds per example for early-exit inference at a threshold."""
+    start = time.perf_counter()
+    for batch in DataLoader(dataset, batch_size=batch_size, collate_fn=collate_fn):
+        early_exit_predict(model, heads, batch["input_ids"].to(device), batch["attention_mask"].to(device), threshold)
+    return (time.perf_counter() - start) * 1000 / len(dataset)
+
+
+def evaluate_early_exit(model, heads, held_out, device, latency_examples=256, collate_fn=None):
+    """
+    Calibrates the exit threshold and reports the accuracy/latency curve.
+
+    The held-out split is halved: the threshold is calibrated on one half and
+    the curve (accuracy, mean exit layer, exit-layer distribution and measured
+    latency per threshold) is reported on the other.
+
+    Returns:
+        tuple: (threshold, report dict)
+    """
+    halves = held_out.train_test_split(test_size=0.5, seed=42)
+    calibration, report_split = halves["train"], halves["test"]
+
+    calib_probs, calib_labels = collect_exit_probabilities(model, heads, calibration, device, collate_fn=collate_fn)
+    full_accuracy = (calib_probs[-1].argmax(dim=-1) == calib_labels).float().mean().item()
+    threshold = calibrate_threshold(simulate_thresholds(calib_probs, calib_labels, EARLY_EXIT_THRESHOLDS), full_accuracy)
+
+    report_probs, report_labels = collect_exit_probabilities(model, heads, report_split, device, collate_fn=collate_fn)
+    curve = simulate_thresholds(report_probs, report_labels, EARLY_EXIT_THRESHOLDS + [1.01])
+    latency_split = report_split.select(range(min(latency_examples, len(report_split))))
+    for point in curve:
+        point["latency_ms"] = measure_early_exit_latency(model, heads, latency_split, device, point["threshold"], collate_fn=collate_fn)
+
+    print(f"Calibrated early-exit threshold: {threshold}")
+    print(f"{'threshold':>10} {'accuracy':>9} {'mean layer':>11} {'ms/example':>11}  exit distribution")
+    for point in curve:
+        label = "full" if point["threshold"] > 1 else point["threshold"]
+        print(f"{label:>10} {point['accuracy']:>9.4f} {point['mean_exit_layer']:>11.2f} {point['latency_ms']:>11.2f}  {point['exit_distribution']}")
+
+    return threshold, {"calibration_full_accuracy": full_accuracy, "curve": curve}
+
+
+def main():
+    """Main function to train the model."""
+    parser = argparse.ArgumentParser(description="Fine-tune the recipe validation model.")
+    parser.add_argument("--early-exit", action="store_true",
+                        help="After training, train and calibrate early-exit heads on the intermediate layers.")
+    parser.add_argument("--early-exit-only", action="store_true",
+                        help="Skip fine-tuning; train early-exit heads for the model already in saved_model.")
+    parser.add_argument("--eval-mode", choices=["subsample", "background", "full"], default="subsample",
+                        help="Intermediate checkpoint evaluation: a fixed stratified subsample in the training loop, "
+                             "the same subsample scored by a separate process, or the full test split (slow).")
+    parser.add_argument("--eval-examples", type=int, default=DEFAULT_EVAL_EXAMPLES,
+                        help="Size of the stratified eval subsample for intermediate checkpoints.")
+    parser.add_argument("--eval-threads", type=int, default=1,
+                        help="CPU threads for the background checkpoint scorer.")
+    # Used internally by BackgroundCheckpointEvaluator
+    parser.add_argument("--score-checkpoint", help=argparse.SUPPRESS)
+    parser.add_argument("--eval-data", help=argparse.SUPPRESS)
+    parser.add_argument("--scores-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.score_checkpoint:
+        score_checkpoint(args.score_checkpoint, args.eval_data, args.scores_file, num_threads=args.eval_threads)
+        return
+
+    print("Starting model training...")
+
+    # --- 1. Load and Prepare Dataset ---
+    print("Loading prepared dataset...")
+    
+    # Construct the path to the data file relative to this script's location
+    script_dir = os.path.dirname(__file__)
+    project_root = os.path.abspath(os.path.join(script_dir, '..'))
+    data_file_path = os.path.join(project_root, 'data', 'processed', 'recipe_validation_dataset_raw.csv')
+
+    dataset_dict = load_splits(data_file_path)
     
     print(f"Train dataset size: {len(dataset_dict['train'])}")
     print(f"Test dataset size: {len(dataset_dict['test'])}")
 
     # --- 2. Tokenization ---
-    model_name = "distilroberta-base"
+    model_name = MODEL_NAME
     print(f"Loading tokenizer for '{model_name}'...")
     tokenizer = AutoTokenizer.from_pretrained(model_name)
 
     def tokenize_function(examples):
-        return tokenizer(examples["text"], padding="max_length", truncation=True, max_length=512)
+        # No padding here: batches are padded to their longest example by the data collator
+        return tokenizer(examples["text"], truncation=True, max_length=512)
 
     print("Tokenizing datasets...")
     tokenized_datasets = dataset_dict.map(tokenize_function, batched=True)
@@ -65,10 +321,15 @@ def main():
     tokenized_datasets = tokenized_datasets.rename_column("label", "labels")
     # Set the format to PyTorch tensors
     tokenized_datasets.set_format("torch")
+    data_collator = DataCollatorWithPadding(tokenizer)
 
-    # --- 3. Model Training ---
-    print(f"Loading model '{model_name}' for sequence classification...")
-    model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=2)
+    # Intermediate checkpoints are scored on a fixed stratified subsample; the
+    # full test split is only used for the final model.
+    if args.eval_mode == "full":
+        checkpoint_eval_dataset = tokenized_datasets["test"]
+    else:
+        checkpoint_eval_dataset = stratified_subsample(tokenized_datasets["test"], args.eval_examples)
+    print(f"Checkpoint eval dataset size: {len(checkpoint_eval_dataset)}")
 
     # Define output directory for model and training artifacts
     output_dir = os.path.join(project_root, 'model', 'saved_model')
@@ -76,43 +337,90 @@ def main():
     # Check for available device
     device = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
     print(f"Training will use device: {device}")
-    
-    # For MPS, some operations might need to be explicitly handled on CPU
-    # No specific changes needed here for standard Trainer, but good to be aware.
-
-    training_args = TrainingArguments(
-        output_dir=output_dir,
-        num_train_epochs=1,  # Start with 1 epoch for a quick baseline
-        per_device_train_batch_size=16,
-        per_device_eval_batch_size=16,
-        warmup_steps=500,
-        weight_decay=0.01,
-        logging_dir=os.path.join(project_root, 'logs'),
-        logging_steps=100,
-        evaluation_strategy="steps",
-        eval_steps=500,
-        save_strategy="steps",
-        save_steps=500,
-        load_best_model_at_end=True,
-        metric_for_best_model="accuracy", # You can also use "loss", "f1", etc.
-        greater_is_better=True,
-    )
-    
-    trainer = Trainer(
-        model=model,
-        args=training_args,
-        train_dataset=tokenized_datasets["train"],
-        eval_dataset=tokenized_datasets["test"],
-        compute_metrics=compute_metrics,
-    )
-
-    print("Starting training...")
-    trainer.train()
-
-    # --- 4. Save Final Model ---
-    print(f"Saving the fine-tuned model and tokenizer to {output_dir}...")
-    trainer.save_model(output_dir)
-    tokenizer.save_pretrained(output_dir)
+
+    if args.early_exit_only:
+        print(f"Loading fine-tuned model from {output_dir}...")
+        model = AutoModelForSequenceClassification.from_pretrained(output_dir)
+        model.to(device)
+    else:
+        # --- 3. Model Training ---
+        print(f"Loading model '{model_name}' for sequence classification...")
+        model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=2)
+
+        # For MPS, some operations might need to be explicitly handled on CPU
+        # No specific changes needed here for standard Trainer, but good to be aware.
+
+        in_loop_eval = args.eval_mode != "background"
+        callbacks = []
+        if not in_loop_eval:
+            # The scorer process reads the eval subsample from disk
+            eval_data_dir = os.path.join(output_dir, "eval_subsample")
+            checkpoint_eval_dataset.save_to_disk(eval_data_dir)
+            tokenizer.save_pretrained(os.path.join(eval_data_dir, "tokenizer"))
+            background_evaluator = BackgroundCheckpointEvaluator(
+                eval_data_dir, os.path.join(output_dir, "checkpoint_scores.jsonl"), num_threads=args.eval_threads
+            )
+            callbacks.append(background_evaluator)
+
+        training_args = TrainingArguments(
+            output_dir=output_dir,
+            num_train_epochs=1,  # Start with 1 epoch for a quick baseline
+            per_device_train_batch_size=16,
+            per_device_eval_batch_size=16,
+            warmup_steps=500,
+            weight_decay=0.01,
+            logging_steps=100,
+            eval_strategy="steps" if in_loop_eval else "no",
+            eval_steps=500,
+            save_strategy="steps",
+            save_steps=500,
+            load_best_model_at_end=in_loop_eval,
+            metric_for_best_model="accuracy", # You can also use "loss", "f1", etc.
+            greater_is_better=True,
+        )
+        
+        trainer = Trainer(
+            model=model,
+            args=training_args,
+            train_dataset=tokenized_datasets["train"],
+            eval_dataset=checkpoint_eval_dataset,
+            data_collator=data_collator,
+            processing_class=tokenizer,  # saved with each checkpoint, so checkpoints load on their own
+            compute_metrics=compute_metrics,
+            preprocess_logits_for_metrics=preprocess_logits_for_metrics,
+            callbacks=callbacks,
+        )
+
+        print("Starting training...")
+        trainer.train()
+
+        if not in_loop_eval:
+            print("Waiting for background checkpoint scoring to finish...")
+            background_evaluator.wait()
+            best_checkpoint = background_evaluator.best_checkpoint()
+            if best_checkpoint:
+                print(f"Loading best checkpoint by background eval: {best_checkpoint}")
+                best_model = AutoModelForSequenceClassification.from_pretrained(best_checkpoint)
+                trainer.model.load_state_dict(best_model.state_dict())
+
+        # Full-set evaluation, for the final model only
+        print("Evaluating the final model on the full test split...")
+        final_metrics = trainer.evaluate(eval_dataset=tokenized_datasets["test"], metric_key_prefix="final")
+        print(f"Final metrics: {final_metrics}")
+
+        # --- 4. Save Final Model ---
+        print(f"Saving the fine-tuned model and tokenizer to {output_dir}...")
+        trainer.save_model(output_dir)
+        tokenizer.save_pretrained(output_dir)
+
+    # --- 5. Early-Exit Heads ---
+    if args.early_exit or args.early_exit_only:
+        print("Training early-exit heads on intermediate layers...")
+        heads = train_early_exit_heads(model, tokenized_datasets["train"], device, collate_fn=data_collator)
+        print("Calibrating early-exit threshold on the held-out split...")
+        threshold, report = evaluate_early_exit(model, heads, tokenized_datasets["test"], device, collate_fn=data_collator)
+        heads.save(output_dir, threshold=threshold, report=report)
+        print(f"Saved early-exit heads to {output_dir}")
     
     print("Training complete!")
 
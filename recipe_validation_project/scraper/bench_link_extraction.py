@@ -0,0 +1,290 @@
+# Parity check and pages/sec benchmark for the category page link extractors.
+#
+# Saved pages live in a corpus directory next to an index.json mapping each
+# file name to the URL it was fetched from (needed to resolve relative links).
+#
+#   python scraper/bench_link_extraction.py --fetch https://www.allrecipes.com/recipes/78/breakfast-and-brunch/
+#   python scraper/bench_link_extraction.py --synthesize 4   # offline: realistic-size generated pages
+#   python scraper/bench_link_extraction.py
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+import requests
+
+from link_extraction import LINK_EXTRACTORS
+from sitemap import DEFAULT_HEADERS
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(__file__), "data", "pages")
+
+
+def load_corpus(corpus_dir):
+    """Returns a list of (page_url, html_bytes) from a corpus directory."""
+    index_path = os.path.join(corpus_dir, "index.json")
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    pages = []
+    for filename, page_url in sorted(index.items()):
+        with open(os.path.join(corpus_dir, filename), 'rb') as f:
+            pages.append((page_url, f.read()))
+    return pages
+
+
+def fetch_into_corpus(urls, corpus_dir):
+    """Downloads pages and records them in the corpus index."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    index_path = os.path.join(corpus_dir, "index.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    for url in urls:
+        response = requests.get(url, headers=DEFAULT_HEADERS, timeout=25)
+        response.raise_for_status()
+        filename = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + ".html"
+        with open(os.path.join(corpus_dir, filename), 'wb') as f:
+            f.write(response.content)
+        index[filename] = url
+        print(f"Saved {url} -> {filename}")
+        time.sleep(0.5) # Respectful delay
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=4)
+
+
+# --- Synthetic category pages ---
+#
+# Live category pages are 0.5-1 MB: a large inline stylesheet, JSON-LD, inline
+# scripts and an SVG sprite in <head>, a mega-menu and footer of plain links,
+# and several card lists of 24 recipe cards each in <main>. When the network
+# is unavailable, `--synthesize` writes seeded pages with that shape and size
+# so the pages/sec numbers reflect the tokenizer work on a real page.
+
+_WORDS = ("chicken", "beef", "pork", "salmon", "shrimp", "tofu", "pasta", "rice", "bean", "lentil", "potato",
+          "tomato", "garlic", "lemon", "honey", "ginger", "chili", "cheese", "butter", "cream", "mushroom",
+          "spinach", "broccoli", "corn", "apple", "banana", "berry", "chocolate", "vanilla", "cinnamon",
+          "easy", "quick", "classic", "creamy", "crispy", "spicy", "baked", "grilled", "roasted", "slow-cooker",
+          "one-pan", "skillet", "casserole", "soup", "salad", "tacos", "curry", "stew", "bread", "muffins",
+          "pancakes", "cookies", "cake", "pie", "crème", "brûlée", "jalapeño", "sauté", "purée")
+
+
+def _slug(rng, words=3):
+    return "-".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _title(slug):
+    return slug.replace("-", " ").title()
+
+
+def _stylesheet(rng, rules):
+    lines = []
+    for i in range(rules):
+        selector = f".mntl-{_slug(rng, 2)}-{i} .card__{rng.choice(['title', 'media', 'content', 'meta'])}"
+        lines.append(f"{selector}{{margin:{rng.randint(0, 32)}px {rng.randint(0, 32)}px;color:#{rng.randrange(16 ** 6):06x};"
+                     f"font-size:{rng.randint(10, 28)}px;line-height:{rng.uniform(1, 2):.2f}}}")
+    return "\n".join(lines)
+
+
+def _inline_script(rng, statements):
+    lines = ["(function(){var d=window.Mntl||{};"]
+    for i in range(statements):
+        lines.append(f"d['{_slug(rng, 2)}_{i}']={{id:{rng.randrange(10 ** 7)},on:{str(rng.random() < 0.5).lower()},"
+                     f"cfg:'{rng.randrange(16 ** 12):012x}'}};")
+    lines.append("window.Mntl=d;})();")
+    return "".join(lines)
+
+
+def _svg_sprite(rng, symbols):
+    parts = ['<svg class="is-hidden" xmlns="http://www.w3.org/2000/svg"><defs>']
+    for i in range(symbols):
+        path = " ".join(f"L{rng.uniform(0, 24):.3f} {rng.uniform(0, 24):.3f}" for _ in range(40))
+        parts.append(f'<symbol id="icon-{i}" viewBox="0 0 24 24"><path d="M0 0 {path} Z"></path></symbol>')
+    parts.append('</defs></svg>')
+    return "".join(parts)
+
+
+def _recipe_card(rng, card_id):
+    slug = _slug(rng)
+    doc_id = rng.randrange(6_000_000, 8_000_000)
+    url = f"https://www.allrecipes.com/recipe/{rng.randrange(10_000, 300_000)}/{slug}/"
+    image = f"https://www.allrecipes.com/thmb/{rng.randrange(16 ** 16):016x}=/282x188/filters:no_upscale():max_bytes(150000):strip_icc()/{doc_id}.jpg"
+    srcset = ", ".join(f"{image.replace('282x188', f'{w}x{w * 2 // 3}')} {w}w" for w in (160, 282, 375, 750))
+    rating = rng.randint(3, 5)
+    stars = "".join('<svg class="icon icon-star"><use href="#icon-star"></use></svg>' for _ in range(rating))
+    return (
+        f'<a class="comp mntl-card-list-items mntl-universal-card mntl-document-card mntl-card card card--no-image" '
+        f'id="mntl-card-list-items_{card_id}" data-doc-id="{doc_id}" data-tax-levels="" data-ordinal="{card_id}" href="{url}">\n'
+        f'<div class="loc card__top"><div class="card__media mntl-universal-card__media universal-image__container">'
+        f'<div class="img-placeholder" style="padding-bottom:66.6%;">'
+        f'<img data-src="{image}" data-srcset="{srcset}" sizes="282px" width="282" height="188" alt="{_title(slug)}" '
+        f'class="card__img universal-image__image lazyload"></div></div></div>\n'
+        f'<div class="card__content" data-tag="{rng.choice(_WORDS).title()}"><span class="card__title">'
+        f'<span class="card__title-text">{_title(slug)}</span></span>'
+        f'<div class="mntl-recipe-card-meta"><div class="mntl-recipe-star-rating">{stars}</div>'
+        f'<div class="mntl-recipe-card-meta__rating-count-number">{rng.randint(1, 20000):,}<span> Ratings</span></div></div></div>\n'
+        f'</a>\n'
+    )
+
+
+def _link_list(rng, count, css_class):
+    items = []
+    for _ in range(count):
+        href = f"/recipes/{rng.randrange(76, 20000)}/{_slug(rng, 2)}/"
+        if rng.random() < 0.1:
+            href += f"?utm_source=nav&amp;utm_medium={rng.choice(_WORDS)}"
+        items.append(f'<li class="{css_class}"><a href="{href}" data-ordinal="{len(items)}">{_title(_slug(rng, 2))}</a></li>')
+    return "\n".join(items)
+
+
+def synthesize_category_page(seed, page_url, card_lists=5, cards_per_list=24):
+    """Builds a deterministic category page with the structure and size of a live one. Returns UTF-8 bytes."""
+    rng = random.Random(seed)
+    recipes = []
+    head = [
+        '<!DOCTYPE html>\n<html lang="en" class="comp html mntl-html no-js">\n<head>\n<meta charset="utf-8">',
+        f'<title>{_title(_slug(rng, 2))} Recipes</title>',
+        f'<link rel="canonical" href="{page_url}">',
+    ]
+    head += [f'<link rel="preload" as="font" href="/static/fonts/font-{i}.woff2" crossorigin>' for i in range(30)]
+    head.append(f'<style>{_stylesheet(rng, 1500)}</style>')
+    head.append('<script type="application/ld+json">' + json.dumps({
+        "@context": "http://schema.org", "@type": "ItemList",
+        "itemListElement": [{"@type": "ListItem", "position": i, "url": f"https://www.allrecipes.com/recipe/{i}/{_slug(rng)}/",
+                             "name": _title(_slug(rng)), "description": " ".join(rng.choice(_WORDS) for _ in range(30))}
+                            for i in range(120)],
+    }) + '</script>')
+    head += [f'<script>{_inline_script(rng, 250)}</script>' for _ in range(6)]
+    head.append('</head>')
+
+    body = ['<body class="comp taxonomysc-body mntl-body">', _svg_sprite(rng, 120)]
+    body.append('<!-- header -->\n<header class="comp header mntl-header"><nav class="mntl-fullscreen-nav"><ul class="mntl-fullscreen-nav__list">')
+    body.append(_link_list(rng, 300, "mntl-fullscreen-nav__sublist-item"))
+    body.append('</ul></nav><a href="/account/signin/" class="mntl-header__account">Log In</a></header>')
+
+    body.append('<main id="main" class="loc main"><nav class="mntl-breadcrumbs"><a href="/recipes/">Recipes</a></nav>')
+    body.append(f'<div class="comp mntl-sc-page mntl-block"><p>{" ".join(rng.choice(_WORDS) for _ in range(120))}</p></div>')
+    card_id = 0
+    for list_index in range(card_lists):
+        if list_index == 0:
+            body.append('<div class="comp tax-sc__recirc-list card-list mntl-universal-card-list mntl-document-card-list mntl-card-list mntl-block">')
+        else:
+            body.append('<div class="comp card-list mntl-universal-card-list mntl-document-card-list mntl-card-list mntl-block">')
+        for _ in range(cards_per_list):
+            body.append(_recipe_card(rng, card_id))
+            card_id += 1
+        body.append('</div>')
+    # Collection links (other category pages) in a taxonomy group, as on live pages.
+    body.append('<div class="comp mntl-taxonomysc-article-list-group mntl-block"><ul>')
+    for i in range(12):
+        body.append(f'<li class="mntl-block"><a class="mntl-card-list-items" data-doc-id="{rng.randrange(10 ** 7)}" '
+                    f'href="/recipes/{rng.randrange(76, 20000)}/{_slug(rng, 2)}/">{_title(_slug(rng, 2))}</a></li>')
+    body.append('</ul></div></main>')
+
+    body.append('<footer class="comp footer mntl-footer"><ul class="mntl-footer__list">')
+    body.append(_link_list(rng, 150, "mntl-footer__item"))
+    body.append('</ul><form class="mntl-newsletter-signup" action="/newsletters/"><input type="email" name="email"></form></footer>')
+    body.append('</body>\n</html>\n')
+    return "\n".join(head + body).encode('utf-8')
+
+
+def synthesize_into_corpus(count, corpus_dir, seed=0):
+    """Writes `count` synthetic category pages into the corpus and its index."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    index_path = os.path.join(corpus_dir, "index.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    for i in range(count):
+        page_url = f"https://www.allrecipes.com/recipes/{1000 + i}/synthetic-category-{i}/"
+        filename = f"synthetic-category-{i}.html"
+        html = synthesize_category_page(seed + i, page_url)
+        with open(os.path.join(corpus_dir, filename), 'wb') as f:
+            f.write(html)
+        index[filename] = page_url
+        print(f"Synthesized {page_url} -> {filename} ({len(html) / 1e3:.0f} KB)")
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=4)
+
+
+def check_parity(pages, extractors, reference='soup'):
+    """Compares every extractor against the reference on every page. Returns the number of mismatches."""
+    mismatches = 0
+    for page_url, html in pages:
+        expected = LINK_EXTRACTORS[reference](html, page_url)
+        for name in extractors:
+            if name == reference:
+                continue
+            actual = LINK_EXTRACTORS[name](html, page_url)
+            if actual != expected:
+                mismatches += 1
+                print(f"MISMATCH [{name}] {page_url}")
+                print(f"  recipes: missing {len(expected[0] - actual[0])}, extra {len(actual[0] - expected[0])}")
+                print(f"  collections: missing {len(expected[1] - actual[1])}, extra {len(actual[1] - expected[1])}")
+    return mismatches
+
+
+def benchmark(pages, extractors, repeat=5):
+    """Returns {extractor: pages/sec} over `repeat` passes of the corpus."""
+    results = {}
+    for name in extractors:
+        extract = LINK_EXTRACTORS[name]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page_url, html in pages:
+                extract(html, page_url)
+        elapsed = time.perf_counter() - start
+        results[name] = (len(pages) * repeat) / elapsed
+    return results
+
+
+def available_extractors():
+    """Extractors whose optional dependencies are installed."""
+    names = ['soup', 'stream']
+    try:
+        import lxml  # noqa: F401
+        names.append('lxml')
+    except ImportError:
+        pass
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check parity and benchmark link extractors on saved pages.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--fetch", nargs="*", default=[], help="Page URLs to download into the corpus first.")
+    parser.add_argument("--synthesize", type=int, default=0,
+                        help="Write this many generated, realistic-size category pages into the corpus first.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_into_corpus(args.fetch, args.corpus)
+    if args.synthesize:
+        synthesize_into_corpus(args.synthesize, args.corpus)
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        print(f"No saved pages in {args.corpus}. Use --fetch to build a corpus.")
+        sys.exit(1)
+
+    extractors = available_extractors()
+    print(f"Corpus: {len(pages)} pages, {sum(len(h) for _, h in pages) / 1e6:.1f} MB")
+    mismatches = check_parity(pages, extractors)
+    print(f"Parity: {mismatches} mismatching page/extractor pairs")
+
+    results = benchmark(pages, extractors, repeat=args.repeat)
+    baseline = results['soup']
+    for name, pages_per_sec in results.items():
+        print(f"{name:>8}: {pages_per_sec:8.1f} pages/sec ({pages_per_sec / baseline:.1f}x)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
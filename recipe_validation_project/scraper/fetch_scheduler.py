@@ -0,0 +1,237 @@
+# Adaptive rate limiting and retries for page fetches and Gemini calls.
+#
+# Every call goes through a per-endpoint limiter (one per host, one for the
+# LLM). The limiter grows its concurrency additively while latency stays near
+# the best seen and halves it on throttling or server errors (AIMD), so the
+# scraper settles at the highest rate an endpoint sustains without hand-tuned
+# sleeps. Failed calls are retried with jittered exponential backoff, honoring
+# Retry-After; items that still fail land in a dead-letter queue on disk.
+
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+
+from http_cache import CacheMiss
+
+DEFAULT_DEAD_LETTER_PATH = os.path.join(os.path.dirname(__file__), "data", "dead_letter.jsonl")
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    """Parses a Retry-After header (delta-seconds or HTTP-date) into seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def classify_exception(exc):
+    """
+    Decides whether a failed call is worth retrying.
+
+    Returns:
+        tuple: (retryable, throttled, retry_after_seconds). `throttled` marks
+               errors that signal overload (429/5xx) and should shrink the
+               endpoint's concurrency.
+    """
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        if status in RETRYABLE_STATUS_CODES:
+            return True, True, parse_retry_after(exc.response.headers.get("Retry-After"))
+        return False, False, None
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True, False, None
+    # google.api_core exceptions carry the HTTP status as an int `code`
+    # (ResourceExhausted -> 429, ServiceUnavailable -> 503, ...).
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True, True, None
+    return False, False, None
+
+
+class EndpointLimiter:
+    """
+    AIMD concurrency limiter for a single endpoint.
+
+    The limit rises by 1/limit per successful call while latency stays within
+    `latency_tolerance` of the best smoothed latency seen, shrinks by 10% when
+    latency degrades beyond it, and halves on throttling. A Retry-After or
+    backoff from one caller pauses the whole endpoint.
+    """
+
+    def __init__(self, name, initial_limit=1.0, max_limit=8.0, latency_tolerance=2.0):
+        self.name = name
+        self.limit = initial_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.not_before = 0.0
+        self.latency_ewma = None
+        self.best_latency = None
+        self.stats = {"calls": 0, "errors": 0, "throttled": 0}
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self.not_before - time.monotonic()
+                if wait <= 0 and self.in_flight < max(1, int(self.limit)):
+                    self.in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, latency=None, error=False, throttled=False, pause=None):
+        with self._cond:
+            self.in_flight -= 1
+            self.stats["calls"] += 1
+            if error:
+                self.stats["errors"] += 1
+            if throttled:
+                self.stats["throttled"] += 1
+                self.limit = max(1.0, self.limit / 2)
+            elif latency is not None:
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+                self.best_latency = self.latency_ewma if self.best_latency is None else min(self.best_latency, self.latency_ewma)
+                if self.latency_ewma <= self.best_latency * self.latency_tolerance:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                else:
+                    self.limit = max(1.0, self.limit * 0.9)
+            if pause:
+                self.not_before = max(self.not_before, time.monotonic() + pause)
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                **self.stats,
+            }
+
+
+class DeadLetterQueue:
+    """Append-only JSONL file of items that failed permanently."""
+
+    def __init__(self, path=DEFAULT_DEAD_LETTER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, item, error, attempts):
+        record = {"endpoint": endpoint, "item": item, "error": repr(error), "attempts": attempts, "failed_at": time.time()}
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+
+    def load(self):
+        """Returns all dead-lettered records."""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def replace(self, records):
+        """Rewrites the queue to hold exactly `records` (removing the file if there are none)."""
+        with self._lock:
+            if not records:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            os.replace(tmp_path, self.path)
+
+
+class RetryScheduler:
+    """
+    Runs calls through per-endpoint limiters with retries.
+
+    Args:
+        dead_letters (DeadLetterQueue): Where permanently failed items go.
+        max_attempts (int): Attempts per call, including the first.
+        base_delay (float): Backoff for the first retry, in seconds.
+        max_delay (float): Cap on a single backoff.
+        endpoint_limits (dict): Optional {endpoint: (initial_limit, max_limit)}.
+    """
+
+    def __init__(self, dead_letters=None, max_attempts=5, base_delay=1.0, max_delay=60.0, endpoint_limits=None):
+        self.dead_letters = dead_letters or DeadLetterQueue()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.endpoint_limits = endpoint_limits or {}
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, name):
+        with self._lock:
+            if name not in self._endpoints:
+                initial_limit, max_limit = self.endpoint_limits.get(name, (1.0, 4.0))
+                self._endpoints[name] = EndpointLimiter(name, initial_limit=initial_limit, max_limit=max_limit)
+            return self._endpoints[name]
+
+    def backoff(self, attempt, retry_after=None):
+        """Jittered exponential backoff for the given retry (1-based), at least Retry-After."""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(delay / 2, delay)
+        return max(delay, retry_after or 0.0)
+
+    def call(self, endpoint, fn, *args, item=None, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)` under the endpoint's limiter, retrying transient failures.
+
+        Raises:
+            The last exception once the call fails permanently; the item (or
+            the first argument) is recorded in the dead-letter queue first.
+            A CacheMiss (offline mode) is raised without dead-lettering, since
+            the item itself has not failed.
+        """
+        limiter = self.endpoint(endpoint)
+        attempt = 0
+        while True:
+            attempt += 1
+            limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                retryable, throttled, retry_after = classify_exception(e)
+                if not retryable or attempt >= self.max_attempts:
+                    limiter.release(error=True, throttled=throttled)
+                    if isinstance(e, CacheMiss):
+                        raise
+                    self.dead_letters.add(endpoint, item if item is not None else (args[0] if args else None), e, attempt)
+                    raise
+                delay = self.backoff(attempt, retry_after)
+                # Throttling pauses the endpoint for everyone; other errors only delay this caller.
+                limiter.release(error=True, throttled=throttled, pause=delay if throttled else None)
+                print(f"[{endpoint}] attempt {attempt} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            limiter.release(latency=time.monotonic() - start)
+            return result
+
+    def report(self):
+        """Per-endpoint limiter state, for logging at the end of a run."""
+        with self._lock:
+            return {name: limiter.snapshot() for name, limiter in self._endpoints.items()}
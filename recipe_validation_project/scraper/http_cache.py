@@ -0,0 +1,278 @@
+# On-disk HTTP cache shared by URL discovery and recipe extraction.
+#
+# Response bodies are stored gzip-compressed in a local content store keyed by
+# URL, with a JSON index holding validators (ETag / Last-Modified) and access
+# times. Cached entries are revalidated with If-None-Match / If-Modified-Since,
+# so unchanged pages cost a 304 instead of a full download. In offline mode
+# every request is answered from the store, which lets a prior crawl be
+# replayed without touching the network.
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import requests
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", "http_cache")
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+# Flush the index to disk after this many changes (and always on close()).
+INDEX_FLUSH_EVERY = 50
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class CacheMiss(requests.RequestException):
+    """Raised in offline mode when a URL is not in the cache."""
+
+
+class _BodyReader(gzip.GzipFile):
+    """Decompressing reader that also closes the stored body file it reads from."""
+
+    def close(self):
+        body_file = self.fileobj
+        try:
+            super().close()
+        finally:
+            if body_file is not None:
+                body_file.close()
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for `requests.Response` backed by the content store.
+
+    Exposes the attributes the scraper uses: status_code, url, headers,
+    content, text and raise_for_status(). `from_cache` tells whether the body
+    came from the store (offline hit or 304 revalidation).
+
+    The stored body file is opened by the cache while it holds its lock, so a
+    concurrent eviction can remove the file without breaking this response.
+    """
+
+    def __init__(self, url, entry, body_file, from_cache, content=None):
+        self.url = entry.get("final_url") or url
+        self.status_code = 200
+        self.headers = entry.get("headers", {})
+        self.encoding = entry.get("encoding") or "utf-8"
+        self.from_cache = from_cache
+        self._body_file = body_file
+        self._content = content
+
+    @property
+    def content(self):
+        if self._content is None:
+            with self.open() as f:
+                self._content = f.read()
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def open(self):
+        """
+        Opens the decompressed body as a buffered binary stream without reading it all.
+
+        The stream can be opened once; the body file is closed with it.
+        """
+        if self._body_file is None:
+            if self._content is None:
+                raise ValueError("Response body was already consumed")
+            return io.BufferedReader(io.BytesIO(self._content))
+        body_file, self._body_file = self._body_file, None
+        return io.BufferedReader(_BodyReader(fileobj=body_file, mode='rb'))
+
+    def close(self):
+        if self._body_file is not None:
+            self._body_file.close()
+            self._body_file = None
+
+    def raise_for_status(self):
+        return None
+
+
+class HttpCache:
+    """
+    Size-bounded, revalidating HTTP cache.
+
+    Args:
+        cache_dir (str): Directory of the content store.
+        max_bytes (int): Upper bound on the compressed size of stored bodies;
+                         least recently used entries are evicted beyond it.
+        offline (bool): Serve only from the store, never touch the network.
+        session (requests.Session): Session used for network requests.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, offline=False, session=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.session = session or requests.Session()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "offline_misses": 0}
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._pending_changes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+        self._total_bytes = sum(e.get("size", 0) for e in self._index.values())
+
+    def _body_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + ".gz")
+
+    def _open_body(self, url):
+        """Opens a stored body file, or returns None if it is gone. Call with the lock held."""
+        try:
+            return open(self._body_path(url), 'rb')
+        except FileNotFoundError:
+            return None
+
+    def _touch(self, entry):
+        entry["last_access"] = time.time()
+        self._pending_changes += 1
+        if self._pending_changes >= INDEX_FLUSH_EVERY:
+            self._flush_index()
+
+    def _flush_index(self):
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+        self._pending_changes = 0
+
+    def _evict(self, keep=None):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for url, entry in sorted(self._index.items(), key=lambda item: item[1].get("last_access", 0)):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            try:
+                os.remove(self._body_path(url))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue  # open by a reader on a platform that forbids removing open files
+            self._total_bytes -= entry.get("size", 0)
+            del self._index[url]
+
+    def _write_body(self, url, response, stream=False):
+        """
+        Compresses a 200 response body into a temporary file and returns its path.
+
+        Runs without the lock. With `stream`, the body is copied in chunks and
+        never held in memory as a whole.
+        """
+        tmp_path = f"{self._body_path(url)}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            if stream:
+                try:
+                    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                        f.write(chunk)
+                finally:
+                    response.close()
+            else:
+                f.write(response.content)
+        return tmp_path
+
+    def _store(self, url, response, tmp_path):
+        """Moves a body written by _write_body into the store and indexes it. Call with the lock held."""
+        body_path = self._body_path(url)
+        os.replace(tmp_path, body_path)
+        size = os.path.getsize(body_path)
+
+        previous = self._index.get(url)
+        if previous:
+            self._total_bytes -= previous.get("size", 0)
+        entry = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "headers": {k: v for k, v in response.headers.items() if k.lower() in ("content-type", "etag", "last-modified")},
+            "encoding": response.encoding,
+            "final_url": response.url,
+            "size": size,
+            "stored_at": time.time(),
+        }
+        self._index[url] = entry
+        self._total_bytes += size
+        self._touch(entry)
+        self._evict(keep=url)
+        return entry
+
+    def get(self, url, headers=None, timeout=25, stream=False):
+        """
+        Fetches a URL through the cache.
+
+        Returns a CachedResponse for 200 responses (fresh or revalidated) and
+        the raw `requests.Response` for anything else, so callers can keep
+        using raise_for_status(). With `stream`, a downloaded body is written
+        to the store in chunks and the response reads it back from the
+        stored file (use `open()`), so large files such as sitemaps are never
+        held in memory.
+
+        Raises:
+            CacheMiss: In offline mode, when the URL has not been cached.
+            requests.RequestException: On network errors.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            body_file = self._open_body(url) if entry is not None else None
+            if body_file is None:
+                entry = None
+
+            if self.offline:
+                if entry is None:
+                    self.stats["offline_misses"] += 1
+                    raise CacheMiss(f"Offline mode: {url} is not in the HTTP cache")
+                self.stats["hits"] += 1
+                self._touch(entry)
+                return CachedResponse(url, entry, body_file, from_cache=True)
+        if body_file is not None:
+            body_file.close()  # reopened below if the server answers 304
+
+        request_headers = dict(headers or {})
+        request_headers.setdefault("Accept-Encoding", "gzip, deflate")
+        if entry is not None:
+            if entry.get("etag"):
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.session.get(url, headers=request_headers, timeout=timeout, stream=stream)
+        tmp_path = self._write_body(url, response, stream) if response.status_code == 200 else None
+
+        with self._lock:
+            body_file = None
+            if response.status_code == 304 and entry is not None:
+                body_file = self._open_body(url)
+            if body_file is not None:
+                self.stats["revalidated"] += 1
+                # A 304 may carry updated validators.
+                entry["etag"] = response.headers.get("ETag", entry.get("etag"))
+                entry["last_modified"] = response.headers.get("Last-Modified", entry.get("last_modified"))
+                self._touch(entry)
+                return CachedResponse(url, entry, body_file, from_cache=True)
+            if response.status_code == 200:
+                self.stats["misses"] += 1
+                entry = self._store(url, response, tmp_path)
+                if stream:
+                    return CachedResponse(url, entry, self._open_body(url), from_cache=False)
+                return CachedResponse(url, entry, None, from_cache=False, content=response.content)
+            if response.status_code != 304 or entry is None:
+                return response
+            # 304, but the body was evicted while we were revalidating.
+            dropped = self._index.pop(url, None)
+            if dropped:
+                self._total_bytes -= dropped.get("size", 0)
+        return self.get(url, headers=headers, timeout=timeout, stream=stream)  # no validators now, so this fetches the body
+
+    def close(self):
+        """Writes the index to disk."""
+        with self._lock:
+            self._flush_index()
@@ -0,0 +1,351 @@
+# Link extraction for category and collection pages.
+#
+# `extract_links_soup` is the original strategy: build a BeautifulSoup tree and
+# run one `select` pass per CSS selector. `extract_links_stream` applies the
+# same selectors in a single pass over the tokenizer events, tracking which
+# container classes are currently open instead of building a tree. Both return
+# the same (recipe_urls, collection_urls) pair; see bench_link_extraction.py
+# for the parity check and pages/sec comparison.
+
+import codecs
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+ALLRECIPES_PREFIX = 'https://www.allrecipes.com/'
+
+# Strategy 0: high-priority container
+HIGH_PRIORITY_CONTAINER_SELECTOR = '.comp.tax-sc__recirc-list.card-list.mntl-universal-card-list.mntl-document-card-list.mntl-card-list.mntl-block'
+# Strategy 1: primary selector for direct recipe links (or collection links)
+PRIMARY_LINKS_SELECTOR = 'a.mntl-card-list-items[data-doc-id][href]'
+# Strategy 2: specific group container class
+GROUP_CONTAINER_SELECTOR = '.comp.mntl-taxonomysc-article-list-group.mntl-block'
+# Strategy 3: fallback for various card-like structures
+CARD_SELECTORS = [
+    '.comp.mntl-card-list-items.mntl-universal-card.mntl-document-card.mntl-card.card.card--no-image[href]',
+    'article.mntl-card-list-items a[href]', '.card.mntl-card-list-items a[href]',
+    '.fixed-recipe-card a[href]', '.comp.mntl-card-list-items[href]', # If the item itself is <a>
+    'li.mntl-block a[href]',
+    '.recipe-card-group__item a[href]'
+]
+# Strategy 4 only runs when the strategies above collect fewer links than this.
+GENERAL_FALLBACK_MIN_LINKS = 10
+
+COLLECTION_CLASSES = ['mntl-card-list-items', 'card--no-image']
+NON_COLLECTION_KEYWORDS = ['/profile/', '/account/', '/newsletter', '/video/', '/gallery/', '.jpg', '.png', '/reviews/', '/photos/', '/submit/', '/survey/', '/print/']
+
+
+def classify_link(href, classes, data_doc_id, page_url, depth, max_depth):
+    """
+    Classifies a link found on a category or collection page.
+
+    Args:
+        href (str): Raw href attribute value.
+        classes (list): CSS classes of the link element.
+        data_doc_id (str): The element's data-doc-id attribute, or None.
+        page_url (str): URL of the page the link was found on.
+        depth (int): Crawl depth of that page.
+        max_depth (int): Maximum crawl depth.
+
+    Returns:
+        tuple: ('recipe' | 'collection' | None, absolute_url)
+    """
+    full_url = href
+    if href.startswith('/'): # Relative URL
+        parsed_origin_url = urlparse(page_url)
+        full_url = f"{parsed_origin_url.scheme}://{parsed_origin_url.netloc}{href}"
+
+    if not full_url.startswith(ALLRECIPES_PREFIX):
+        return None, full_url # Skip non-allrecipes links
+
+    if '/recipe/' in full_url:
+        # Ensure it looks like a valid recipe URL (e.g., ends with number or string, not /recipes/)
+        if full_url.split('/recipe/')[-1] and not full_url.endswith('/recipe/') and not full_url.endswith('/recipes/'):
+            return 'recipe', full_url
+    elif depth < max_depth:
+        # A non-recipe allrecipes link from a card is a potential collection page,
+        # as long as it is not a common non-collection link like /profile/.
+        if data_doc_id or any(cls in classes for cls in COLLECTION_CLASSES):
+            if not any(kw in full_url for kw in NON_COLLECTION_KEYWORDS):
+                return 'collection', full_url
+    return None, full_url
+
+
+def _classify_links(links, page_url, depth, max_depth):
+    """Classifies (href, classes, data_doc_id) triples, skipping hrefs already seen on the page."""
+    recipe_urls = set()
+    collection_urls = set()
+    processed_hrefs_for_this_page = set()
+    for href, classes, data_doc_id in links:
+        if not href or href in processed_hrefs_for_this_page:
+            continue
+        processed_hrefs_for_this_page.add(href)
+        kind, full_url = classify_link(href, classes, data_doc_id, page_url, depth, max_depth)
+        if kind == 'recipe':
+            recipe_urls.add(full_url)
+        elif kind == 'collection':
+            collection_urls.add(full_url)
+    return recipe_urls, collection_urls
+
+
+def extract_links_soup(html, page_url, depth=0, max_depth=1):
+    """
+    Extracts recipe and collection URLs with BeautifulSoup and one `select` per strategy.
+
+    Returns:
+        tuple: (set of recipe URLs, set of potential collection page URLs)
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    link_elements_collector = []
+
+    for container in soup.select(HIGH_PRIORITY_CONTAINER_SELECTOR):
+        link_elements_collector.extend(container.select('a[href]'))
+    link_elements_collector.extend(soup.select(PRIMARY_LINKS_SELECTOR))
+    for container in soup.select(GROUP_CONTAINER_SELECTOR):
+        link_elements_collector.extend(container.select('a[href]'))
+    for selector in CARD_SELECTORS:
+        link_elements_collector.extend(soup.select(selector))
+
+    if len(link_elements_collector) < GENERAL_FALLBACK_MIN_LINKS: # Only if very few links found
+        general_links = soup.select('main a[href]') # Search within main content area
+        if not general_links:
+            general_links = soup.select('body a[href]') # Broader if main yields nothing
+        link_elements_collector.extend(general_links)
+
+    links = ((el.get('href'), el.get('class', []), el.get('data-doc-id')) for el in link_elements_collector)
+    return _classify_links(links, page_url, depth, max_depth)
+
+
+# --- Single-pass extraction ---
+
+# Elements that never get an end tag in BeautifulSoup's html.parser tree.
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+    'image', 'isindex', 'nextid', 'spacer',
+])
+
+_HIGH_PRIORITY_CLASSES = frozenset(['comp', 'tax-sc__recirc-list', 'card-list', 'mntl-universal-card-list', 'mntl-document-card-list', 'mntl-card-list', 'mntl-block'])
+_GROUP_CLASSES = frozenset(['comp', 'mntl-taxonomysc-article-list-group', 'mntl-block'])
+_FULL_CARD_CLASSES = frozenset(['comp', 'mntl-card-list-items', 'mntl-universal-card', 'mntl-document-card', 'mntl-card', 'card', 'card--no-image'])
+_CARD_ITEM_CLASSES = frozenset(['card', 'mntl-card-list-items'])
+_COMP_ITEM_CLASSES = frozenset(['comp', 'mntl-card-list-items'])
+
+# Open-container counters, in the order the strategies above are applied.
+_HIGH_PRIORITY, _GROUP, _ARTICLE_ITEM, _CARD_ITEM, _FIXED_CARD, _LI_BLOCK, _CARD_GROUP_ITEM, _MAIN, _BODY = range(9)
+_NUM_COUNTERS = 9
+
+# Collector slots, one per strategy/selector, in collection order.
+_SLOT_HIGH_PRIORITY = 0
+_SLOT_PRIMARY = 1
+_SLOT_GROUP = 2
+_SLOT_CARDS = 3  # through 9, one per CARD_SELECTORS entry
+_NUM_SLOTS = _SLOT_CARDS + len(CARD_SELECTORS)
+
+
+class _LinkCollector:
+    """
+    Applies the extraction strategies to a stream of start/end tag events.
+
+    For every element with an href it records how many times each strategy
+    would have collected it, so the BeautifulSoup collector's ordering (and
+    its fallback threshold, which counts repeats) are reproduced exactly.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.open_counts = [0] * _NUM_COUNTERS
+        self.slots = [[] for _ in range(_NUM_SLOTS)]
+        self.total_collected = 0
+        self.main_links = []
+        self.body_links = []
+
+    def start(self, tag, attrs):
+        classes = attrs.get('class', '').split() if attrs.get('class') else []
+        class_set = frozenset(classes)
+        href = attrs.get('href')
+        counts = self.open_counts
+
+        if href is not None:
+            link = (href, classes, attrs.get('data-doc-id'))
+            is_a = tag == 'a'
+            if is_a and counts[_HIGH_PRIORITY]:
+                self.slots[_SLOT_HIGH_PRIORITY].append(link)
+                self.total_collected += counts[_HIGH_PRIORITY]
+            if is_a and 'mntl-card-list-items' in class_set and 'data-doc-id' in attrs:
+                self.slots[_SLOT_PRIMARY].append(link)
+                self.total_collected += 1
+            if is_a and counts[_GROUP]:
+                self.slots[_SLOT_GROUP].append(link)
+                self.total_collected += counts[_GROUP]
+            card_matches = (
+                _FULL_CARD_CLASSES <= class_set,
+                is_a and counts[_ARTICLE_ITEM] > 0,
+                is_a and counts[_CARD_ITEM] > 0,
+                is_a and counts[_FIXED_CARD] > 0,
+                _COMP_ITEM_CLASSES <= class_set,
+                is_a and counts[_LI_BLOCK] > 0,
+                is_a and counts[_CARD_GROUP_ITEM] > 0,
+            )
+            for offset, matched in enumerate(card_matches):
+                if matched:
+                    self.slots[_SLOT_CARDS + offset].append(link)
+                    self.total_collected += 1
+            if is_a and counts[_MAIN]:
+                self.main_links.append(link)
+            if is_a and counts[_BODY]:
+                self.body_links.append(link)
+
+        if tag in VOID_ELEMENTS:
+            return
+
+        opened = []
+        if _HIGH_PRIORITY_CLASSES <= class_set:
+            opened.append(_HIGH_PRIORITY)
+        if _GROUP_CLASSES <= class_set:
+            opened.append(_GROUP)
+        if tag == 'article' and 'mntl-card-list-items' in class_set:
+            opened.append(_ARTICLE_ITEM)
+        if _CARD_ITEM_CLASSES <= class_set:
+            opened.append(_CARD_ITEM)
+        if 'fixed-recipe-card' in class_set:
+            opened.append(_FIXED_CARD)
+        if tag == 'li' and 'mntl-block' in class_set:
+            opened.append(_LI_BLOCK)
+        if 'recipe-card-group__item' in class_set:
+            opened.append(_CARD_GROUP_ITEM)
+        if tag == 'main':
+            opened.append(_MAIN)
+        elif tag == 'body':
+            opened.append(_BODY)
+        for counter in opened:
+            counts[counter] += 1
+        self.stack.append((tag, opened))
+
+    def end(self, tag):
+        # Like BeautifulSoup, close the most recent open element with this
+        # name (and everything opened after it); stray end tags are ignored.
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) > i:
+            _, opened = self.stack.pop()
+            for counter in opened:
+                self.open_counts[counter] -= 1
+
+    def links(self):
+        """Collected (href, classes, data_doc_id) triples in BeautifulSoup collector order."""
+        collected = [link for slot in self.slots for link in slot]
+        if self.total_collected < GENERAL_FALLBACK_MIN_LINKS:
+            collected.extend(self.main_links or self.body_links)
+        return collected
+
+
+class _StreamParser(HTMLParser):
+    """Feeds the standard library tokenizer's events into a _LinkCollector."""
+
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        # Later duplicates of an attribute win, as in BeautifulSoup.
+        self.collector.start(tag, {k: (v if v is not None else '') for k, v in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.collector.end(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+
+_DECLARED_CHARSET_RE = re.compile(rb'<\s*meta[^>]+charset\s*=\s*["\']?([^>]*?)[ /;\'">]', re.I)
+_BOMS = ((codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+
+
+def _decode(html):
+    """
+    Decodes page bytes the way BeautifulSoup does for these pages.
+
+    A byte-order mark wins, then a charset declared in a <meta> tag near the
+    top of the document, then strict UTF-8, then windows-1252.
+    """
+    if not isinstance(html, bytes):
+        return html
+    for bom, encoding in _BOMS:
+        if html.startswith(bom):
+            return html.decode(encoding, errors='replace')
+    match = _DECLARED_CHARSET_RE.search(html, 0, max(2048, len(html) // 20))
+    if match:
+        try:
+            declared = codecs.lookup(match.group(1).decode('ascii', errors='ignore').strip()).name
+        except LookupError:
+            declared = None
+        if declared:
+            try:
+                return html.decode(declared)
+            except UnicodeDecodeError:
+                pass
+    try:
+        return html.decode('utf-8')
+    except UnicodeDecodeError:
+        return html.decode('windows-1252', errors='replace')
+
+
+def extract_links_stream(html, page_url, depth=0, max_depth=1):
+    """
+    Extracts recipe and collection URLs in one pass over the tokenizer events.
+
+    Returns:
+        tuple: (set of recipe URLs, set of potential collection page URLs)
+    """
+    collector = _LinkCollector()
+    parser = _StreamParser(collector)
+    parser.feed(_decode(html))
+    parser.close()
+    return _classify_links(collector.links(), page_url, depth, max_depth)
+
+
+class _LxmlTarget:
+    """lxml parser target forwarding events into a _LinkCollector."""
+
+    def __init__(self, collector):
+        self.collector = collector
+
+    def start(self, tag, attrib):
+        self.collector.start(tag, dict(attrib))
+
+    def end(self, tag):
+        self.collector.end(tag)
+
+    def close(self):
+        return None
+
+
+def extract_links_lxml(html, page_url, depth=0, max_depth=1):
+    """
+    Same single pass as `extract_links_stream`, driven by lxml's C tokenizer.
+
+    libxml2 repairs markup differently from html.parser (it inserts implicit
+    <body> elements and closes unclosed tags), so results can differ from the
+    BeautifulSoup path on malformed pages; check parity before relying on it.
+    """
+    from lxml import etree
+
+    collector = _LinkCollector()
+    parser = etree.HTMLParser(target=_LxmlTarget(collector))
+    parser.feed(html if isinstance(html, bytes) else html.encode('utf-8'))
+    parser.close()
+    return _classify_links(collector.links(), page_url, depth, max_depth)
+
+
+LINK_EXTRACTORS = {
+    'soup': extract_links_soup,
+    'stream': extract_links_stream,
+    'lxml': extract_links_lxml,
+}
@@ -1,10 +1,17 @@
-from recipe_scrapers import scrape_me
+from recipe_scrapers import scrape_html
+import argparse
 import json
 import requests
-from bs4 import BeautifulSoup
-import time
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 import google.generativeai as genai
+from sitemap import UrlCatalog, discover_from_sitemap, DEFAULT_CATALOG_PATH, DEFAULT_HEADERS
+from link_extraction import LINK_EXTRACTORS
+from http_cache import HttpCache, DEFAULT_CACHE_DIR
+from fetch_scheduler import RetryScheduler, DeadLetterQueue, DEFAULT_DEAD_LETTER_PATH
 
 # --- Gemini API Configuration ---
 # GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") # User wants to hardcode
@@ -137,13 +144,28 @@ Return ONLY the JSON object.
 """
     return prompt
 
+# Shared HTTP cache for category pages, sitemaps and recipe pages.
+# Reconfigured from the command line (e.g. --offline) in __main__.
+http_cache = HttpCache()
+
+# Adaptive pacing and retries for page fetches (one endpoint per host) and Gemini calls.
+# Items that still fail after retries are appended to a dead-letter queue.
+fetch_scheduler = RetryScheduler(endpoint_limits={"gemini": (2.0, 8.0)})
+
+def fetch_page(url):
+    """Fetches a page through the HTTP cache, raising on HTTP errors so they can be retried."""
+    response = http_cache.get(url, headers=DEFAULT_HEADERS, timeout=25) # Slightly increased timeout
+    response.raise_for_status()
+    return response
+
 # Global set to keep track of visited collection URLs to avoid redundant fetching and potential loops
 visited_collection_urls = set()
 
-def get_recipe_urls_from_category(category_url, depth=0, max_depth=1):
+def get_recipe_urls_from_category(category_url, depth=0, max_depth=1, link_extractor='stream'):
     """
     Fetches a category or collection page and extracts all unique direct recipe URLs.
     If depth < max_depth, it will also try to find collection-like pages and fetch recipes from them.
+    `link_extractor` picks the HTML link extraction path (see LINK_EXTRACTORS).
     """
     global visited_collection_urls
     print(f"Fetching URLs from: {category_url} (Depth: {depth})")
@@ -159,97 +181,13 @@ def get_recipe_urls_from_category(category_url, depth=0, max_depth=1):
 
     direct_recipe_urls_found = set()
     potential_collection_page_urls = set()
-    link_elements_collector = []
 
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        # Add a small delay before fetching any category/collection page
-        time.sleep(0.5) # Respectful delay
-        response = requests.get(category_url, headers=headers, timeout=25) # Slightly increased timeout
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # --- Strategies for finding <a> elements ---
-        # Strategy 0: User-provided high-priority container
-        high_priority_container_selector = '.comp.tax-sc__recirc-list.card-list.mntl-universal-card-list.mntl-document-card-list.mntl-card-list.mntl-block'
-        high_priority_containers = soup.select(high_priority_container_selector)
-        if high_priority_containers:
-            # print(f"Strategy 0 (High-Priority Container): Found {len(high_priority_containers)} containers with selector '{high_priority_container_selector}'. Searching links within...")
-            for container in high_priority_containers:
-                link_elements_collector.extend(container.select('a[href]')) # Get all links with href first
-        # else:
-            # print(f"Strategy 0 (High-Priority Container): No containers found with selector '{high_priority_container_selector}'.")
-
-        # --- Strategy 1: Primary selector for direct recipe links (or collection links)
-        primary_links_selector = 'a.mntl-card-list-items[data-doc-id][href]' # Broadened to get href
-        primary_links = soup.select(primary_links_selector)
-        if primary_links:
-            link_elements_collector.extend(primary_links)
-            # print(f"Strategy 1 (Direct/Collection Links): Found {len(primary_links)} links with '{primary_links_selector}'.")
-        
-        # --- Strategy 2: User-provided specific group container class
-        group_container_selector = '.comp.mntl-taxonomysc-article-list-group.mntl-block'
-        group_containers = soup.select(group_container_selector)
-        if group_containers:
-            for container in group_containers:
-                link_elements_collector.extend(container.select('a[href]'))
-            # print(f"Strategy 2 (Group Container): Found links within {len(group_containers)} group containers.")
-
-        # --- Strategy 3: Fallback for various card-like structures
-        card_selectors = [
-            '.comp.mntl-card-list-items.mntl-universal-card.mntl-document-card.mntl-card.card.card--no-image[href]',
-            'article.mntl-card-list-items a[href]', '.card.mntl-card-list-items a[href]',
-            '.fixed-recipe-card a[href]', '.comp.mntl-card-list-items[href]', # If the item itself is <a>
-            'li.mntl-block a[href]',
-            '.recipe-card-group__item a[href]'
-        ]
-        for selector in card_selectors:
-            links_from_cards_or_lists = soup.select(selector)
-            if links_from_cards_or_lists:
-                link_elements_collector.extend(links_from_cards_or_lists)
-        # print(f"Strategy 3 (Cards/Lists): Added potential links from various card/list selectors.")
-
-        # --- Strategy 4: General fallback (use sparingly or if others yield little) ---
-        if not link_elements_collector or len(link_elements_collector) < 10 : # Only if very few links found
-            # print(f"Few links found by specific selectors. Trying general 'a[href]' fallback...")
-            general_links = soup.select('main a[href]') # Search within main content area
-            if not general_links:
-                general_links = soup.select('body a[href]') # Broader if main yields nothing
-            link_elements_collector.extend(general_links)
-            # print(f"Strategy 4 (General Fallback): Added {len(general_links)} general links.")
-        
-        # --- Process collected link elements ---
-        processed_hrefs_for_this_page = set()
-        
-        for link_element in link_elements_collector:
-            href = link_element.get('href')
-            if not href or href in processed_hrefs_for_this_page:
-                continue
-            processed_hrefs_for_this_page.add(href)
-
-            full_url = href
-            if href.startswith('/'): # Relative URL
-                parsed_origin_url = requests.utils.urlparse(category_url)
-                full_url = f"{parsed_origin_url.scheme}://{parsed_origin_url.netloc}{href}"
-
-            if not full_url.startswith('https://www.allrecipes.com/'):
-                continue # Skip non-allrecipes links
-
-            if '/recipe/' in full_url:
-                # Ensure it looks like a valid recipe URL (e.g., ends with number or string, not /recipes/)
-                if full_url.split('/recipe/')[-1] and not full_url.endswith('/recipe/') and not full_url.endswith('/recipes/'):
-                    direct_recipe_urls_found.add(full_url)
-            elif depth < max_depth:
-                # This is a potential collection page if it doesn't contain /recipe/
-                # and meets criteria (e.g., has data-doc-id or specific classes like the example)
-                # For simplicity now, we'll consider any non-recipe allrecipes link from a card a potential collection.
-                # More specific checks could be link_element.get('data-doc-id') or class checks
-                if link_element.get('data-doc-id') or any(cls in link_element.get('class', []) for cls in ['mntl-card-list-items', 'card--no-image']):
-                     # Avoid adding common non-collection links like /profile/, /account/, /newsletters/, etc.
-                    if not any(kw in full_url for kw in ['/profile/', '/account/', '/newsletter', '/video/', '/gallery/', '.jpg', '.png', '/reviews/', '/photos/', '/submit/', '/survey/', '/print/']):
-                        potential_collection_page_urls.add(full_url)
+        response = fetch_scheduler.call(urlparse(category_url).netloc, fetch_page, category_url)
+        # Strategies 0-4 (see link_extraction.py) select the candidate links and classify
+        # each one as a direct recipe URL or a potential collection page.
+        extract_links = LINK_EXTRACTORS[link_extractor]
+        direct_recipe_urls_found, potential_collection_page_urls = extract_links(response.content, category_url, depth, max_depth)
 
     except requests.RequestException as e:
         print(f"Error fetching page {category_url}: {e}")
@@ -262,7 +200,7 @@ def get_recipe_urls_from_category(category_url, depth=0, max_depth=1):
         for collection_url in potential_collection_page_urls:
             if collection_url not in visited_collection_urls: # Check again before recursive call
                 # print(f"  Recursively fetching from collection: {collection_url} (Depth: {depth + 1})")
-                recipes_from_collection = get_recipe_urls_from_category(collection_url, depth + 1, max_depth)
+                recipes_from_collection = get_recipe_urls_from_category(collection_url, depth + 1, max_depth, link_extractor)
                 direct_recipe_urls_found.update(recipes_from_collection)
             # else:
                 # print(f"  Skipping already visited collection (checked before recursion): {collection_url}")
@@ -272,7 +210,9 @@ def get_recipe_urls_from_category(category_url, depth=0, max_depth=1):
 
 def scrape_recipe(url):
     try:
-        scraper = scrape_me(url) # wild_mode=True removed as it caused issues
+        # Fetch through the shared cache instead of letting scrape_me download the page again.
+        response = fetch_scheduler.call(urlparse(url).netloc, fetch_page, url)
+        scraper = scrape_html(response.text, org_url=url) # wild_mode=True removed as it caused issues
         # Check if essential data is present
         title = scraper.title()
         if not title:
@@ -296,27 +236,147 @@ def scrape_recipe(url):
         print(f"Error scraping {url}: {e}")
         return None
 
+def clean_with_gemini(recipe_data, recipe_url):
+    """Sends a scraped recipe to Gemini and returns the cleaned JSON, or None on failure."""
+    print(f"Processing with Gemini: {recipe_data.get('title')}")
+    prompt = construct_gemini_prompt(recipe_data)
+    try:
+        response = fetch_scheduler.call("gemini", gemini_model.generate_content, prompt, item=recipe_url)
+        if hasattr(response, 'text') and response.text:
+            cleaned_data_str = response.text.strip()
+            if cleaned_data_str.startswith("```json"):
+                cleaned_data_str = cleaned_data_str[7:]
+            if cleaned_data_str.endswith("```"):
+                cleaned_data_str = cleaned_data_str[:-3]
+            
+            try:
+                cleaned_json = json.loads(cleaned_data_str)
+                if 'original_url' not in cleaned_json and recipe_data.get('canonical_url'):
+                    cleaned_json['original_url'] = recipe_data.get('canonical_url')
+                elif 'original_url' not in cleaned_json: # Fallback if canonical_url was also None
+                     cleaned_json['original_url'] = recipe_url
+
+                print(f"Successfully processed by Gemini: {cleaned_json.get('cleaned_title')}")
+                return cleaned_json
+            except json.JSONDecodeError as json_e:
+                print(f"Error: Gemini API response was not valid JSON for '{recipe_data.get('title')}'. Error: {json_e}")
+                print(f"Gemini response text: {response.text[:500]}...")
+            except Exception as e_parse:
+                print(f"Error parsing Gemini's JSON response for '{recipe_data.get('title')}'. Error: {e_parse}")
+                print(f"Gemini response text: {response.text[:500]}...")
+        else:
+            print(f"Error: Gemini API response was empty or malformed for {recipe_data.get('title')}. Response: {response}")
+            if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+                 print(f"Prompt Feedback: {response.prompt_feedback}")
+    except Exception as e_gemini:
+        print(f"Error calling Gemini API for '{recipe_data.get('title')}': {e_gemini}")
+        if hasattr(e_gemini, 'response') and hasattr(e_gemini.response, 'prompt_feedback'):
+            print(f"Prompt Feedback: {e_gemini.response.prompt_feedback}")
+    return None
+
+def process_recipe_url(recipe_url, clean=True):
+    """
+    Scrapes one recipe and, if `clean` is set, cleans it with Gemini.
+
+    Returns:
+        tuple: (recipe_data, cleaned_json); cleaned_json is None when cleaning is skipped or fails.
+    """
+    recipe_data = scrape_recipe(recipe_url)
+    if not recipe_data:
+        return None, None
+    print(f"Raw data scraped for: {recipe_data.get('title')}")
+    if not clean or not (GOOGLE_API_KEY and gemini_model):
+        return recipe_data, None
+    return recipe_data, clean_with_gemini(recipe_data, recipe_url)
+
 if __name__ == "__main__":
-    start_category_url = "https://www.allrecipes.com/recipes/78/breakfast-and-brunch/"
+    parser = argparse.ArgumentParser(description="Scrape allrecipes.com and clean recipes with Gemini.")
+    parser.add_argument("--discovery", choices=["category", "sitemap"], default="category",
+                        help="Find recipe URLs by crawling category pages or by reading sitemaps.")
+    parser.add_argument("--category-url", default="https://www.allrecipes.com/recipes/78/breakfast-and-brunch/")
+    parser.add_argument("--link-extractor", choices=sorted(LINK_EXTRACTORS), default="stream",
+                        help="HTML link extraction path for category pages.")
+    parser.add_argument("--sitemap-url", default="https://www.allrecipes.com/sitemap.xml",
+                        help="Sitemap or sitemap index URL (or local path) used with --discovery sitemap.")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH,
+                        help="URL catalog used to only recrawl new or changed URLs in sitemap mode.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory of the on-disk HTTP cache.")
+    parser.add_argument("--cache-max-mb", type=int, default=500, help="Size bound of the HTTP cache (compressed).")
+    parser.add_argument("--offline", action="store_true",
+                        help="Replay a prior crawl from the HTTP cache without touching the network. "
+                             "Gemini cleaning is skipped and the raw scraped recipes are saved instead.")
+    parser.add_argument("--max-workers", type=int, default=8,
+                        help="Upper bound on recipes in flight; actual rates adapt per endpoint.")
+    parser.add_argument("--dead-letters", default=DEFAULT_DEAD_LETTER_PATH,
+                        help="JSONL file collecting URLs that failed permanently.")
+    parser.add_argument("--retry-dead-letters", action="store_true",
+                        help="Only retry the URLs in the dead-letter queue.")
+    parser.add_argument("--store", default=None,
+                        help="SQLite recipe store (e.g. data/recipes.db) to write cleaned recipes and crawl metadata into.")
+    parser.add_argument("--skip-stored", action="store_true",
+                        help="With --store, skip URLs that are already in the store.")
+    args = parser.parse_args()
+
+    dead_letters = DeadLetterQueue(args.dead_letters)
+    fetch_scheduler = RetryScheduler(dead_letters=dead_letters, endpoint_limits={"gemini": (2.0, 8.0)})
+
+    http_cache = HttpCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024, offline=args.offline)
+
+    store_writer = None
+    if args.store:
+        # The store lives in the model package; make the project root importable.
+        sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+        from model.recipe_store import RecipeStore, BatchWriter, from_cleaned
+        recipe_store = RecipeStore(args.store)
+        store_writer = BatchWriter(recipe_store, batch_size=50)
+
+    start_category_url = args.category_url
     output_directory = "data"
     cleaned_output_filename = os.path.join(output_directory, "allrecipes_breakfast_brunch_cleaned.json")
+    if args.discovery == "sitemap":
+        cleaned_output_filename = os.path.join(output_directory, "allrecipes_sitemap_cleaned.json")
+    raw_output_filename = cleaned_output_filename.replace("_cleaned.json", "_raw.json")
+    # Gemini is a network service, so an offline replay stops at the raw scrape.
+    use_gemini = not args.offline
 
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
 
-    if not GOOGLE_API_KEY or not gemini_model:
+    if not use_gemini:
+        print(f"Offline mode: skipping Gemini cleaning. Raw scraped recipes will be saved to {raw_output_filename}.")
+    elif not GOOGLE_API_KEY or not gemini_model:
         print("Error: Gemini API key not set or model not initialized. Cleaned data cannot be produced. Exiting.")
         exit()
 
-    print(f"Starting recursive scrape for category: {start_category_url}")
-    # Clear visited collection URLs at the start of a new top-level run
-    visited_collection_urls.clear()
-    # Initial call to get all recipe URLs, including from one level of collection pages
-    recipe_urls_to_scrape_set = get_recipe_urls_from_category(start_category_url, depth=0, max_depth=1)
-    recipe_urls_to_scrape = list(recipe_urls_to_scrape_set)
+    url_catalog = None
+    previous_dead_letters = None
+    if args.retry_dead_letters:
+        # The queue is only rewritten after the run, so an interrupted retry loses nothing.
+        previous_dead_letters = dead_letters.load()
+        recipe_urls_to_scrape = sorted({r["item"] for r in previous_dead_letters if "/recipe/" in (r.get("item") or "")})
+        print(f"Retrying {len(recipe_urls_to_scrape)} dead-lettered recipe URLs "
+              f"({len(previous_dead_letters)} entries in {args.dead_letters}).")
+    elif args.discovery == "sitemap":
+        print(f"Starting sitemap discovery from: {args.sitemap_url}")
+        url_catalog = UrlCatalog(args.catalog)
+        # Only URLs that are new or whose lastmod changed since the last crawl
+        recipe_urls_to_scrape = discover_from_sitemap(args.sitemap_url, url_catalog, session=http_cache, scheduler=fetch_scheduler)
+        url_catalog.save()
+    else:
+        print(f"Starting recursive scrape for category: {start_category_url}")
+        # Clear visited collection URLs at the start of a new top-level run
+        visited_collection_urls.clear()
+        # Initial call to get all recipe URLs, including from one level of collection pages
+        recipe_urls_to_scrape_set = get_recipe_urls_from_category(start_category_url, depth=0, max_depth=1, link_extractor=args.link_extractor)
+        recipe_urls_to_scrape = list(recipe_urls_to_scrape_set)
+
+    if store_writer is not None and args.skip_stored:
+        before = len(recipe_urls_to_scrape)
+        recipe_urls_to_scrape = [u for u in recipe_urls_to_scrape if not recipe_store.has_url(u)]
+        print(f"Skipping {before - len(recipe_urls_to_scrape)} URLs already in the recipe store.")
     
     if not recipe_urls_to_scrape:
-        print(f"No recipe URLs found from {start_category_url} or its collections. Exiting.")
+        print(f"No new or changed recipe URLs found via {args.discovery} discovery. Exiting.")
     else:
         print(f"Found a total of {len(recipe_urls_to_scrape)} unique recipe URLs to scrape.")
         # print("URLs to scrape:", recipe_urls_to_scrape[:20]) # Print some for verification
@@ -324,62 +384,77 @@ if __name__ == "__main__":
         scraped_count = 0
         processed_count = 0
         all_cleaned_recipes = []
-
-        for i, recipe_url in enumerate(recipe_urls_to_scrape):
-            print(f"Scraping recipe {i+1}/{len(recipe_urls_to_scrape)}: {recipe_url}")
-            # Ensure we don't re-scrape if somehow a non-recipe URL slipped through initial filtering
-            if "/recipe/" not in recipe_url:
-                print(f"Skipping non-recipe URL that was collected: {recipe_url}")
-                continue
-
-            recipe_data = scrape_recipe(recipe_url)
-            
-            if recipe_data:
-                print(f"Raw data scraped for: {recipe_data.get('title')}")
-                scraped_count += 1
-
-                if GOOGLE_API_KEY and gemini_model: # This check is technically redundant due to exit above but good practice
-                    print(f"Processing with Gemini: {recipe_data.get('title')}")
-                    prompt = construct_gemini_prompt(recipe_data)
-                    try:
-                        response = gemini_model.generate_content(prompt)
-                        if hasattr(response, 'text') and response.text:
-                            cleaned_data_str = response.text.strip()
-                            if cleaned_data_str.startswith("```json"):
-                                cleaned_data_str = cleaned_data_str[7:]
-                            if cleaned_data_str.endswith("```"):
-                                cleaned_data_str = cleaned_data_str[:-3]
-                            
-                            try:
-                                cleaned_json = json.loads(cleaned_data_str)
-                                if 'original_url' not in cleaned_json and recipe_data.get('canonical_url'):
-                                    cleaned_json['original_url'] = recipe_data.get('canonical_url')
-                                elif 'original_url' not in cleaned_json: # Fallback if canonical_url was also None
-                                     cleaned_json['original_url'] = recipe_url
-
-                                all_cleaned_recipes.append(cleaned_json)
-                                print(f"Successfully processed by Gemini: {cleaned_json.get('cleaned_title')}")
-                                processed_count +=1
-                            except json.JSONDecodeError as json_e:
-                                print(f"Error: Gemini API response was not valid JSON for '{recipe_data.get('title')}'. Error: {json_e}")
-                                print(f"Gemini response text: {response.text[:500]}...")
-                            except Exception as e_parse:
-                                print(f"Error parsing Gemini's JSON response for '{recipe_data.get('title')}'. Error: {e_parse}")
-                                print(f"Gemini response text: {response.text[:500]}...")
-                        else:
-                            print(f"Error: Gemini API response was empty or malformed for {recipe_data.get('title')}. Response: {response}")
-                            if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-                                 print(f"Prompt Feedback: {response.prompt_feedback}")
-                    except Exception as e_gemini:
-                        print(f"Error calling Gemini API for '{recipe_data.get('title')}': {e_gemini}")
-                        if hasattr(e_gemini, 'response') and hasattr(e_gemini.response, 'prompt_feedback'):
-                            print(f"Prompt Feedback: {e_gemini.response.prompt_feedback}")
-            else:
-                print(f"Failed to scrape {recipe_url}")
-            
-            time.sleep(1.5) # Adjusted sleep: 2s if Gemini was used, 1s if not. Now consistent 1.5s. Consider longer if rate limited.
-        
-        if all_cleaned_recipes: # Check if list is not empty
+        all_raw_recipes = []
+        cleaned_urls = set()
+
+        # Fetches and Gemini calls are paced by fetch_scheduler's per-endpoint
+        # limiters, so the pool only bounds how much work can be in flight.
+        with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+            futures = {}
+            for recipe_url in recipe_urls_to_scrape:
+                # Ensure we don't re-scrape if somehow a non-recipe URL slipped through initial filtering
+                if "/recipe/" not in recipe_url:
+                    print(f"Skipping non-recipe URL that was collected: {recipe_url}")
+                    continue
+                futures[executor.submit(process_recipe_url, recipe_url, use_gemini)] = recipe_url
+
+            for i, future in enumerate(as_completed(futures)):
+                recipe_url = futures[future]
+                recipe_data, cleaned_json = future.result()
+                print(f"Finished recipe {i+1}/{len(futures)}: {recipe_url}")
+                if recipe_data:
+                    scraped_count += 1
+                    if not use_gemini:
+                        all_raw_recipes.append({**recipe_data, "original_url": recipe_url})
+                else:
+                    print(f"Failed to scrape {recipe_url}")
+                if cleaned_json:
+                    cleaned_urls.add(recipe_url)
+                    all_cleaned_recipes.append(cleaned_json)
+                    processed_count += 1
+                    if url_catalog is not None:
+                        url_catalog.mark_crawled(recipe_url)
+                    if store_writer is not None:
+                        store_writer.add_recipe(from_cleaned(cleaned_json))
+                if store_writer is not None:
+                    store_writer.add_crawl({
+                        "url": recipe_url,
+                        "lastmod": url_catalog.entries.get(recipe_url, {}).get("lastmod") if url_catalog is not None else None,
+                        "status": "cleaned" if cleaned_json else ("scraped" if recipe_data else "failed"),
+                        "last_crawled": time.time(),
+                    })
+
+        print(f"Endpoint limiters: {fetch_scheduler.report()}")
+
+        if previous_dead_letters is not None:
+            # Keep failures from this run, plus earlier entries that were not
+            # replayed (e.g. category pages) or did not get cleaned this time.
+            new_dead_letters = dead_letters.load()[len(previous_dead_letters):]
+            failed_again = {r.get("item") for r in new_dead_letters}
+            kept = [r for r in previous_dead_letters if r.get("item") not in cleaned_urls and r.get("item") not in failed_again]
+            dead_letters.replace(kept + new_dead_letters)
+            print(f"Dead-letter queue: {len(kept) + len(new_dead_letters)} entries remain.")
+
+        if url_catalog is not None:
+            url_catalog.save()
+        http_cache.close()
+        print(f"HTTP cache: {http_cache.stats}")
+        if store_writer is not None:
+            store_writer.close()
+            print(f"Recipe store: {recipe_store.counts()}")
+
+        if all_cleaned_recipes and url_catalog is not None and os.path.exists(cleaned_output_filename):
+            # Incremental recrawl: merge into the previous output, replacing changed recipes.
+            with open(cleaned_output_filename, "r") as previous_f:
+                merged = {r.get('original_url'): r for r in json.load(previous_f)}
+            merged.update({r.get('original_url'): r for r in all_cleaned_recipes})
+            all_cleaned_recipes = list(merged.values())
+
+        if not use_gemini:
+            with open(raw_output_filename, "w") as raw_f:
+                json.dump(all_raw_recipes, raw_f, indent=4)
+            print(f"Saved {len(all_raw_recipes)} raw scraped recipes to {raw_output_filename}.")
+        elif all_cleaned_recipes: # Check if list is not empty
             with open(cleaned_output_filename, "w") as cleaned_f:
                 json.dump(all_cleaned_recipes, cleaned_f, indent=4)
             print(f"Successfully saved {len(all_cleaned_recipes)} cleaned recipes to {cleaned_output_filename}.")
@@ -393,7 +468,9 @@ if __name__ == "__main__":
 
         print(f"\nScraping complete.")
         print(f"Successfully scraped data for {scraped_count}/{len(recipe_urls_to_scrape)} recipes.")
-        if GOOGLE_API_KEY and gemini_model:
+        if not use_gemini:
+            print("Gemini processing was skipped (offline mode).")
+        elif GOOGLE_API_KEY and gemini_model:
             print(f"Successfully processed {processed_count}/{scraped_count} recipes with Gemini.")
         else:
             print(f"Gemini processing was skipped (API key or model not initialized). No cleaned output file produced.")
@@ -401,7 +478,7 @@ if __name__ == "__main__":
 
 # TODO:
 # 1. Pagination for categories that list many more recipes than fit on one page.
-# 2. More robust error handling and retries (e.g., for network issues, API rate limits).
+# 2. More robust error handling and retries (e.g., for network issues, API rate limits). (Added: fetch_scheduler.py)
 # 3. Logging module.
 # 4. Refine collection page identification if needed.
 # 5. Ensure delays are respectful of robots.txt and terms of service. Current sleep is basic.
@@ -412,7 +489,7 @@ if __name__ == "__main__":
 #    This might involve finding sitemap.xml, category pages, or other navigation patterns.
 #    Robust pagination handling for category pages is needed.
 # 2. Add robust error handling and retries (e.g., for network issues, API rate limits).
-# 3. Consider how to store the scraped data (e.g., multiple JSON files, a database). (Single JSON for cleaned)
+# 3. Consider how to store the scraped data (e.g., multiple JSON files, a database). (Single JSON for cleaned; --store for SQLite)
 # 4. Implement logging using the `logging` module for better tracking.
 # 5. Be respectful of the website's terms of service and robots.txt.
 #    Implement delays between requests to avoid overwhelming their servers. (Basic delay added, increased if using Gemini)
@@ -421,7 +498,7 @@ if __name__ == "__main__":
 # 7. Add user-agent to requests. (Added)
 # 8. Securely manage API Key for Gemini (using environment variable is a good start).
 # 9. Refine Gemini prompt for better accuracy and desired output structure.
-#10. Handle Gemini API rate limits more gracefully (e.g., exponential backoff).
+#10. Handle Gemini API rate limits more gracefully (e.g., exponential backoff). (Added: fetch_scheduler.py)
 
 # 1. Implement logic to find and scrape thousands of recipes from allrecipes.com.
 #    This might involve finding sitemap.xml, category pages, or other navigation patterns.
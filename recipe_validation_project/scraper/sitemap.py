@@ -0,0 +1,238 @@
+# Sitemap-driven URL discovery with an on-disk URL catalog.
+#
+# Sitemaps (and sitemap indexes) are stream-parsed, so multi-megabyte gzipped
+# files never need to be held in memory as a tree. Every recipe URL seen is
+# recorded in a local catalog with its <lastmod>; later runs only return URLs
+# that are new or whose <lastmod> moved since they were last crawled.
+
+import gzip
+import io
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse
+
+import requests
+
+from http_cache import HttpCache
+
+GZIP_MAGIC = b"\x1f\x8b"
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), "data", "url_catalog.json")
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def _local_name(tag):
+    """Strips the XML namespace from an element tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _maybe_gunzip(fileobj):
+    """Wraps a buffered binary file object in a gzip reader if it starts with the gzip magic bytes."""
+    head = fileobj.peek(2)[:2]
+    return gzip.GzipFile(fileobj=fileobj, mode='rb') if head == GZIP_MAGIC else fileobj
+
+
+def iter_sitemap_entries(fileobj):
+    """
+    Stream-parses a sitemap or sitemap index.
+
+    Args:
+        fileobj: A buffered binary file object (supporting peek), plain or gzipped.
+
+    Yields:
+        tuple: (kind, loc, lastmod) where kind is 'sitemap' for entries of a
+               sitemap index and 'url' for entries of a URL set. lastmod is
+               the raw string or None.
+    """
+    source = _maybe_gunzip(fileobj)
+    loc = lastmod = None
+    for event, elem in ET.iterparse(source, events=('end',)):
+        name = _local_name(elem.tag)
+        if name == 'loc':
+            loc = (elem.text or '').strip()
+        elif name == 'lastmod':
+            lastmod = (elem.text or '').strip() or None
+        elif name in ('url', 'sitemap'):
+            if loc:
+                yield name, loc, lastmod
+            loc = lastmod = None
+            # Free the finished entry so memory stays flat on large files.
+            elem.clear()
+
+
+def open_sitemap(location, session=None, timeout=25, scheduler=None):
+    """
+    Opens a sitemap for streaming from an http(s) URL or a local path.
+
+    Local paths (and file:// URLs) make discovery testable against fixture
+    sitemap files. `session` may be a requests.Session or an HttpCache; with
+    an HttpCache the body is streamed into the cache and read back from the
+    cached file. With a `scheduler` (fetch_scheduler.RetryScheduler), the
+    fetch is paced and retried like page fetches, and a sitemap that still
+    fails is dead-lettered.
+    """
+    if location.startswith('file://'):
+        location = location[len('file://'):]
+    if not location.startswith(('http://', 'https://')):
+        return open(location, 'rb')
+
+    def fetch():
+        if isinstance(session, HttpCache):
+            response = session.get(location, headers=DEFAULT_HEADERS, timeout=timeout, stream=True)
+        else:
+            getter = session.get if session is not None else requests.get
+            response = getter(location, headers=DEFAULT_HEADERS, timeout=timeout, stream=True)
+        response.raise_for_status()
+        return response
+
+    response = scheduler.call(urlparse(location).netloc, fetch, item=location) if scheduler is not None else fetch()
+    if isinstance(session, HttpCache):
+        return response.open()
+    # Let urllib3 undo any Content-Encoding; .gz payloads are handled by _maybe_gunzip.
+    response.raw.decode_content = True
+    return io.BufferedReader(response.raw)
+
+
+def resolve_location(location, parent):
+    """
+    Resolves a child sitemap <loc> listed in `parent`.
+
+    Relative locations in a local sitemap index are taken relative to the
+    index's directory, so fixture indexes can list their children by file name.
+    """
+    if location.startswith(('http://', 'https://', 'file://')) or os.path.isabs(location):
+        return location
+    if parent.startswith(('http://', 'https://')):
+        return location
+    if parent.startswith('file://'):
+        parent = parent[len('file://'):]
+    return os.path.join(os.path.dirname(parent), location)
+
+
+def is_recipe_url(url):
+    """Same rule the category crawler uses for direct recipe links."""
+    if '/recipe/' not in url:
+        return False
+    return bool(url.split('/recipe/')[-1]) and not url.endswith('/recipe/') and not url.endswith('/recipes/')
+
+
+class UrlCatalog:
+    """
+    Local catalog of discovered URLs, persisted as JSON.
+
+    Each URL entry keeps the sitemap's `lastmod`, when the URL was first seen,
+    and the `lastmod` that was current when it was last crawled successfully.
+    Child sitemaps of an index are remembered with their own `lastmod` and the
+    URLs they listed, so unchanged ones need not be downloaded again.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH):
+        self.path = path
+        self.entries = {}
+        self.sitemaps = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = data.get("urls", {})
+            self.sitemaps = data.get("sitemaps", {})
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, url):
+        return url in self.entries
+
+    def observe(self, url, lastmod):
+        """Records a URL seen in a sitemap."""
+        entry = self.entries.setdefault(url, {"first_seen": time.time(), "crawled_lastmod": None, "last_crawled": None})
+        entry["lastmod"] = lastmod
+
+    def needs_crawl(self, url):
+        """True if the URL was never crawled or its lastmod changed since the last crawl."""
+        entry = self.entries.get(url)
+        if entry is None or entry.get("last_crawled") is None:
+            return True
+        # Without a lastmod we cannot tell whether the page changed; trust the previous crawl.
+        lastmod = entry.get("lastmod")
+        return lastmod is not None and lastmod != entry.get("crawled_lastmod")
+
+    def mark_crawled(self, url):
+        """Records a successful crawl of a URL at its current lastmod."""
+        entry = self.entries.setdefault(url, {"first_seen": time.time(), "lastmod": None})
+        entry["crawled_lastmod"] = entry.get("lastmod")
+        entry["last_crawled"] = time.time()
+
+    def save(self):
+        """Writes the catalog atomically."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"urls": self.entries, "sitemaps": self.sitemaps}, f)
+        os.replace(tmp_path, self.path)
+
+
+def discover_from_sitemap(sitemap_location, catalog, url_filter=is_recipe_url, session=None, skip_unchanged_sitemaps=True,
+                          scheduler=None):
+    """
+    Walks a sitemap (index) and returns the URLs that need crawling.
+
+    Child sitemaps listed in an index are followed. When an index lists a
+    `lastmod` for a child sitemap that matches the previous run, the child is
+    not downloaded again and only its previously cataloged URLs are checked.
+
+    Args:
+        sitemap_location (str): URL or local path of a sitemap or sitemap index.
+        catalog (UrlCatalog): Catalog updated in place with every URL seen.
+        url_filter (callable): Predicate selecting URLs worth cataloging.
+        session (requests.Session | HttpCache): Optional session or cache for HTTP fetches.
+        skip_unchanged_sitemaps (bool): Reuse unchanged child sitemaps from the catalog.
+        scheduler (RetryScheduler): Optional pacing/retry/dead-letter path for HTTP fetches.
+
+    Returns:
+        list: URLs that are new or changed since they were last crawled.
+    """
+    sitemaps = catalog.sitemaps
+    pending = [(sitemap_location, None)]
+    seen_sitemaps = set()
+    to_crawl = []
+    seen_urls = set()
+
+    while pending:
+        location, lastmod = pending.pop()
+        if location in seen_sitemaps:
+            continue
+        seen_sitemaps.add(location)
+
+        state = sitemaps.get(location)
+        if skip_unchanged_sitemaps and lastmod and state and state.get("lastmod") == lastmod:
+            print(f"Sitemap unchanged since last run, skipping download: {location}")
+            for url in state.get("urls", []):
+                if url not in seen_urls and catalog.needs_crawl(url):
+                    seen_urls.add(url)
+                    to_crawl.append(url)
+            continue
+
+        print(f"Reading sitemap: {location}")
+        urls_in_sitemap = []
+        try:
+            with open_sitemap(location, session=session, scheduler=scheduler) as fileobj:
+                for kind, loc, entry_lastmod in iter_sitemap_entries(fileobj):
+                    if kind == 'sitemap':
+                        pending.append((resolve_location(loc, location), entry_lastmod))
+                    elif url_filter(loc):
+                        catalog.observe(loc, entry_lastmod)
+                        urls_in_sitemap.append(loc)
+                        if loc not in seen_urls and catalog.needs_crawl(loc):
+                            seen_urls.add(loc)
+                            to_crawl.append(loc)
+        except (requests.RequestException, ET.ParseError, OSError) as e:
+            print(f"Error reading sitemap {location}: {e}")
+            continue
+
+        sitemaps[location] = {"lastmod": lastmod, "urls": urls_in_sitemap}
+
+    print(f"Sitemap discovery: {len(catalog)} cataloged URLs, {len(to_crawl)} new or changed.")
+    return to_crawl
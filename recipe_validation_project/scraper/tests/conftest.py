@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+import requests
+
+# The scraper modules import each other as top-level modules (they are run as scripts).
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+class FakeResponse:
+    def __init__(self, url, status_code=200, content=b"", headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.encoding = "utf-8"
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+
+class FakeSession:
+    """Serves fixed bodies with an ETag and answers matching If-None-Match with 304."""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        headers = headers or {}
+        self.requests.append((url, dict(headers)))
+        if url not in self.bodies:
+            return FakeResponse(url, 404)
+        etag = f'"{len(self.bodies[url])}"'
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(url, 304, headers={"ETag": etag})
+        return FakeResponse(url, 200, self.bodies[url], {"ETag": etag, "Content-Type": "text/html"})
+
+
+@pytest.fixture
+def make_session():
+    """Factory for a FakeSession serving {url: body bytes}."""
+    return FakeSession
@@ -0,0 +1,53 @@
+import pytest
+import requests
+
+from fetch_scheduler import DeadLetterQueue, RetryScheduler
+from http_cache import CacheMiss
+
+
+def _raise(exc):
+    raise exc
+
+
+@pytest.fixture
+def dead_letters(tmp_path):
+    return DeadLetterQueue(str(tmp_path / "dead_letter.jsonl"))
+
+
+def test_permanent_failure_is_dead_lettered(dead_letters):
+    scheduler = RetryScheduler(dead_letters=dead_letters)
+    with pytest.raises(ValueError):
+        scheduler.call("example.com", _raise, ValueError("bad page"), item="https://example.com/recipe/1/")
+    assert [r["item"] for r in dead_letters.load()] == ["https://example.com/recipe/1/"]
+
+
+def test_cache_miss_is_not_dead_lettered(dead_letters):
+    scheduler = RetryScheduler(dead_letters=dead_letters)
+    with pytest.raises(CacheMiss):
+        scheduler.call("example.com", _raise, CacheMiss("not cached"), item="https://example.com/recipe/1/")
+    assert dead_letters.load() == []
+
+
+def test_transient_failures_are_retried(dead_letters):
+    scheduler = RetryScheduler(dead_letters=dead_letters, base_delay=0.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise requests.ConnectionError("reset")
+        return "ok"
+
+    assert scheduler.call("example.com", flaky) == "ok"
+    assert len(attempts) == 3
+    assert dead_letters.load() == []
+
+
+def test_replace_rewrites_the_queue(dead_letters):
+    for i in range(3):
+        dead_letters.add("example.com", f"https://example.com/recipe/{i}/", ValueError(), 1)
+    records = dead_letters.load()
+    dead_letters.replace(records[1:])
+    assert [r["item"] for r in dead_letters.load()] == ["https://example.com/recipe/1/", "https://example.com/recipe/2/"]
+    dead_letters.replace([])
+    assert dead_letters.load() == []
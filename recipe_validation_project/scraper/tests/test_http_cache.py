@@ -0,0 +1,71 @@
+import pytest
+
+from http_cache import CacheMiss, HttpCache
+
+PAGE = "https://www.allrecipes.com/recipes/78/breakfast-and-brunch/"
+OTHER = "https://www.allrecipes.com/recipes/17562/dinner/"
+
+
+@pytest.fixture
+def session(make_session):
+    return make_session({PAGE: b"<html>breakfast</html>" * 100, OTHER: b"<html>dinner</html>" * 100})
+
+
+def test_revalidates_with_etag_and_serves_body_from_store(tmp_path, session):
+    cache = HttpCache(str(tmp_path), session=session)
+    assert cache.get(PAGE).content == session.bodies[PAGE]
+    response = cache.get(PAGE)
+    assert response.from_cache
+    assert response.text == session.bodies[PAGE].decode()
+    assert session.requests[-1][1]["If-None-Match"] == f'"{len(session.bodies[PAGE])}"'
+    assert cache.stats["misses"] == 1 and cache.stats["revalidated"] == 1
+
+
+def test_offline_replays_the_store(tmp_path, session):
+    cache = HttpCache(str(tmp_path), session=session)
+    cache.get(PAGE)
+    cache.close()
+
+    offline = HttpCache(str(tmp_path), offline=True, session=None)
+    assert offline.get(PAGE).content == session.bodies[PAGE]
+    with pytest.raises(CacheMiss):
+        offline.get(OTHER)
+
+
+def test_response_survives_eviction_of_its_body(tmp_path, session):
+    cache = HttpCache(str(tmp_path), session=session)
+    cache.get(PAGE)
+    cache.close()
+
+    offline = HttpCache(str(tmp_path), offline=True)
+    response = offline.get(PAGE)
+    # Another thread stores a page and evicts PAGE before this response is read.
+    offline.max_bytes = 0
+    offline.offline = False
+    offline.session = session
+    offline.get(OTHER)
+    assert PAGE not in offline._index
+    assert response.content == session.bodies[PAGE]
+
+
+def test_body_evicted_during_revalidation_is_fetched_again(tmp_path, session):
+    cache = HttpCache(str(tmp_path), session=session)
+    cache.get(PAGE)
+    original_get = session.get
+
+    def evict_then_get(url, headers=None, timeout=None, **kwargs):
+        # The body disappears while the conditional request is in flight.
+        (tmp_path / (cache._body_path(url).rsplit("/", 1)[-1])).unlink(missing_ok=True)
+        return original_get(url, headers=headers, timeout=timeout)
+
+    session.get = evict_then_get
+    assert cache.get(PAGE).content == session.bodies[PAGE]
+    assert "If-None-Match" not in session.requests[-1][1]
+
+
+def test_streamed_download_is_read_back_from_the_store(tmp_path, session):
+    cache = HttpCache(str(tmp_path), session=session)
+    response = cache.get(PAGE, stream=True)
+    with response.open() as f:
+        assert f.read() == session.bodies[PAGE]
+    assert cache.get(PAGE, stream=True).from_cache
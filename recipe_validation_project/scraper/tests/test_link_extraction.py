@@ -0,0 +1,23 @@
+from bench_link_extraction import DEFAULT_CORPUS_DIR, available_extractors, check_parity, load_corpus
+from link_extraction import LINK_EXTRACTORS
+
+
+def test_extractors_agree_on_saved_pages():
+    pages = load_corpus(DEFAULT_CORPUS_DIR)
+    assert pages
+    assert check_parity(pages, available_extractors()) == 0
+
+
+def test_declared_charset_is_honoured():
+    html = ('<html><head><meta charset="iso-8859-1"></head><body><main>'
+            '<a href="/recipe/1/crème-brûlée/">Crème brûlée</a></main></body></html>').encode('iso-8859-1')
+    expected = {'https://www.allrecipes.com/recipe/1/crème-brûlée/'}
+    for name in available_extractors():
+        recipes, _ = LINK_EXTRACTORS[name](html, 'https://www.allrecipes.com/recipes/721/')
+        assert recipes == expected, name
+
+
+def test_undeclared_non_utf8_falls_back_to_windows_1252():
+    html = '<main><a href="/recipe/2/café-au-lait/">x</a></main>'.encode('cp1252')
+    recipes, _ = LINK_EXTRACTORS['stream'](html, 'https://www.allrecipes.com/recipes/')
+    assert recipes == {'https://www.allrecipes.com/recipe/2/café-au-lait/'}
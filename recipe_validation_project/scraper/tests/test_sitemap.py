@@ -0,0 +1,133 @@
+import gzip
+import os
+import shutil
+
+import pytest
+
+from sitemap import UrlCatalog, discover_from_sitemap, iter_sitemap_entries, open_sitemap
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "sitemaps")
+PANCAKES = "https://www.allrecipes.com/recipe/21014/good-old-fashioned-pancakes/"
+BANANA_BREAD = "https://www.allrecipes.com/recipe/20144/banana-banana-bread/"
+MEATLOAF = "https://www.allrecipes.com/recipe/16354/easy-meatloaf/"
+
+
+@pytest.fixture
+def sitemaps(tmp_path):
+    """Copy of the fixture sitemaps that a test may edit."""
+    directory = tmp_path / "sitemaps"
+    shutil.copytree(FIXTURES, directory)
+    return directory
+
+
+def _replace(path, old, new):
+    text = path.read_text()
+    assert old in text
+    path.write_text(text.replace(old, new))
+
+
+def test_plain_and_gzipped_sitemaps_parse():
+    with open_sitemap(os.path.join(FIXTURES, "recipes-1.xml")) as f:
+        plain = list(iter_sitemap_entries(f))
+    with open_sitemap(os.path.join(FIXTURES, "recipes-2.xml.gz")) as f:
+        gzipped = list(iter_sitemap_entries(f))
+    assert [loc for _, loc, _ in plain][:2] == [PANCAKES, BANANA_BREAD]
+    assert gzipped == [("url", MEATLOAF, "2024-01-01")]
+
+
+def test_first_run_returns_every_recipe_url(sitemaps, tmp_path):
+    catalog = UrlCatalog(str(tmp_path / "catalog.json"))
+    urls = discover_from_sitemap(str(sitemaps / "sitemap_index.xml"), catalog)
+    # The category page in recipes-1.xml is filtered out
+    assert sorted(urls) == sorted([PANCAKES, BANANA_BREAD, MEATLOAF])
+    assert len(catalog) == 3
+
+
+def test_crawled_urls_are_not_returned_again(sitemaps, tmp_path):
+    catalog_path = str(tmp_path / "catalog.json")
+    catalog = UrlCatalog(catalog_path)
+    discover_from_sitemap(str(sitemaps / "sitemap_index.xml"), catalog)
+    catalog.mark_crawled(PANCAKES)
+    catalog.mark_crawled(MEATLOAF)
+    catalog.save()
+
+    catalog = UrlCatalog(catalog_path)
+    assert discover_from_sitemap(str(sitemaps / "sitemap_index.xml"), catalog) == [BANANA_BREAD]
+
+
+def test_unchanged_child_sitemap_is_not_read_again(sitemaps, tmp_path):
+    catalog_path = str(tmp_path / "catalog.json")
+    catalog = UrlCatalog(catalog_path)
+    discover_from_sitemap(str(sitemaps / "sitemap_index.xml"), catalog)
+    catalog.save()
+
+    # Corrupt the child sitemaps: an unchanged <lastmod> in the index means they are not opened.
+    (sitemaps / "recipes-1.xml").write_text("not xml")
+    with gzip.open(sitemaps / "recipes-2.xml.gz", "wt") as f:
+        f.write("not xml")
+
+    catalog = UrlCatalog(catalog_path)
+    assert sorted(discover_from_sitemap(str(sitemaps / "sitemap_index.xml"), catalog)) == sorted([PANCAKES, BANANA_BREAD, MEATLOAF])
+
+
+def test_changed_lastmod_is_recrawled(sitemaps, tmp_path):
+    catalog_path = str(tmp_path / "catalog.json")
+    catalog = UrlCatalog(catalog_path)
+    for url in discover_from_sitemap(str(sitemaps / "sitemap_index.xml"), catalog):
+        catalog.mark_crawled(url)
+    catalog.save()
+
+    # The pancake recipe is edited: its own lastmod and its child sitemap's lastmod move.
+    _replace(sitemaps / "recipes-1.xml",
+             f"<loc>{PANCAKES}</loc>\n    <lastmod>2024-01-01</lastmod>",
+             f"<loc>{PANCAKES}</loc>\n    <lastmod>2024-03-01</lastmod>")
+    _replace(sitemaps / "sitemap_index.xml",
+             "<loc>recipes-1.xml</loc>\n    <lastmod>2024-01-01</lastmod>",
+             "<loc>recipes-1.xml</loc>\n    <lastmod>2024-03-01</lastmod>")
+
+    catalog = UrlCatalog(catalog_path)
+    assert discover_from_sitemap(str(sitemaps / "sitemap_index.xml"), catalog) == [PANCAKES]
+    catalog.mark_crawled(PANCAKES)
+    assert discover_from_sitemap(str(sitemaps / "sitemap_index.xml"), catalog) == []
+
+
+def _served_sitemaps(make_session, missing_child=False):
+    """The fixture sitemaps served over HTTP, with the index listing absolute child URLs."""
+    base = "https://www.allrecipes.com/"
+    with open(os.path.join(FIXTURES, "sitemap_index.xml"), 'rb') as f:
+        index = f.read().replace(b"<loc>recipes-", b"<loc>" + base.encode() + b"recipes-")
+    bodies = {base + "sitemap_index.xml": index}
+    for name in ("recipes-1.xml", "recipes-2.xml.gz"):
+        if missing_child and name == "recipes-2.xml.gz":
+            continue
+        with open(os.path.join(FIXTURES, name), 'rb') as f:
+            bodies[base + name] = f.read()
+    return base + "sitemap_index.xml", make_session(bodies)
+
+
+def test_http_sitemaps_stream_through_cache_and_scheduler(tmp_path, make_session):
+    from fetch_scheduler import DeadLetterQueue, RetryScheduler
+    from http_cache import HttpCache
+
+    index_url, session = _served_sitemaps(make_session)
+    cache = HttpCache(str(tmp_path / "cache"), session=session)
+    scheduler = RetryScheduler(dead_letters=DeadLetterQueue(str(tmp_path / "dead.jsonl")))
+    catalog = UrlCatalog(str(tmp_path / "catalog.json"))
+    urls = discover_from_sitemap(index_url, catalog, session=cache, scheduler=scheduler)
+    assert set(urls) == {PANCAKES, BANANA_BREAD, MEATLOAF}
+    assert cache.stats["misses"] == 3
+    assert "www.allrecipes.com" in scheduler.report()
+
+
+def test_failed_http_sitemap_is_dead_lettered(tmp_path, make_session):
+    from fetch_scheduler import DeadLetterQueue, RetryScheduler
+    from http_cache import HttpCache
+
+    index_url, session = _served_sitemaps(make_session, missing_child=True)
+    dead_letters = DeadLetterQueue(str(tmp_path / "dead.jsonl"))
+    scheduler = RetryScheduler(dead_letters=dead_letters)
+    catalog = UrlCatalog(str(tmp_path / "catalog.json"))
+    urls = discover_from_sitemap(index_url, catalog, session=HttpCache(str(tmp_path / "cache"), session=session),
+                                 scheduler=scheduler)
+    assert set(urls) == {PANCAKES, BANANA_BREAD}
+    assert [r["item"] for r in dead_letters.load()] == ["https://www.allrecipes.com/recipes-2.xml.gz"]